@@ -77,6 +77,10 @@ config_dict['default']['cfg_main'] = config_file
 # Print/log some debug information
 DEBUG = config_dict['default']['debug']
 
+# Summarize, sample and queue log records, see 'cfg_log.ini'
+from .log_mgr import start_logging
+start_logging(ctx=config_dict)
+
 # if config_dict['default']['debug']: logger.debug(f"""
 if DEBUG: logger.debug(f"""
     root_dir: {root_dir}
@@ -97,3 +101,37 @@ def run_gui():
     """see 'pyproject.toml' - entry point for GUI"""
     from .gui import main_window
     main_window.start_gui()
+
+
+# Start refresh daemon
+def run_daemon():
+    """see 'pyproject.toml' - entry point for daemon, 'stonk_daemon <job|status|stop>' sends a trigger"""
+    import sys
+    from .daemon_srv import client
+    if len(sys.argv) > 1:
+        print(client.send_trigger(ctx=config_dict, command=sys.argv[1]))
+    else:
+        client.start_daemon(ctx=config_dict)
+
+
+# Start data line query server
+def run_query_server():
+    """see 'pyproject.toml' - entry point for the stonk database query server"""
+    from .data_srv import query
+    query.serve_data_lines(ctx=config_dict)
+
+
+# Start job queue worker
+def run_queue_worker():
+    """see 'pyproject.toml' - entry point for a job queue worker on this or another host"""
+    from .daemon_srv.utils import job_ctx
+    from .data_srv import job_queue
+    job_queue.run_queue_worker(ctx=job_ctx(ctx=config_dict, job="data"))
+
+
+# Start queued refresh
+def run_stonk_refresh():
+    """see 'pyproject.toml' - entry point for queueing a refresh, 'stonk_worker' on other hosts takes part"""
+    from .daemon_srv.utils import job_ctx
+    from .data_srv import job_queue
+    job_queue.start_stonk_refresh(ctx=job_ctx(ctx=config_dict, job="data"))
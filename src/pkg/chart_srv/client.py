@@ -1,5 +1,5 @@
 """src/pkg/chart_srv/client.py\n
-begin_chart_download(ctx) - fetch charts/heatmaps
+begin_chart_download(ctx) - fetch or render charts/heatmaps
 """
 
 import logging
@@ -36,6 +36,10 @@ def _download(ctx):
     if DEBUG:
         logger.debug(f"_download(ctx={type(ctx)})")
 
+    # Draw locally instead of using a browser
+    if ctx["chart_service"].get(f"{ctx['interface']['command']}_backend") == "render":
+        return _render(ctx=ctx)
+
     # Select which version of the webscraper to use
     if ctx["interface"]["command"] == "chart":
         from pkg.chart_srv.scraper.stock_chart import WebScraper
@@ -47,3 +51,21 @@ def _download(ctx):
         start.webscraper()
     except Exception as e:
         print(e)
+
+
+def _render(ctx):
+    """Direct local rendering of chart or heatmap"""
+    if DEBUG:
+        logger.debug(f"_render(ctx={type(ctx)})")
+
+    # Select which version of the renderer to use
+    if ctx["interface"]["command"] == "chart":
+        from pkg.chart_srv.render.stock_chart import ImageRenderer
+    elif ctx["interface"]["command"] == "heatmap":
+        from pkg.chart_srv.render.heat_map import ImageRenderer
+
+    start = ImageRenderer(ctx)
+    try:
+        start.renderer()
+    except Exception as e:
+        print(e)
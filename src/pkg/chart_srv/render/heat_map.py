@@ -0,0 +1,197 @@
+"""src/pkg/chart_srv/render/heat_map.py\n
+Draw the S&P 500 heatmap locally. Read each ticker from the\n
+stonk database, calculate the return for each period, lay out\n
+a squarified treemap with numpy then draw it with Pillow.\n
+Save PNG image to work directory.
+"""
+
+import logging
+import os
+
+import numpy as np
+
+from PIL import Image, ImageDraw, ImageFont
+
+from pkg import DEBUG
+from pkg.chart_srv.utils import period_bars, stonk_db_ctx
+from pkg.data_srv.utils import read_ohlcv_from_stonk_table, select_stonk_tables
+
+
+logging.getLogger("PIL").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# color scale, red for a loss, grey unchanged, green for a gain
+BACKGROUND = (26, 26, 26)
+COLOR_STOP = np.array([(246, 53, 56), (65, 69, 84), (48, 204, 90)], dtype=float)
+# percent return mapped to the end of the color scale
+COLOR_LIMIT = {"1D": 3, "1W": 5, "1M": 10, "3M": 15, "6M": 20, "YTD": 25, "1Y": 30, "3Y": 50, "5Y": 75}
+
+
+def squarify(sizes: np.ndarray, x: float, y: float, dx: float, dy: float) -> np.ndarray:
+    """Squarified treemap (Bruls, Huizing, van Wijk). Sizes must be sorted
+    largest first. Returns an array of rectangles, one row (x, y, dx, dy) per size."""
+    sizes = np.asarray(sizes, dtype=float)
+    rect = np.zeros((len(sizes), 4))
+    if not len(sizes) or sizes.sum() <= 0:
+        return rect
+    area = sizes * (dx * dy) / sizes.sum()
+
+    start = 0
+    while start < len(area):
+        side = min(dx, dy)
+        # grow the row while the worst aspect ratio improves
+        end, worst = start + 1, np.inf
+        while end <= len(area):
+            row = area[start:end]
+            s = row.sum()
+            ratio = max(side**2 * row.max() / s**2, s**2 / (side**2 * row.min()))
+            if ratio > worst:
+                break
+            worst, end = ratio, end + 1
+        end -= 1
+
+        row = area[start:end]
+        thick = row.sum() / side
+        offset = np.concatenate(([0], np.cumsum(row / thick)[:-1]))
+        if dx >= dy:
+            # lay row out as a column along the left edge
+            rect[start:end] = np.column_stack((np.full(len(row), x), y + offset, np.full(len(row), thick), row / thick))
+            x, dx = x + thick, dx - thick
+        else:
+            # lay row out along the top edge
+            rect[start:end] = np.column_stack((x + offset, np.full(len(row), y), row / thick, np.full(len(row), thick)))
+            y, dy = y + thick, dy - thick
+        start = end
+    return rect
+
+
+class ImageRenderer:
+    """Draw and save heatmaps from the stonk database"""
+
+    def __init__(self, ctx):
+        self.heatmap_dir = f"{ctx['default']['work_dir']}heatmap"
+        self.period = ctx["interface"]["arguments"]
+        self.sector = {
+            ticker.upper(): name.title()
+            for name, tickers in ctx.get("heatmap_sector", {}).items()
+            for ticker in (tickers or "").split()
+        }
+        self.size = tuple(int(i) for i in ctx["chart_service"]["heatmap_size"].split("x"))
+        self.stonk_ctx = stonk_db_ctx(ctx=ctx)
+
+    def __repr__(self):
+        return f"<class '{self.__class__.__name__}'> __dict__= {self.__dict__})"
+
+    def renderer(self):
+        """Main entry point to class. Directs workflow of renderer."""
+        if DEBUG:
+            logger.debug(f"renderer(self={self})")
+
+        bars = self._read_ticker_bars()
+        for period in self.period:
+            if not DEBUG:
+                print(f"  drawing heatmap {period}...")
+            try:
+                ticker, weight, change = self._period_change(bars=bars, period=period)
+                image = self._draw_treemap(ticker=ticker, weight=weight, change=change, period=period)
+                self._save_png_image(image=image, period=period)
+            except Exception as e:
+                logger.debug(f"*** ERROR *** {e}")
+
+    def _read_ticker_bars(self) -> dict:
+        """Returns a dict {ticker: (date, bars)} for each table in the stonk database"""
+        if DEBUG:
+            logger.debug(f"_read_ticker_bars(self)")
+
+        bars = dict()
+        for table in select_stonk_tables(ctx=self.stonk_ctx):
+            try:
+                date, ohlcv = read_ohlcv_from_stonk_table(ctx=self.stonk_ctx, table=table)
+            except Exception as e:
+                logger.debug(f"*** ERROR *** {table} {e}")
+                continue
+            if len(date) > 1:
+                bars[table] = date, ohlcv
+        return bars
+
+    def _period_change(self, bars: dict, period: str) -> tuple:
+        """Returns a tuple of arrays (ticker, weight, change). Weight is the
+        average dollar volume over the period, change is the percent return."""
+        if DEBUG:
+            logger.debug(f"_period_change(bars={len(bars)}, period={period})")
+
+        ticker, weight, change = list(), list(), list()
+        for symbol, (date, ohlcv) in bars.items():
+            n = period_bars(period=period, date=date)
+            close = ohlcv["close"][-n - 1 :]
+            ticker.append(symbol)
+            weight.append(np.mean(close[1:] * ohlcv["volume"][-n:]))
+            change.append((close[-1] / close[0] - 1) * 100)
+
+        ticker, weight, change = np.array(ticker), np.nan_to_num(weight), np.nan_to_num(change)
+        # a tile needs some area to be drawn
+        keep = weight > 0
+        return ticker[keep], weight[keep], change[keep]
+
+    def _draw_treemap(self, ticker: np.ndarray, weight: np.ndarray, change: np.ndarray, period: str) -> object:
+        """Layout sectors, then tickers inside each sector, then draw the tiles"""
+        if DEBUG:
+            logger.debug(f"_draw_treemap(ticker={len(ticker)}, period={period})")
+
+        width, height = self.size
+        image = Image.new("RGB", self.size, BACKGROUND)
+        draw = ImageDraw.Draw(image)
+        font = self._load_font(size=max(10, height // 60))
+
+        sector = np.array([self.sector.get(t, "") for t in ticker])
+        names = np.unique(sector)
+        sector_weight = np.array([weight[sector == name].sum() for name in names])
+        order = np.argsort(-sector_weight)
+        sector_rect = squarify(sector_weight[order], 0, 0, width, height)
+
+        limit = COLOR_LIMIT.get(period.upper(), 10)
+        for name, (sx, sy, sdx, sdy) in zip(names[order], sector_rect):
+            # leave room for the sector title
+            title = height // 40 if name else 0
+            member = np.flatnonzero(sector == name)
+            member = member[np.argsort(-weight[member])]
+            tile = squarify(weight[member], sx, sy + title, sdx, sdy - title)
+            color = self._change_color(change=change[member], limit=limit)
+
+            for i, (x, y, dx, dy), rgb in zip(member, tile, color):
+                draw.rectangle((x, y, x + dx, y + dy), fill=tuple(rgb), outline=BACKGROUND)
+                self._draw_label(draw=draw, font=font, box=(x, y, dx, dy), text=f"{ticker[i]}\n{change[i]:+.2f}%")
+            if title:
+                draw.rectangle((sx, sy, sx + sdx, sy + title), fill=BACKGROUND)
+                draw.text((sx + 4, sy + 2), name.upper(), fill=(220, 220, 220), font=font)
+        return image
+
+    def _change_color(self, change: np.ndarray, limit: float) -> np.ndarray:
+        """Interpolate tile color, array of RGB rows"""
+        t = np.clip(change / limit, -1, 1)[:, None]
+        lo = COLOR_STOP[1] + (COLOR_STOP[1] - COLOR_STOP[0]) * np.minimum(t, 0)
+        hi = COLOR_STOP[1] + (COLOR_STOP[2] - COLOR_STOP[1]) * np.maximum(t, 0)
+        return np.where(t < 0, lo, hi).round().astype(int)
+
+    def _draw_label(self, draw: object, font: object, box: tuple, text: str):
+        """Center ticker and change in the tile if it fits"""
+        x, y, dx, dy = box
+        left, top, right, bottom = draw.multiline_textbbox((0, 0), text, font=font, align="center")
+        if right - left + 4 < dx and bottom - top + 4 < dy:
+            draw.multiline_text(
+                (x + dx / 2, y + dy / 2), text, fill=(255, 255, 255), font=font, anchor="mm", align="center"
+            )
+
+    def _load_font(self, size: int) -> object:
+        """Use DejaVu Sans if installed, otherwise the Pillow default font"""
+        try:
+            return ImageFont.truetype("DejaVuSans.ttf", size)
+        except OSError:
+            return ImageFont.load_default()
+
+    def _save_png_image(self, image: object, period: str):
+        """Save image to the work directory"""
+        if DEBUG:
+            logger.debug(f"_save_png_image(image={type(image)}, period={period})")
+
+        image.save(os.path.join(self.heatmap_dir, f"SP500_{period.lower()}.png"), "PNG", quality=80)
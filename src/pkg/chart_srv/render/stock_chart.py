@@ -0,0 +1,183 @@
+"""src/pkg/chart_srv/render/stock_chart.py\n
+Draw landscape, night colored stock charts locally. Read OHLC\n
+bars for each symbol from the stonk database, resample to the\n
+chart period, draw RSI, candlestick and volume panes with\n
+Pillow. Symbols are drawn in parallel processes. Save image\n
+to work directory.
+"""
+
+import logging
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from PIL import Image, ImageDraw, ImageFont
+
+from pkg import DEBUG
+from pkg.chart_srv.utils import stonk_db_ctx
+from pkg.data_srv.indicator import rsi
+from pkg.data_srv.utils import read_ohlcv_from_stonk_table, resample_ohlcv
+
+
+logging.getLogger("PIL").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# night color scheme
+BACKGROUND = (0, 0, 0)
+GRID = (48, 48, 48)
+TEXT = (200, 200, 200)
+UP = (0, 200, 0)
+DOWN = (220, 0, 0)
+VOLUME = (70, 70, 110)
+RSI = (80, 160, 255)
+
+RSI_PERIOD = 14
+
+
+class ImageRenderer:
+    """Draw and save stockcharts from the stonk database"""
+
+    def __init__(self, ctx):
+        self.bars = int(ctx["chart_service"]["chart_bars"])
+        self.chart_dir = f"{ctx['default']['work_dir']}chart"
+        self.period = ctx["interface"]["opt_trans"]
+        self.size = tuple(int(i) for i in ctx["chart_service"]["chart_size"].split("x"))
+        self.stonk_ctx = stonk_db_ctx(ctx=ctx)
+        self.symbol = ctx["interface"]["arguments"]
+        self.workers = int(ctx["chart_service"]["render_workers"]) or None
+
+    def __repr__(self):
+        return f"<class '{self.__class__.__name__}'> __dict__= {self.__dict__})"
+
+    def renderer(self):
+        """Main entry point to class. Directs workflow of renderer."""
+        if DEBUG:
+            logger.debug(f"renderer(self={self})")
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for symbol, error in zip(self.symbol, executor.map(self._draw_symbol, self.symbol)):
+                if error:
+                    logger.debug(f"*** ERROR *** {symbol} {error}")
+
+    def _draw_symbol(self, symbol: str) -> str:
+        """Draw each period for symbol, runs in a worker process. Returns an error message or None"""
+        try:
+            date, bars = read_ohlcv_from_stonk_table(ctx=self.stonk_ctx, table=symbol.upper())
+            for period in self.period:
+                if not DEBUG:
+                    print(f"  drawing {symbol} {period}...")
+                if period.lower() in ("weekly", "monthly"):
+                    p_date, p_bars = resample_ohlcv(date=date, bars=bars, frequency=period.lower())
+                else:
+                    p_date, p_bars = date, bars
+                image = self._draw_chart(symbol=symbol, period=period, date=p_date, bars=p_bars)
+                image.save(os.path.join(self.chart_dir, f"{symbol}_{period[:1].lower()}.png"), "PNG", quality=80)
+        except Exception as e:
+            return f"{e}"
+
+    def _draw_chart(self, symbol: str, period: str, date: np.ndarray, bars: dict) -> object:
+        """Draw title, RSI pane, then price and volume pane"""
+        if DEBUG:
+            logger.debug(f"_draw_chart(symbol={symbol}, period={period}, date={len(date)})")
+
+        width, height = self.size
+        image = Image.new("RGB", self.size, BACKGROUND)
+        draw = ImageDraw.Draw(image)
+        font = self._load_font(size=max(10, height // 70))
+
+        # calculate RSI on the full series, then trim to the visible bars
+        strength = rsi(close=bars["close"], period=RSI_PERIOD)[-self.bars :]
+        date = date[-self.bars :]
+        bars = {k: v[-self.bars :] / (1 if k == "volume" else 100) for k, v in bars.items()}
+
+        # pane boxes (left, top, right, bottom), right margin holds the axis labels
+        title, axis = height // 20, width // 14
+        rsi_box = (4, title, width - axis, title + (height - title) // 5)
+        price_box = (4, rsi_box[3] + 6, width - axis, height - height // 30)
+
+        c = bars["close"]
+        draw.text(
+            (6, title // 4),
+            f"{symbol.upper()}  {period}   O {bars['open'][-1]:.2f}  H {bars['high'][-1]:.2f}  "
+            f"L {bars['low'][-1]:.2f}  C {c[-1]:.2f}  {(c[-1] / c[-2] - 1) * 100 if len(c) > 1 else 0:+.2f}%",
+            fill=TEXT,
+            font=font,
+        )
+        x = self._bar_x(count=len(date), box=price_box)
+        self._draw_rsi(draw=draw, font=font, x=x, strength=strength, box=rsi_box)
+        self._draw_candles(draw=draw, font=font, x=x, bars=bars, box=price_box)
+        self._draw_dates(draw=draw, font=font, x=x, date=date, box=price_box)
+        return image
+
+    def _bar_x(self, count: int, box: tuple) -> np.ndarray:
+        """Center x pixel of each bar"""
+        left, _, right, _ = box
+        step = (right - left) / max(count, 1)
+        return left + step * (np.arange(count) + 0.5)
+
+    def _scale(self, value: np.ndarray, lo: float, hi: float, box: tuple) -> np.ndarray:
+        """Map values onto the pane height, hi at the top"""
+        _, top, _, bottom = box
+        return bottom - (value - lo) / ((hi - lo) or 1) * (bottom - top)
+
+    def _draw_rsi(self, draw: object, font: object, x: np.ndarray, strength: np.ndarray, box: tuple):
+        """RSI line with 30 and 70 levels"""
+        left, top, right, bottom = box
+        draw.rectangle(box, outline=GRID)
+        for level in (30, 50, 70):
+            y = self._scale(level, 0, 100, box)
+            draw.line((left, y, right, y), fill=GRID)
+            draw.text((right + 4, y), f"{level}", fill=TEXT, font=font, anchor="lm")
+        draw.text((left + 4, top + 2), f"RSI({RSI_PERIOD}) {np.nan_to_num(strength[-1]):.2f}", fill=RSI, font=font)
+
+        valid = ~np.isnan(strength)
+        if valid.sum() > 1:
+            y = self._scale(strength[valid], 0, 100, box)
+            draw.line(list(zip(x[valid], y)), fill=RSI, width=2)
+
+    def _draw_candles(self, draw: object, font: object, x: np.ndarray, bars: dict, box: tuple):
+        """Candlesticks with volume bars in the bottom fifth of the pane"""
+        left, top, right, bottom = box
+        draw.rectangle(box, outline=GRID)
+
+        lo, hi = bars["low"].min(), bars["high"].max()
+        pad = (hi - lo) * 0.05
+        lo, hi = lo - pad, hi + pad
+        for level in np.linspace(lo, hi, 7)[1:-1]:
+            y = self._scale(level, lo, hi, box)
+            draw.line((left, y, right, y), fill=GRID)
+            draw.text((right + 4, y), f"{level:.2f}", fill=TEXT, font=font, anchor="lm")
+
+        half = max(1, (x[1] - x[0]) * 0.35 if len(x) > 1 else 3)
+        volume_top = bottom - (bottom - top) / 5
+        volume = self._scale(bars["volume"], 0, bars["volume"].max(), (left, volume_top, right, bottom))
+        for xi, vi in zip(x, volume):
+            draw.rectangle((xi - half, vi, xi + half, bottom), fill=VOLUME)
+
+        y = {k: self._scale(bars[k], lo, hi, box) for k in ("open", "high", "low", "close")}
+        for i, xi in enumerate(x):
+            color = UP if bars["close"][i] >= bars["open"][i] else DOWN
+            draw.line((xi, y["high"][i], xi, y["low"][i]), fill=color)
+            body_top, body_bottom = sorted((y["open"][i], y["close"][i]))
+            draw.rectangle((xi - half, body_top, xi + half, max(body_bottom, body_top + 1)), fill=color)
+
+    def _draw_dates(self, draw: object, font: object, x: np.ndarray, date: np.ndarray, box: tuple):
+        """Label the first bar of each month, or each year for long charts"""
+        _, _, _, bottom = box
+        month = date.astype("datetime64[s]").astype("datetime64[M]")
+        unit = "Y" if len(np.unique(month)) > 24 else "M"
+        group = month.astype(f"datetime64[{unit}]")
+        fmt = "%Y" if unit == "Y" else "%b"
+        for i in np.flatnonzero(np.diff(group.astype(np.int64), prepend=group.astype(np.int64)[0])):
+            draw.line((x[i], box[1], x[i], bottom), fill=GRID)
+            label = group[i].astype("datetime64[D]").item().strftime(fmt)
+            draw.text((x[i], bottom + 2), label, fill=TEXT, font=font, anchor="mt")
+
+    def _load_font(self, size: int) -> object:
+        """Use DejaVu Sans if installed, otherwise the Pillow default font"""
+        try:
+            return ImageFont.truetype("DejaVuSans.ttf", size)
+        except OSError:
+            return ImageFont.load_default()
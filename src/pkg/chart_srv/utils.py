@@ -0,0 +1,43 @@
+"""src/pkg/chart_srv/utils.py\n
+period_bars(period: str, date) -> int\n
+stonk_db_ctx(ctx: dict) -> dict"""
+
+import datetime, logging
+
+from pkg import DEBUG
+
+
+logger = logging.getLogger(__name__)
+
+# number of daily bars in a chart or heatmap period, 'YTD' is counted from the date array
+PERIOD_BARS = {"1D": 1, "1W": 5, "1M": 21, "3M": 63, "6M": 126, "1Y": 252, "3Y": 756, "5Y": 1260}
+
+
+def period_bars(period: str, date) -> int:
+    """Return the number of bars in period, limited to the length of the date array"""
+    if DEBUG:
+        logger.debug(f"period_bars(period={period}, date={type(date)})")
+
+    if period.upper() == "YTD":
+        year_start = datetime.datetime(datetime.date.today().year, 1, 1).timestamp()
+        bars = int((date >= year_start).sum())
+    else:
+        bars = PERIOD_BARS[period.upper()]
+    return max(1, min(bars, len(date) - 1))
+
+
+def stonk_db_ctx(ctx: dict) -> dict:
+    """Return a context for SqliteConnectManager pointing at the stonk
+    database named by [chart_service] render_command, render_database.
+    [data_service] tells how the data lines are stored."""
+    if DEBUG:
+        logger.debug(f"stonk_db_ctx(ctx={type(ctx)})")
+
+    return {
+        "data_service": ctx["data_service"],
+        "default": ctx["default"],
+        "interface": {
+            "command": ctx["chart_service"]["render_command"],
+            "database": ctx["chart_service"]["render_database"],
+        },
+    }
@@ -4,6 +4,7 @@ class SpinnerManager - spinner for command line\n
 class WebDriverManager - selenium webdriver
 """
 
+import glob
 import logging
 import os
 
@@ -68,17 +69,41 @@ class SqliteConnectManager:
     `mode` : string
         open database for read-only 'ro', read-write 'rw', \n
         read-write-create 'rwc', or 'memory' for in-memory db\n
+        'pool' is read-only on a connection kept open per thread\n
+    `detect_types` : bool
+        parse declared column types, not needed for integer tables\n
+    `timeout` : float
+        seconds to wait for a lock held by another connection\n
     Returns
     -------
     An Sqlite3 connection object.\n
+    Year partitions of the database, i.e. stonk_2023.db next to\n
+    stonk.db, are attached in read-only mode. A temporary view for\n
+    each table unions its rows from every file, so queries read\n
+    the full history without naming partitions.\n
+    Pooled connections keep their page cache, memory map and\n
+    prepared statements between 'with' blocks. A connection is\n
+    reopened if the file is replaced or its partitions change.\n
     """
 
     import sqlite3
+    import threading
+
+    # sqlite attaches at most 10 databases by default
+    MAX_PARTITION = 10
+
+    # settings for pooled connections, 64 MiB page cache, 256 MiB memory map
+    POOL_PRAGMA = ("PRAGMA cache_size = -65536", "PRAGMA mmap_size = 268435456", "PRAGMA temp_store = MEMORY")
+
+    # {(path, detect_types): (connection, version)} for each thread
+    _pool = threading.local()
 
-    def __init__(self, ctx: dict, mode: str = "ro"):
+    def __init__(self, ctx: dict, mode: str = "ro", detect_types: bool = True, timeout: float = 5.0):
         # self.ctx = ctx
         self.db_path = f"{ctx['default']['work_dir']}{ctx['interface']['command']}/{ctx['interface']['database']}"
+        self.detect_types = detect_types
         self.mode = mode
+        self.timeout = timeout
 
     def __repr__(self):
         return f"{self.__class__.__name__}(db_path='{self.db_path}', mode='{self.mode}')"
@@ -87,22 +112,101 @@ class SqliteConnectManager:
         if DEBUG:
             logger.debug(f"{self}.__enter__()")
         try:
-            self.connection = self.sqlite3.connect(
-                f"file:{os.path.abspath(self.db_path)}?mode={self.mode}",
-                detect_types=self.sqlite3.PARSE_DECLTYPES | self.sqlite3.PARSE_COLNAMES,
-                uri=True,
-            )
-            self.cursor = self.connection.cursor()
+            if self.mode == "pool":
+                self.connection = self._pooled_connection()
+                self.cursor = self.connection.cursor()
+            else:
+                self.connection = self._connect(mode=self.mode)
+                self.cursor = self.connection.cursor()
+                if self.mode == "ro":
+                    self._attach_partitions(partition=self._partition_path())
             if DEBUG:
                 logger.debug(f"cursor: {self.cursor}")
             return self
-        except self.sqlite3.Error as e:
+        except (self.sqlite3.Error, OSError) as e:
             print(f"{e}: {self.db_path}")
 
+    def _connect(self, mode: str) -> object:
+        return self.sqlite3.connect(
+            f"file:{os.path.abspath(self.db_path)}?mode={mode}",
+            detect_types=self.sqlite3.PARSE_DECLTYPES | self.sqlite3.PARSE_COLNAMES if self.detect_types else 0,
+            uri=True,
+            timeout=self.timeout,
+            cached_statements=256,
+        )
+
+    def _pooled_connection(self) -> object:
+        """Reuse this thread's read-only connection to the database"""
+        pool = self._pool.__dict__
+        # a connection must not be shared with a forked process
+        if pool.get("pid") != os.getpid():
+            pool.clear()
+            pool["pid"] = os.getpid()
+
+        stat = os.stat(self.db_path)
+        partition = self._partition_path()
+        version = (stat.st_dev, stat.st_ino, tuple(partition))
+        key = (os.path.abspath(self.db_path), self.detect_types)
+        connection, pooled_version = pool.get(key, (None, None))
+        if connection is None or pooled_version != version:
+            if connection is not None:
+                connection.close()
+            connection = self._connect(mode="ro")
+            for pragma in self.POOL_PRAGMA:
+                connection.execute(pragma)
+            self.cursor = connection.cursor()
+            self._attach_partitions(partition=partition)
+            self.cursor.close()
+            pool[key] = connection, version
+        return connection
+
+    def _partition_path(self) -> list:
+        """Newest year partitions first, i.e. stonk_2025.db, stonk_2024.db"""
+        root, ext = os.path.splitext(os.path.abspath(self.db_path))
+        partition = sorted(glob.glob(f"{glob.escape(root)}_[0-9][0-9][0-9][0-9]{ext}"), reverse=True)
+        if len(partition) > self.MAX_PARTITION:
+            logger.warning(
+                f"{len(partition)} year partitions of {self.db_path}, only the newest {self.MAX_PARTITION} are read"
+            )
+        return partition[: self.MAX_PARTITION]
+
+    def _attach_partitions(self, partition: list):
+        """Attach year partitions, then shadow each table with a view over all files"""
+        if not partition:
+            return
+
+        root = os.path.splitext(os.path.abspath(self.db_path))[0]
+        schema = ["main"]
+        for path in partition:
+            alias = f"p{path[len(root) + 1 : len(root) + 5]}"
+            self.cursor.execute(f"ATTACH DATABASE ? AS {alias}", (f"file:{path}?mode=ro",))
+            schema.append(alias)
+
+        # columns of each table in each file, a column missing from a file reads as NULL
+        column = dict()
+        for name in schema:
+            for (table,) in self.cursor.execute(
+                f"SELECT name FROM {name}.sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+            ).fetchall():
+                info = self.cursor.execute(f"PRAGMA {name}.table_info({table})").fetchall()
+                column.setdefault(table, dict())[name] = [row[1] for row in info]
+        for table, found in column.items():
+            if len(found) < 2:
+                continue
+            names = list(dict.fromkeys(col for name in schema for col in found.get(name, [])))
+            select = [
+                f"SELECT {', '.join(col if col in found[name] else f'NULL AS {col}' for col in names)} FROM {name}.{table}"
+                for name in schema
+                if name in found
+            ]
+            self.cursor.execute(f"CREATE TEMP VIEW {table} AS {' UNION ALL '.join(select)}")
+
     def __exit__(self, exc_type, exc_value, exc_traceback):
         if DEBUG:
             logger.debug(f"{self.__class__.__name__}.__exit__()")
         self.cursor.close()
+        if self.mode == "pool":
+            return
         if isinstance(exc_value, Exception):
             self.connection.rollback()
         else:
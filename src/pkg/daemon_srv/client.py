@@ -0,0 +1,36 @@
+"""src/pkg/daemon_srv/client.py\n
+send_trigger(ctx: dict, command: str) -> str\n
+start_daemon(ctx: dict) -> None"""
+
+import logging, socket
+
+from pkg import DEBUG
+
+
+logger = logging.getLogger(__name__)
+
+
+def send_trigger(ctx: dict, command: str) -> str:
+    """Send a job name, 'status' or 'stop' to a running daemon, return its reply"""
+    if DEBUG:
+        logger.debug(f"send_trigger(ctx={type(ctx)}, command={command})")
+
+    socket_path = f"{ctx['default']['work_dir']}{ctx['daemon_service']['socket_file']}"
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socket_path)
+            sock.sendall(f"{command}\n".encode())
+            return sock.makefile().readline().strip()
+    except OSError as e:
+        logger.debug(f"*** ERROR *** {e}")
+        return f"daemon not running: {socket_path}"
+
+
+def start_daemon(ctx: dict) -> None:
+    """Run the refresh daemon in the foreground"""
+    if DEBUG:
+        logger.debug(f"start_daemon(ctx={type(ctx)})")
+
+    from pkg.daemon_srv.server import StonkDaemon
+
+    StonkDaemon(ctx=ctx).run()
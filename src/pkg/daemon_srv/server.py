@@ -0,0 +1,151 @@
+"""src/pkg/daemon_srv/server.py\n
+Long running refresh daemon. Imports, config and provider\n
+sessions are loaded once, then jobs run on a cron like\n
+schedule or when triggered over a local unix socket.\n
+Jobs run one at a time on a worker thread.\n
+class StonkDaemon\n
+class TriggerHandler
+"""
+
+import datetime, importlib, logging, os, queue, socketserver, threading, time
+
+from pkg import DEBUG
+from pkg.daemon_srv.utils import JOB, job_ctx, next_run, parse_schedule
+
+
+logger = logging.getLogger(__name__)
+
+
+class TriggerHandler(socketserver.StreamRequestHandler):
+    """Read one command line from the socket, reply with one line"""
+
+    def handle(self):
+        command = self.rfile.readline().decode().strip()
+        self.wfile.write(f"{self.server.daemon.trigger(command=command)}\n".encode())
+
+
+class StonkDaemon:
+    """Schedule and run refresh jobs in a warm process"""
+
+    def __init__(self, ctx: dict):
+        self.ctx = ctx
+        self.processor = None  # data provider, keeps its http session between runs
+        self.queue = queue.Queue()
+        self.schedule = {job: parse_schedule(expr) for job, expr in ctx["daemon_schedule"].items() if expr}
+        self.server = None
+        self.socket_path = f"{ctx['default']['work_dir']}{ctx['daemon_service']['socket_file']}"
+        self.status = {job: "never run" for job in JOB}
+        self.stopped = threading.Event()
+
+        for job in self.schedule:
+            if job not in JOB:
+                raise ValueError(f"unknown job: {job}")
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(socket_path={self.socket_path}, schedule={list(self.schedule)})"
+
+    def run(self):
+        """Main entry point to class. Serve the trigger socket until stopped."""
+        if DEBUG:
+            logger.debug(f"run(self={self})")
+
+        self._warm_imports()
+        threading.Thread(target=self._worker, daemon=True).start()
+        threading.Thread(target=self._scheduler, daemon=True).start()
+
+        # a socket left by a daemon that did not shut down cleanly
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        with socketserver.UnixStreamServer(self.socket_path, TriggerHandler) as self.server:
+            self.server.daemon = self
+            if not DEBUG:
+                print(f" Daemon listening on '{self.socket_path}'")
+            try:
+                self.server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                self.stopped.set()
+                os.unlink(self.socket_path)
+
+    def trigger(self, command: str) -> str:
+        """Queue a job, or answer 'status' and 'stop'. Returns the reply."""
+        if DEBUG:
+            logger.debug(f"trigger(command={command})")
+
+        if command in ("", "status"):
+            return "; ".join(f"{job} {status}" for job, status in self.status.items())
+        elif command == "stop":
+            # shutdown() waits for serve_forever() to return, which waits for this handler
+            threading.Thread(target=self.server.shutdown).start()
+            return "stopping"
+        elif command in JOB:
+            self.queue.put(command)
+            return f"queued {command}"
+        return f"unknown job: {command}"
+
+    def _warm_imports(self):
+        """Import the modules each job uses so a run only waits on the network"""
+        if DEBUG:
+            logger.debug(f"_warm_imports(self)")
+
+        module = ["pkg.data_srv.agent", "pkg.data_srv.analytics", "pkg.data_srv.client", "pkg.chart_srv.client"]
+        for command, name in (("chart", "stock_chart"), ("heatmap", "heat_map")):
+            backend = "render" if self.ctx["chart_service"][f"{command}_backend"] == "render" else "scraper"
+            module.append(f"pkg.chart_srv.{backend}.{name}")
+        for name in module:
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                logger.debug(f"*** ERROR *** {name} {e}")
+
+    def _scheduler(self):
+        """Queue each scheduled job when it is due"""
+        due = {
+            job: next_run(schedule=schedule, after=datetime.datetime.now()) for job, schedule in self.schedule.items()
+        }
+        while not self.stopped.is_set():
+            now = datetime.datetime.now()
+            for job, when in due.items():
+                if when <= now:
+                    self.queue.put(job)
+                    due[job] = next_run(schedule=self.schedule[job], after=now)
+            # wake at the next due time, at least once a minute in case the clock changes
+            wait = min([(when - now).total_seconds() for when in due.values()] + [60])
+            self.stopped.wait(timeout=max(wait, 1))
+
+    def _worker(self):
+        """Run queued jobs one at a time, record the result for 'status'"""
+        while True:
+            job = self.queue.get()
+            if not DEBUG:
+                print(f" Running {job} job")
+            start = time.perf_counter()
+            try:
+                self._run_job(job=job)
+                result = f"ok in {time.perf_counter() - start:.1f}s"
+            except Exception as e:
+                logger.debug(f"*** ERROR *** {job} {e}")
+                result = f"failed {e}"
+            self.status[job] = f"{datetime.datetime.now():%Y-%m-%d %H:%M} {result}"
+
+    def _run_job(self, job: str):
+        """Build the job context and call the service client"""
+        from pkg.chart_srv.client import begin_chart_download
+        from pkg.data_srv import analytics
+        from pkg.data_srv import client as data_client
+
+        ctx = job_ctx(ctx=self.ctx, job=job)
+        match job:
+            case "backfill":
+                data_client.backfill_stonk_data(ctx=ctx)
+            case "data":
+                if self.processor is None:
+                    self.processor = data_client._select_data_provider(ctx=ctx)
+                data_client.fetch_stonk_data(ctx=ctx, processor=self.processor)
+            case "ingest":
+                data_client.ingest_local_data(ctx=ctx)
+            case "analytics":
+                analytics.run_stonk_analytics(ctx=ctx)
+            case "chart" | "heatmap":
+                begin_chart_download(ctx=ctx)
@@ -0,0 +1,100 @@
+"""src/pkg/daemon_srv/utils.py\n
+job_ctx(ctx: dict, job: str) -> dict\n
+next_run(schedule: tuple, after: datetime) -> datetime\n
+parse_schedule(expr: str) -> tuple"""
+
+import datetime, logging
+
+from pkg import DEBUG
+
+
+logger = logging.getLogger(__name__)
+
+JOB = ("backfill", "data", "ingest", "analytics", "chart", "heatmap")
+
+# (low, high) of cron fields minute, hour, day, month, weekday
+FIELD_RANGE = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+
+def job_ctx(ctx: dict, job: str) -> dict:
+    """Return a copy of ctx with the 'interface' section a command line
+    run of job would have, lists are read from the service config files"""
+    if DEBUG:
+        logger.debug(f"job_ctx(ctx={type(ctx)}, job={job})")
+
+    new_ctx = {section: dict(value) for section, value in ctx.items() if isinstance(value, dict)}
+    match job:
+        case "backfill" | "data" | "ingest" | "analytics":
+            new_ctx["interface"] = {
+                "command": "data",
+                "database": ctx["daemon_service"]["data_database"],
+                "data_line": ctx["data_service"]["data_line"].split(),
+                "ticker": ctx["data_service"]["data_list"].split(),
+                "window_size": ctx["default"]["window_size"],
+            }
+        case "chart":
+            new_ctx["interface"] = {
+                "command": "chart",
+                "arguments": ctx["chart_service"]["chart_list"].split(),
+                "opt_trans": ctx["daemon_service"]["chart_period"].split(),
+            }
+        case "heatmap":
+            new_ctx["interface"] = {"command": "heatmap", "arguments": ctx["chart_service"]["heatmap_list"].split()}
+        case _:
+            raise ValueError(f"unknown job: {job}")
+    return new_ctx
+
+
+def _parse_field(field: str, low: int, high: int) -> set:
+    """Values of one cron field, accepts *, 5, 1-5, */15, 1-31/2 and comma lists"""
+    value = set()
+    for part in field.split(","):
+        part, _, step = part.partition("/")
+        if part == "*":
+            start, stop = low, high
+        elif "-" in part:
+            start, stop = (int(i) for i in part.split("-"))
+        else:
+            start = int(part)
+            stop = high if step else start
+        if not low <= start <= stop <= high or int(step or 1) < 1:
+            raise ValueError(f"unknown schedule field: {field}")
+        value.update(range(start, stop + 1, int(step or 1)))
+    return value
+
+
+def parse_schedule(expr: str) -> tuple:
+    """Cron style 'minute hour day month weekday', returns a tuple of five sets"""
+    if DEBUG:
+        logger.debug(f"parse_schedule(expr={expr})")
+
+    field = expr.split()
+    if len(field) != 5:
+        raise ValueError(f"unknown schedule: {expr}")
+    return tuple(_parse_field(f, low, high) for f, (low, high) in zip(field, FIELD_RANGE))
+
+
+def next_run(schedule: tuple, after: datetime.datetime) -> datetime.datetime:
+    """First whole minute later than after matching schedule. Like cron, a
+    restricted day and weekday match if either one does."""
+    minute, hour, day, month, weekday = schedule
+    either = len(day) < 31 and len(weekday) < 7
+
+    t = after.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+    limit = t + datetime.timedelta(days=366 * 5)
+    while t < limit:
+        if t.month not in month:
+            t = (t.replace(day=1, hour=0, minute=0) + datetime.timedelta(days=32)).replace(day=1)
+            continue
+        day_match, weekday_match = t.day in day, t.isoweekday() % 7 in weekday
+        if not ((day_match or weekday_match) if either else (day_match and weekday_match)):
+            t = t.replace(hour=0, minute=0) + datetime.timedelta(days=1)
+            continue
+        if t.hour not in hour:
+            t = t.replace(minute=0) + datetime.timedelta(hours=1)
+            continue
+        if t.minute not in minute:
+            t += datetime.timedelta(minutes=1)
+            continue
+        return t
+    raise ValueError(f"schedule never runs: {schedule}")
@@ -3,19 +3,28 @@ Collect open, high, low, close, volume \n
 (ohlc) data from various online sources.\n
 Process data into lines; volume, average price,\n
 close location value, etc. Returns a tuple.\n
+class HedgedDataProcessor\n
+class LocalDataProcessor\n
+class ProviderLatency\n
 class TiingoDataProcessor\n
 class YahooFinanceDataProcessor
 """
 
-import datetime, logging, os, pickle, time
+import copy, datetime, logging, os, pickle, threading, time
 
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from operator import itemgetter
 from statistics import fmean
 
+import numpy as np
 import pandas as pd
 
 from dotenv import load_dotenv
 from numpy.lib.stride_tricks import sliding_window_view
 from pkg import DEBUG
+from pkg.data_srv import indicator
+from pkg.data_srv.scaler import rolling_scaler, scaled_data_line, sweep_columns, window_scale_sweep
 
 
 load_dotenv()
@@ -28,13 +37,20 @@ logger = logging.getLogger(__name__)
 class BaseProcessor:
     """"""
 
+    # data_frequency: (provider frequency, days one request may span or None), see chunk_days
+    FREQUENCY = {"daily": ("daily", None), "weekly": ("weekly", None)}
+
     def __init__(self, ctx: dict):
         self.data_line = ctx["interface"]["data_line"]
         self.data_provider = ctx["data_service"]["data_provider"]
         self.frequency = ctx["data_service"]["data_frequency"]
         self.lookback = int(ctx["data_service"]["data_lookback"])
         self.scaler = self._set_sklearn_scaler(ctx["data_service"]["sklearn_scaler"])
+        self.scaler_mode = ctx["data_service"]["scaler_mode"]
+        self.scaler_name = ctx["data_service"]["sklearn_scaler"]
         self.start_date, self.end_date = self._start_end_date
+        self.sweep_scaler = ctx["data_service"]["sweep_scaler"].split()
+        self.sweep_window = [int(w) for w in ctx["data_service"]["sweep_window"].split()]
         self.window_size = int(ctx["interface"]["window_size"])
         self.work_dir = ctx["default"]["work_dir"]
 
@@ -46,19 +62,42 @@ class BaseProcessor:
         end = datetime.date.today()
         return start, end
 
+    @property
+    def _parse_frequency(self):
+        """Convert data_frequency to provider format"""
+        if self.frequency not in self.FREQUENCY:
+            raise ValueError(f"unknown frequency: {self.frequency}")
+        return self.FREQUENCY[self.frequency][0]
+
+    @property
+    def chunk_days(self):
+        """Days of bars one request may ask for, None if the range is not limited"""
+        if self.frequency not in self.FREQUENCY:
+            raise ValueError(f"unknown frequency: {self.frequency}")
+        return self.FREQUENCY[self.frequency][1]
+
     def _sliding_window_scaled_data(self, data_list: list):
         """"""
         if DEBUG:
-            logger.debug(f"_sliding_window_scaled_data(data_list={data_list})")
+            logger.debug("_sliding_window_scaled_data(data_list=%s)", data_list)
 
         scaled_data = list()
-        v = sliding_window_view(x=data_list, window_shape=self.window_size)
 
-        # scale each row in window view then append last item to scaled_data list
-        for row in v:
-            scaled_row = self.scaler.fit_transform(X=row.reshape(-1, 1))
-            scaled_item = int((scaled_row.item(-1) + 10) * 100)
-            scaled_data.append(scaled_item)
+        if self.scaler_mode == "online":
+            # feed one bar at a time to a rolling scaler, O(n) for MinMaxScaler
+            rolling = rolling_scaler(scaler=self.scaler_name, window_size=self.window_size)
+            for item in np.asarray(data_list, dtype=float).tolist():
+                scaled_item = rolling.update(value=item)
+                if scaled_item is not None:
+                    scaled_data.append(int((scaled_item + 10) * 100))
+        else:
+            v = sliding_window_view(x=data_list, window_shape=self.window_size)
+
+            # scale each row in window view then append last item to scaled_data list
+            for row in v:
+                scaled_row = self.scaler.fit_transform(X=row.reshape(-1, 1))
+                scaled_item = int((scaled_row.item(-1) + 10) * 100)
+                scaled_data.append(scaled_item)
 
         # pad front of scaled_data with average value
         return [int(fmean(scaled_data))] * (self.window_size - 1) + scaled_data
@@ -75,6 +114,88 @@ class BaseProcessor:
             # return RobustScaler(quantile_range=(0.0, 100.0))
             return RobustScaler()
 
+    @staticmethod
+    def _price_data_lines(bars: dict) -> dict:
+        """Returns a dict of rounded price and volume lines, plus mass. Bars is
+        a dict of open, high, low, close, volume arrays of any shape, nan stays nan."""
+        o, h, l, c = bars["open"], bars["high"], bars["low"], bars["close"]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            line = {
+                # difference between the close and open price
+                "clop": np.round((c - o) * 100),
+                # close location value, relative to the high-low range, zero if there is no range
+                "clv": np.round(np.where(h > l, (2 * c - l - h) / (h - l), np.where(h == l, 0, np.nan)) * 100),
+                # close weighted average price exclude open price
+                "cwap": np.round((h + l + 2 * c) * 25),
+                # difference between the high and low price
+                "hilo": np.round((h - l) * 100),
+                # number of shares traded
+                "volume": np.round(bars["volume"]),
+            }
+        # price times number of shares traded
+        line["mass"] = line["cwap"] * line["volume"]
+        return line
+
+    def _sweep_data_lines(self, scaled: dict) -> dict:
+        """Returns a dict {column: array}, every sweep window size and scaler
+        for each scaled data line. Scaled holds the unscaled series (sc_vol:
+        volume, ...), 1-D or (ticker, date) arrays. Empty if there is no sweep."""
+        if DEBUG:
+            logger.debug(f"_sweep_data_lines(window={self.sweep_window}, scaler={self.sweep_scaler})")
+
+        line = dict()
+        for item in self.data_line:
+            name = item.lower()
+            if name not in scaled or not (self.sweep_window and self.sweep_scaler):
+                continue
+            x = np.asarray(scaled[name], dtype=float)
+            sweep = window_scale_sweep(x=x, window_size=self.sweep_window, scaler=self.sweep_scaler)
+            for (w, s), value in sweep.items():
+                column = sweep_columns(data_line=[name], window_size=[w], scaler=[s])[0]
+                line[column] = scaled_data_line(scaled=value, valid=~np.isnan(x), window_size=w)
+        return line
+
+    def _data_line_frame(self, ticker: str, date: np.ndarray, bars: dict) -> tuple:
+        """Returns a tuple (ticker, dataframe). Bars is a dict of open, high,
+        low, close, volume arrays, adds a column to dataframe for each data line."""
+        if DEBUG:
+            logger.debug(f"_data_line_frame(ticker={ticker}, date={len(date)}, bars={list(bars)})")
+
+        # create empty dataframe with index as a timestamp
+        df = pd.DataFrame(index=date)
+        df.index.name = "date"
+
+        line = {key: value.astype(np.int64) for key, value in self._price_data_lines(bars=bars).items()}
+        if DEBUG:
+            logger.debug("price data lines: %s", line)
+        mass = line.pop("mass")
+
+        scaled = {"sc_cwap": line["cwap"], "sc_mass": mass, "sc_vol": line["volume"]}
+        for item in self.data_line:
+            name = item.lower()
+            if name in line:
+                continue
+            elif name in scaled:
+                line[name] = self._sliding_window_scaled_data(data_list=scaled[name])
+            elif indicator.is_data_line(name):
+                # indicator warmup bars are stored as NULL
+                line[name] = [None if np.isnan(v) else int(v) for v in indicator.data_line(name=name, bars=bars)]
+            else:
+                raise ValueError(f"unknown data line: {item}")
+            if DEBUG:
+                logger.debug("%s: %s", name, line[name])
+
+        # insert values for each data line into df
+        for i, item in enumerate(self.data_line):
+            df.insert(loc=i, column=f"{item.lower()}", value=line[item.lower()], allow_duplicates=True)
+
+        # then a column for each sweep setting
+        for column, value in self._sweep_data_lines(scaled=scaled).items():
+            df[column] = [None if np.isnan(v) else int(v) for v in value]
+
+        return ticker, df
+
     def download_and_parse_price_data(self, ticker: str) -> tuple:
         """Returns a tuple, (ticker, dataframe)"""
         if DEBUG:
@@ -88,16 +209,54 @@ class BaseProcessor:
             print("processing data\t", end="")
         return eval(f"self._process_{self.data_provider}_data(data_gen=data_gen)")
 
+    def download_price_bars(self, ticker: str) -> tuple:
+        """Returns a tuple (ticker, date, bars), bars is a dict of ohlcv arrays"""
+        if DEBUG:
+            logger.debug(f"download_price_bars(self={self}, ticker={ticker})")
+
+        data_gen = eval(f"self._{self.data_provider}_data_generator(ticker=ticker)")
+        return eval(f"self._parse_{self.data_provider}_data(data_gen=data_gen)")
+
+    def download_price_chunks(self, ticker: str) -> object:
+        """Yields a tuple (ticker, date, bars) for each chunk_days range from
+        start to end date, oldest first. Ranges may overlap by a day if the
+        provider end date is inclusive. Start and end date are restored."""
+        if DEBUG:
+            logger.debug(f"download_price_chunks(self={self}, ticker={ticker})")
+
+        start, end = self.start_date, self.end_date
+        days = datetime.timedelta(days=self.chunk_days or max((end - start).days, 1))
+        try:
+            while self.start_date < end:
+                self.end_date = min(self.start_date + days, end)
+                yield self.download_price_bars(ticker=ticker)
+                self.start_date = self.end_date
+        finally:
+            self.start_date, self.end_date = start, end
+
 
 class TiingoDataProcessor(BaseProcessor):
     """Fetch ohlc price data from tiingo.com"""
 
     from tiingo import TiingoClient
 
+    # intraday bars come from the iex endpoint, its replies are capped at about 10000 rows
+    FREQUENCY = {
+        "daily": ("daily", None),
+        "weekly": ("weekly", None),
+        "1h": ("1hour", 365),
+        "30m": ("30min", 180),
+        "15m": ("15min", 90),
+        "5m": ("5min", 30),
+        "1m": ("1min", 7),
+    }
+
     def __init__(self, ctx: dict):
         super().__init__(ctx=ctx)
         self.api_key = {os.getenv("TOKEN_TIINGO")}
+        self.client = None  # created on first download, then reused for every ticker
         self.frequency = ctx["data_service"]["data_frequency"]
+        self.resample = self._parse_frequency
 
     def __repr__(self):
         return (
@@ -117,20 +276,28 @@ class TiingoDataProcessor(BaseProcessor):
         if DEBUG:
             logger.debug(f"_tiingo_data_generator(ticker={ticker})")
 
-        config = {}
-        # To reuse the same HTTP Session across API calls
-        # (and have better performance), include a session key.
-        config["session"] = True
-        # If you don't have your API key as an environment variable,
-        # pass it in via a configuration dictionary.
-        config["api_key"] = self.api_key
-        config["api_key"] = os.getenv("TOKEN_TIINGO")
-        # Initialize
-        client = self.TiingoClient(config)
-
+        if self.client is None:
+            config = {}
+            # To reuse the same HTTP Session across API calls
+            # (and have better performance), include a session key.
+            config["session"] = True
+            # If you don't have your API key as an environment variable,
+            # pass it in via a configuration dictionary.
+            config["api_key"] = self.api_key
+            config["api_key"] = os.getenv("TOKEN_TIINGO")
+            # Initialize
+            self.client = self.TiingoClient(config)
+
+        # intraday replies only hold the close unless the columns are named
+        columns = None if self.chunk_days is None else "open,high,low,close,volume"
         try:
-            historical_prices = client.get_ticker_price(
-                ticker=ticker, fmt='json', startDate=self.start_date, endDate=self.end_date, frequency=self.frequency
+            historical_prices = self.client.get_ticker_price(
+                ticker=ticker,
+                fmt='json',
+                startDate=self.start_date,
+                endDate=self.end_date,
+                columns=columns,
+                frequency=self.resample,
             )
         except Exception as e:
             logger.debug(f"*** ERROR *** {e}")
@@ -145,72 +312,35 @@ class TiingoDataProcessor(BaseProcessor):
         #     ticker, historical_prices = pickle.load((pkl))
         # yield ticker, historical_prices
 
-    def _process_tiingo_data(self, data_gen: object) -> list[tuple]:
-        """Returns a tuple (ticker, dataframe)"""
+    def _parse_tiingo_data(self, data_gen: object) -> tuple:
+        """Returns a tuple (ticker, date, bars)"""
         if DEBUG:
-            logger.debug(f"_process_tiingo_data(data_gen={type(data_gen)})")
+            logger.debug(f"_parse_tiingo_data(data_gen={type(data_gen)})")
 
         ticker, dict_list = next(data_gen)  # unpack items in data_gen
 
-        # create empty dataframe with index as a timestamp
-        df = pd.DataFrame(
-            index=[
-                round(time.mktime(datetime.datetime.strptime(d["date"][:10], "%Y-%m-%d").timetuple()))
-                for d in dict_list
-            ]
-        )
-        df.index.name = "date"
-
-        # difference between the close and open price
-        clop = [round((d["adjClose"] - d["adjOpen"]) * 100) for d in dict_list]
-        if DEBUG:
-            logger.debug(f"clop: {clop} {type(clop)}")
-
-        # close location value, relative to the high-low range
-        try:
-            clv = [
-                round(((2 * d["adjClose"] - d["adjLow"] - d["adjHigh"]) / (d["adjHigh"] - d["adjLow"])) * 100)
-                for d in dict_list
-            ]
-            if DEBUG:
-                logger.debug(f"clv: {clv} {type(clv)}")
-        except ZeroDivisionError as e:
-            logger.debug(f"*** ERROR *** {e}")
-
-        # close weighted average price exclude open price
-        cwap = [round(((d["adjHigh"] + d["adjLow"] + 2 * d["adjClose"]) / 4) * 100) for d in dict_list]
-        if DEBUG:
-            logger.debug(f"cwap array: {cwap} {type(cwap)}")
-
-        sc_cwap = self._sliding_window_scaled_data(data_list=cwap)
-        if DEBUG:
-            logger.debug(f"scaled cwap: {sc_cwap} {type(sc_cwap)} len {len(cwap)}")
-
-        # difference between the high and low price
-        hilo = [round((d["adjHigh"] - d["adjLow"]) * 100) for d in dict_list]
-        if DEBUG:
-            logger.debug(f"hilo: {hilo} {type(hilo)}")
+        # one pass over the rows into a (row, field) array, then a column for each field,
+        # daily bars are split adjusted, intraday bars from iex are not
+        if self.chunk_days is None:
+            row = itemgetter("date", "adjOpen", "adjHigh", "adjLow", "adjClose", "adjVolume")
+        else:
+            row = itemgetter("date", "open", "high", "low", "close", "volume")
+        column = list(zip(*map(row, dict_list))) or [()] * 6
+        values = np.array(column[1:], dtype=float).reshape(5, -1)
+        bars = dict(zip(("open", "high", "low", "close", "volume"), values))
 
-        # number of shares traded
-        volume = [d["adjVolume"] for d in dict_list]
-        if DEBUG:
-            logger.debug(f"volume array: {volume} {type(volume)}")
+        # index as a timestamp, UTC seconds of the ISO date i.e. '2024-01-02T14:30:00.000Z'
+        date = np.array(column[0], dtype="U19").astype("datetime64[s]").astype(np.int64)
 
-        sc_vol = self._sliding_window_scaled_data(data_list=volume)
-        if DEBUG:
-            logger.debug(f"scaled volume: {sc_vol} {type(sc_vol)} len {len(volume)}")
+        return ticker, date, bars
 
-        # price times number of shares traded
-        mass = [c * v for c, v in zip(cwap, volume)]
-        sc_mass = self._sliding_window_scaled_data(data_list=mass)
+    def _process_tiingo_data(self, data_gen: object) -> tuple:
+        """Returns a tuple (ticker, dataframe)"""
         if DEBUG:
-            logger.debug(f"scaled_mass: {sc_mass} {type(sc_mass)}")
-
-        # insert values for each data line into df
-        for i, item in enumerate(self.data_line):
-            df.insert(loc=i, column=f"{item.lower()}", value=eval(item.lower()), allow_duplicates=True)
+            logger.debug(f"_process_tiingo_data(data_gen={type(data_gen)})")
 
-        return ticker, df
+        ticker, date, bars = self._parse_tiingo_data(data_gen=data_gen)
+        return self._data_line_frame(ticker=ticker, date=date, bars=bars)
 
 
 class YahooFinanceDataProcessor(BaseProcessor):
@@ -218,6 +348,17 @@ class YahooFinanceDataProcessor(BaseProcessor):
 
     import yfinance as yf
 
+    # yahoo refuses intraday ranges longer than these, and history older than 730 or 60 days
+    FREQUENCY = {
+        "daily": ("1d", None),
+        "weekly": ("1wk", None),
+        "1h": ("1h", 365),
+        "30m": ("30m", 59),
+        "15m": ("15m", 59),
+        "5m": ("5m", 59),
+        "1m": ("1m", 7),
+    }
+
     def __init__(self, ctx: dict):
         super().__init__(ctx=ctx)
         self.interval = self._parse_frequency
@@ -233,12 +374,6 @@ class YahooFinanceDataProcessor(BaseProcessor):
             f"end_date={self.end_date})"
         )
 
-    @property
-    def _parse_frequency(self):
-        """Convert daily/weekly frequency to provider format"""
-        frequency_dict = {"daily": "1d", "weekly": "1w"}
-        return frequency_dict[self.frequency]
-
     def _yfinance_data_generator(self, ticker: str) -> object:
         """Yields a generator object tuple (ticker, dataframe)"""
 
@@ -261,69 +396,274 @@ class YahooFinanceDataProcessor(BaseProcessor):
         #     ticker, df = pickle.load((pkl))
         # yield ticker, df
 
-    def _process_yfinance_data(self, data_gen: object) -> pd.DataFrame:
-        """Returns a tuple (ticker, dataframe)"""
+    def _parse_yfinance_data(self, data_gen: object) -> tuple:
+        """Returns a tuple (ticker, date, bars)"""
         if DEBUG:
-            logger.debug(f"_process_yfinance_data(data_gen={type(data_gen)})")
+            logger.debug(f"_parse_yfinance_data(data_gen={type(data_gen)})")
 
         ticker, yf_df = next(data_gen)
         # remove unused columns
         yf_df = yf_df.drop(columns=yf_df.columns.values[-3:], axis=1)
         if DEBUG:
-            logger.debug(f"ticker: {ticker}, yf_df:\n{yf_df}")
+            logger.debug("ticker: %s, yf_df: %s", ticker, yf_df)
 
-        # create empty dataframe with index as a timestamp, trim off minutes seconds
-        df = pd.DataFrame(index=yf_df.index.values.astype(int) // 10**9)
-        df.index.name = "date"
+        # index as a timestamp, trim off minutes seconds
+        date = yf_df.index.values.astype(int) // 10**9
+        bars = {key: yf_df[key.title()].to_numpy(dtype=float) for key in ("open", "high", "low", "close", "volume")}
+
+        return ticker, date, bars
 
-        # difference between the close and open price
-        clop = list(round((yf_df["Close"] - yf_df["Open"]) * 100).astype(int))
+    def _process_yfinance_data(self, data_gen: object) -> tuple:
+        """Returns a tuple (ticker, dataframe)"""
         if DEBUG:
-            logger.debug(f"clop: {clop} {type(clop)}")
+            logger.debug(f"_process_yfinance_data(data_gen={type(data_gen)})")
 
-        # close location value, relative to the high-low range
-        try:
-            clv = list(
-                round(
-                    (2 * yf_df["Close"] - yf_df["Low"] - yf_df["High"]) / (yf_df["High"] - yf_df["Low"]) * 100
-                ).astype(int)
-            )
-            if DEBUG:
-                logger.debug(f"clv: {clv} {type(clv)}")
-        except ZeroDivisionError as e:
-            logger.debug(f"*** ERROR *** {e}")
+        ticker, date, bars = self._parse_yfinance_data(data_gen=data_gen)
+        return self._data_line_frame(ticker=ticker, date=date, bars=bars)
 
-        # close weighted average price exclude open price
-        cwap = list(round((2 * yf_df["Close"] + yf_df["High"] + yf_df["Low"]) * 25).astype(int))
-        if DEBUG:
-            logger.debug(f"cwap array: {cwap} {type(cwap)}")
 
-        sc_cwap = self._sliding_window_scaled_data(data_list=cwap)
+class LocalDataProcessor(BaseProcessor):
+    """Read ohlc price data from a directory of csv or parquet files,
+    one file per ticker named after it, i.e. AAPL.csv or AAPL.parquet"""
+
+    SUFFIX = (".csv", ".csv.gz", ".parquet", ".pq")
+
+    # a file holds bars of any frequency, read in one go
+    FREQUENCY = {name: (name, None) for name in ("daily", "weekly", "1h", "30m", "15m", "5m", "1m")}
+
+    def __init__(self, ctx: dict):
+        super().__init__(ctx=ctx)
+        self.local_dir = os.path.expanduser(ctx["data_service"]["local_dir"])
+        self.files = self.scan_files()
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}("
+            f"data_line={self.data_line}, "
+            f"local_dir={self.local_dir}, "
+            f"files={len(self.files)}, "
+            f"scaler={self.scaler}, "
+            f"start_date={self.start_date}, "
+            f"end_date={self.end_date})"
+        )
+
+    def scan_files(self) -> dict:
+        """Returns a dict {ticker: path} of the price files in local_dir"""
         if DEBUG:
-            logger.debug(f"scaled cwap: {sc_cwap} {type(sc_cwap)} len {len(cwap)}")
+            logger.debug(f"scan_files(local_dir={self.local_dir})")
+
+        files = dict()
+        with os.scandir(self.local_dir) as entries:
+            for entry in entries:
+                suffix = next((s for s in self.SUFFIX if entry.name.lower().endswith(s)), None)
+                if suffix and entry.is_file():
+                    files[entry.name[: -len(suffix)].upper()] = entry.path
+        return files
+
+    def _read_file(self, path: str) -> object:
+        """Columnar read, pyarrow if it is installed, the C parser memory maps plain csv"""
+        if path.lower().endswith((".parquet", ".pq")):
+            return pd.read_parquet(path)
+        try:
+            return pd.read_csv(path, engine="pyarrow")
+        except ImportError:
+            return pd.read_csv(path, memory_map=path.lower().endswith(".csv"))
 
-        # difference between the high and low price
-        hilo = list(round((yf_df["High"] - yf_df["Low"]) * 100).astype(int))
+    def _local_data_generator(self, ticker: str) -> object:
+        """Yields a tuple (ticker, dataframe)"""
         if DEBUG:
-            logger.debug(f"hilo: {hilo} {type(hilo)}")
+            logger.debug(f"_local_data_generator(ticker={ticker})")
+
+        try:
+            df = self._read_file(path=self.files[ticker.upper()])
+        except Exception as e:
+            logger.debug(f"*** ERROR *** {e}")
+        else:
+            yield ticker, df
 
-        # number of shares traded
-        volume = list(yf_df["Volume"])
+    def _parse_local_data(self, data_gen: object) -> tuple:
+        """Returns a tuple (ticker, date, bars) of the rows between start and end date, None is unbounded"""
+        if DEBUG:
+            logger.debug(f"_parse_local_data(data_gen={type(data_gen)})")
+
+        ticker, df = next(data_gen)
+        df.columns = [f"{col}".strip().lower() for col in df.columns]
+        date_column = next((col for col in ("date", "datetime", "timestamp", "time") if col in df.columns), None)
+        if date_column is None:
+            raise ValueError(f"no date column for {ticker}: {list(df.columns)}")
+
+        # index as a timestamp, naive dates are taken as UTC
+        date = pd.to_datetime(df[date_column], utc=True).dt.tz_localize(None).to_numpy()
+        date = date.astype("datetime64[s]").astype(np.int64)
+        keep = np.ones(len(date), dtype=bool)
+        if self.start_date is not None:
+            keep &= date >= np.datetime64(self.start_date, "s").astype(np.int64)
+        if self.end_date is not None:
+            keep &= date < np.datetime64(self.end_date, "s").astype(np.int64)
+        order = np.argsort(date[keep], kind="stable")
+
+        bars = {key: df[key].to_numpy(dtype=float)[keep][order] for key in ("open", "high", "low", "close", "volume")}
+        return ticker, date[keep][order], bars
+
+    def _process_local_data(self, data_gen: object) -> tuple:
+        """Returns a tuple (ticker, dataframe)"""
         if DEBUG:
-            logger.debug(f"volume array: {volume} {type(volume)}")
+            logger.debug(f"_process_local_data(data_gen={type(data_gen)})")
 
-        sc_vol = self._sliding_window_scaled_data(data_list=volume)
+        ticker, date, bars = self._parse_local_data(data_gen=data_gen)
+        return self._data_line_frame(ticker=ticker, date=date, bars=bars)
+
+
+class ProviderLatency:
+    """Recent download times for each provider, a failure counts as infinite"""
+
+    def __init__(self, provider: list, samples: int = 100):
+        self.lock = threading.Lock()
+        self.seconds = {name: deque(maxlen=samples) for name in provider}
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({ {name: self.median(name) for name in self.seconds} })"
+
+    def record(self, provider: str, seconds: float):
+        with self.lock:
+            self.seconds[provider].append(seconds)
+
+    def median(self, provider: str) -> float:
+        """Median of recent samples, 0 if there are none so untried providers go first"""
+        with self.lock:
+            sample = list(self.seconds[provider])
+        return float(np.median(sample)) if sample else 0.0
+
+    def percentile(self, provider: str, q: float, minimum: int = 5) -> float:
+        """Percentile of recent successful downloads, None if there are fewer than minimum"""
+        with self.lock:
+            sample = [s for s in self.seconds[provider] if s != float("inf")]
+        return float(np.percentile(sample, q)) if len(sample) >= minimum else None
+
+    def ranked(self) -> list:
+        """Provider names, fastest first"""
+        return sorted(self.seconds, key=self.median)
+
+
+class HedgedDataProcessor(BaseProcessor):
+    """Fetch ohlc price data from several providers. The primary is the
+    provider with the lowest median latency. If it takes longer than its
+    hedge_percentile latency a hedged request goes to the next provider,
+    on an error the next provider is tried at once. First good reply wins."""
+
+    def __init__(self, ctx: dict):
+        super().__init__(ctx=ctx)
+        provider_class = {"tiingo": TiingoDataProcessor, "yfinance": YahooFinanceDataProcessor}
+        self.provider = dict()
+        for name in ctx["data_service"]["hedge_provider"].split():
+            if name not in provider_class:
+                raise ValueError(f"unknown provider: {name}")
+            self.provider[name] = provider_class[name](ctx=ctx)
+            self.provider[name].data_provider = name
+        self.hedge_delay = float(ctx["data_service"]["hedge_delay"])
+        self.hedge_percentile = float(ctx["data_service"]["hedge_percentile"])
+        self.latency = ProviderLatency(provider=list(self.provider))
+        self.executor = ThreadPoolExecutor(max_workers=2 * len(self.provider))
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}("
+            f"data_line={self.data_line}, "
+            f"latency={self.latency}, "
+            f"scaler={self.scaler}, "
+            f"start_date={self.start_date}, "
+            f"end_date={self.end_date})"
+        )
+
+    @property
+    def chunk_days(self):
+        """Shortest range any of the providers may be asked for"""
+        days = [processor.chunk_days for processor in self.provider.values()]
+        return min((d for d in days if d is not None), default=None)
+
+    def _timed_download(self, name: str, ticker: str, start_date: datetime.date, end_date: datetime.date) -> tuple:
+        """Runs in a worker thread, returns (ticker, date, bars) and records the latency.
+        Downloads with a copy of the provider, a request still running for an
+        earlier ticker or chunk keeps its own dates."""
+        processor = copy.copy(self.provider[name])
+        processor.start_date, processor.end_date = start_date, end_date
+        start = time.perf_counter()
+        try:
+            ticker, date, bars = processor.download_price_bars(ticker=ticker)
+            # an intraday chunk over a weekend or holiday has no bars
+            if not len(date) and self.chunk_days is None:
+                raise ValueError(f"no bars for {ticker}")
+        except BaseException:
+            self.latency.record(provider=name, seconds=float("inf"))
+            raise
+        self.latency.record(provider=name, seconds=time.perf_counter() - start)
+        # the tiingo client is made on first use, later copies reuse its http session
+        if getattr(self.provider[name], "client", False) is None:
+            self.provider[name].client = processor.client
+        return ticker, date, bars
+
+    def _hedged_data_generator(self, ticker: str) -> object:
+        """Yields a tuple (provider, ticker, date, bars) from the first provider to answer"""
+        if DEBUG:
+            logger.debug(f"_hedged_data_generator(ticker={ticker}, latency={self.latency})")
+
+        waiting = self.latency.ranked()
+        running, error = dict(), list()
+
+        def submit():
+            name = waiting.pop(0)
+            running[self.executor.submit(self._timed_download, name, ticker, self.start_date, self.end_date)] = name
+
+        submit()
+        while running:
+            # hedge once the primary is slower than usual, otherwise wait for any reply
+            delay = None
+            if waiting:
+                delay = self.latency.percentile(provider=list(running.values())[-1], q=self.hedge_percentile)
+                delay = self.hedge_delay if delay is None else delay
+            done, _ = wait(running, timeout=delay, return_when=FIRST_COMPLETED)
+            if not done:
+                if DEBUG:
+                    logger.debug(f"hedge {ticker} to {waiting[0]} after {delay:.2f}s")
+                submit()
+                continue
+
+            for future in done:
+                name = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.debug(f"*** ERROR *** {name} {ticker} {e}")
+                    error.append(f"{name}: {e}")
+                    # fail over to the next provider
+                    if waiting:
+                        submit()
+                    continue
+                # drop the losing requests not started yet, a running one finishes on its own copy
+                for other in running:
+                    other.cancel()
+                yield name, *result
+                return
+        raise RuntimeError(f"all providers failed for {ticker}, {'; '.join(error)}")
+
+    def _parse_hedged_data(self, data_gen: object) -> tuple:
+        """Returns a tuple (ticker, date, bars). Providers stamp a bar with
+        their own midnight, daily dates are rounded to the UTC midnight of the
+        trading day so a table reads the same whichever provider answered."""
         if DEBUG:
-            logger.debug(f"scaled volume: {sc_vol} {type(sc_vol)} len {len(volume)}")
+            logger.debug(f"_parse_hedged_data(data_gen={type(data_gen)})")
 
-        # price times number of shares traded
-        mass = [c * v for c, v in zip(cwap, volume)]
-        sc_mass = self._sliding_window_scaled_data(data_list=mass)
+        name, ticker, date, bars = next(data_gen)
+        if self.chunk_days is None:
+            date = (np.asarray(date, dtype=np.int64) + 43200) // 86400 * 86400
         if DEBUG:
-            logger.debug(f"scaled_mass: {sc_mass} {type(sc_mass)}")
+            logger.debug(f"{ticker} from {name}")
+        return ticker, date, bars
 
-        # insert values for each data line into df
-        for i, item in enumerate(self.data_line):
-            df.insert(loc=i, column=f"{item.lower()}", value=eval(item.lower()), allow_duplicates=True)
+    def _process_hedged_data(self, data_gen: object) -> tuple:
+        """Returns a tuple (ticker, dataframe)"""
+        if DEBUG:
+            logger.debug(f"_process_hedged_data(data_gen={type(data_gen)})")
 
-        return ticker, df
+        ticker, date, bars = self._parse_hedged_data(data_gen=data_gen)
+        return self._data_line_frame(ticker=ticker, date=date, bars=bars)
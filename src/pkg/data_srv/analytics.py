@@ -0,0 +1,316 @@
+"""src/pkg/data_srv/analytics.py\n
+Cross-ticker analytics of one data line, i.e. sc_vol or clv, for\n
+every ticker in the stonk database. The line is read into a\n
+(ticker, date) panel with one query per table. The correlation\n
+matrix keeps pairwise sums over the rolling window, a date added\n
+or dropped is one blocked matrix product, so the window steps one\n
+date at a time through the newest analytics_series dates. Sums, ranks\n
+and the mean correlation of each ticker at each step are cached in the\n
+work directory, a rerun only adds the new or changed dates.\n
+class RollingCorrelation\n
+cluster_tickers(x: np.ndarray, k: int, block_size: int) -> np.ndarray\n
+cross_section_rank(x: np.ndarray) -> np.ndarray\n
+read_line_panel(ctx: dict, line: str, frequency: str) -> tuple\n
+run_stonk_analytics(ctx: dict) -> dict
+"""
+
+import logging, sqlite3
+
+from pathlib import Path
+
+import numpy as np
+
+from pkg import DEBUG
+from pkg.data_srv.utils import read_stonk_columns, select_stonk_tables
+
+
+logger = logging.getLogger(__name__)
+
+
+class RollingCorrelation:
+    """Pairwise complete correlation of every ticker over the last window
+    dates. For each pair the number of shared dates and the sums of x, x
+    squared and x times y over those dates are kept as (ticker, ticker)
+    matrices, so adding or dropping dates never revisits the others."""
+
+    STATE = ("date", "x", "count", "total", "square", "product")
+
+    def __init__(self, ticker: list, window: int, block_size: int = 512):
+        size = len(ticker)
+        self.ticker = list(ticker)
+        self.window = window
+        self.block_size = block_size
+        self.date = np.empty(0, dtype=np.int64)
+        self.x = np.empty((size, 0))  # values of the dates in the window
+        self.count = np.zeros((size, size))
+        self.total = np.zeros((size, size))  # [i, j] sum of x[i] over dates both have
+        self.square = np.zeros((size, size))
+        self.product = np.zeros((size, size))
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(ticker={len(self.ticker)}, window={self.window}, dates={len(self.date)})"
+
+    def _add(self, x: np.ndarray, sign: int):
+        """Add (sign 1) or remove (sign -1) the (ticker, date) columns x, a block of rows at a time"""
+        valid = ~np.isnan(x)
+        value = np.where(valid, x, 0)
+        mask = valid.astype(float)
+        for start in range(0, len(value), self.block_size):
+            rows = slice(start, start + self.block_size)
+            self.count[rows] += sign * (mask[rows] @ mask.T)
+            self.total[rows] += sign * (value[rows] @ mask.T)
+            self.square[rows] += sign * (value[rows] ** 2 @ mask.T)
+            self.product[rows] += sign * (value[rows] @ value.T)
+
+    def update(self, date: np.ndarray, x: np.ndarray):
+        """Append dates newer than the window, x is their (ticker, date) values.
+        Dates that fall out of the window are removed from the sums."""
+        if DEBUG:
+            logger.debug(f"update(self={self}, date={len(date)})")
+
+        date, x = date[-self.window :], x[:, -self.window :]
+        keep = max(len(self.date) + len(date) - self.window, 0)
+        if keep >= len(self.date):
+            # every cached date leaves the window, start over
+            self.__init__(ticker=self.ticker, window=self.window, block_size=self.block_size)
+        elif keep:
+            self._add(self.x[:, :keep], sign=-1)
+        self._add(x, sign=1)
+        self.date = np.concatenate([self.date[keep:], date])
+        self.x = np.concatenate([self.x[:, keep:], x], axis=1)
+
+    def series(self, date: np.ndarray, x: np.ndarray, min_periods: int = 2) -> object:
+        """Append the dates one at a time, yields a tuple (date, matrix) of
+        the window ending at each date, see update() and matrix()"""
+        for i in range(len(date)):
+            self.update(date=date[i : i + 1], x=x[:, i : i + 1])
+            yield date[i], self.matrix(min_periods=min_periods)
+
+    def matrix(self, min_periods: int = 2) -> np.ndarray:
+        """Returns the (ticker, ticker) correlation matrix, nan where a pair
+        shares fewer than min_periods dates or a series is constant"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean_x = self.total / self.count
+            mean_y = mean_x.T
+            covariance = self.product / self.count - mean_x * mean_y
+            variance_x = self.square / self.count - mean_x**2
+            variance = variance_x * variance_x.T
+            correlation = np.where(variance > 0, covariance / np.sqrt(variance), np.nan)
+        correlation[self.count < max(min_periods, 2)] = np.nan
+        return np.clip(correlation, -1, 1)
+
+    def save(self, path: str):
+        np.savez(path, ticker=np.array(self.ticker), window=self.window, **{k: getattr(self, k) for k in self.STATE})
+
+    @classmethod
+    def load(cls, path: str, block_size: int = 512) -> object:
+        """Returns the saved RollingCorrelation, None if there is no cache file"""
+        try:
+            with np.load(path) as data:
+                rolling = cls(ticker=data["ticker"].tolist(), window=int(data["window"]), block_size=block_size)
+                for key in cls.STATE:
+                    setattr(rolling, key, data[key])
+        except FileNotFoundError:
+            return None
+        return rolling
+
+
+def cluster_tickers(x: np.ndarray, k: int, block_size: int = 512, iterations: int = 50) -> np.ndarray:
+    """K-means on the (ticker, date) values of x, each row centered and scaled
+    to unit length so the squared distance between two rows is 2 - 2 * their
+    correlation. Missing values count as the row mean. Returns a cluster
+    number for each row, -1 for rows with fewer than two values."""
+    if DEBUG:
+        logger.debug(f"cluster_tickers(x={np.shape(x)}, k={k})")
+
+    valid = ~np.isnan(x)
+    label = np.full(len(x), -1)
+    usable = valid.sum(axis=1) >= 2
+    z = np.where(valid, x - np.nanmean(np.where(usable[:, None], x, 0), axis=1, keepdims=True), 0)[usable]
+    norm = np.linalg.norm(z, axis=1, keepdims=True)
+    z = np.divide(z, norm, out=np.zeros_like(z), where=norm > 0)
+    if not len(z):
+        return label
+    k = min(k, len(z))
+
+    # k-means++ seeding, fixed seed so a rerun gives the same clusters
+    rng = np.random.default_rng(0)
+    centroid = [z[rng.integers(len(z))]]
+    distance = np.full(len(z), np.inf)
+    for _ in range(1, k):
+        distance = np.minimum(distance, ((z - centroid[-1]) ** 2).sum(axis=1))
+        centroid.append(z[rng.choice(len(z), p=distance / distance.sum())] if distance.sum() else z[0])
+    centroid = np.array(centroid)
+
+    assigned = np.full(len(z), -1)
+    for _ in range(iterations):
+        # argmin of |z|^2 - 2 z.c + |c|^2, |z|^2 is the same for every centroid
+        nearest = np.empty(len(z), dtype=int)
+        for start in range(0, len(z), block_size):
+            block = z[start : start + block_size]
+            nearest[start : start + block_size] = np.argmin((centroid**2).sum(axis=1) - 2 * block @ centroid.T, axis=1)
+        if np.array_equal(nearest, assigned):
+            break
+        assigned = nearest
+        size = np.bincount(assigned, minlength=k)
+        total = np.zeros_like(centroid)
+        np.add.at(total, assigned, z)
+        # an empty cluster keeps its centroid
+        centroid = np.where(size[:, None] > 0, total / np.maximum(size, 1)[:, None], centroid)
+
+    label[usable] = assigned
+    return label
+
+
+def cross_section_rank(x: np.ndarray) -> np.ndarray:
+    """Percentile rank, 0 to 1, of each ticker among the tickers with a value
+    on the same date. X is a (ticker, date) array, nan stays nan."""
+    valid = ~np.isnan(x)
+    order = np.argsort(np.where(valid, x, np.inf), axis=0, kind="stable")
+    rank = np.empty(x.shape)
+    np.put_along_axis(rank, order, np.arange(len(x), dtype=float)[:, None].repeat(x.shape[1], axis=1), axis=0)
+    rank /= np.maximum(valid.sum(axis=0) - 1, 1)
+    rank[~valid] = np.nan
+    return rank
+
+
+def read_line_panel(ctx: dict, line: str, frequency: str = "daily") -> tuple:
+    """Returns a tuple (ticker, date, x), x is the (ticker, date) array of data
+    line values on the union of all dates, nan where a ticker has no bar"""
+    if DEBUG:
+        logger.debug(f"read_line_panel(ctx={type(ctx)}, line={line}, frequency={frequency})")
+
+    ticker = select_stonk_tables(ctx=ctx, frequency=frequency)
+    series = list()
+    for table in ticker:
+        try:
+            series.append(read_stonk_columns(ctx=ctx, table=table, column=[line]))
+        except sqlite3.OperationalError:
+            raise ValueError(f"unknown data line: {line}")
+
+    date = np.unique(np.concatenate([item[0] for item in series] + [[]])).astype(np.int64)
+    x = np.full((len(ticker), len(date)), np.nan)
+    for row, (item_date, item_line) in enumerate(series):
+        x[row, np.searchsorted(date, item_date)] = item_line[line]
+    return ticker, date, x
+
+
+def _cache_path(ctx: dict, line: str, window: int) -> tuple:
+    folder = f"{ctx['default']['work_dir']}{ctx['interface']['command']}"
+    name = f"{ctx['interface']['database'].rsplit('.', 1)[0]}_{line}_w{window}"
+    return f"{folder}/_analytics_{name}.npz", f"{folder}/_rank_{name}.npz", f"{folder}/_series_{name}.npz"
+
+
+def _mean_correlation(matrix: np.ndarray) -> np.ndarray:
+    """Mean correlation of each ticker with the others, nan if it has none"""
+    matrix = matrix.copy()
+    np.fill_diagonal(matrix, np.nan)
+    valid = ~np.isnan(matrix)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(valid, matrix, 0).sum(axis=1) / valid.sum(axis=1)
+
+
+def _update_correlation(
+    rolling: object, ticker: list, date: np.ndarray, x: np.ndarray, min_periods: int, series: int
+) -> tuple:
+    """Step through the dates after the cached window, or start over if the
+    cache is for other tickers, or the stored dates or values of its window
+    have changed. Only the last series of the new dates are stepped through
+    one at a time. Returns a tuple (rolling, fresh, date, mean), fresh if it
+    started over, mean the (ticker, date) mean correlation at each step."""
+    fresh = True
+    if rolling.ticker == ticker and len(rolling.date):
+        # a bar written inside the window since the last run adds a date there
+        inside = (date >= rolling.date[0]) & (date <= rolling.date[-1])
+        if np.array_equal(date[inside], rolling.date) and np.array_equal(x[:, inside], rolling.x, equal_nan=True):
+            fresh = False
+    if fresh:
+        rolling = RollingCorrelation(ticker=ticker, window=rolling.window, block_size=rolling.block_size)
+    new = np.flatnonzero(date > rolling.date[-1]) if len(rolling.date) else np.arange(len(date))
+
+    # dates before the last series ones are added at once
+    batch, step = new[: max(len(new) - series, 0)], new[max(len(new) - series, 0) :]
+    rolling.update(date=date[batch], x=x[:, batch])
+    mean = np.full((len(ticker), len(step)), np.nan)
+    for i, (_, matrix) in enumerate(rolling.series(date=date[step], x=x[:, step], min_periods=min_periods)):
+        mean[:, i] = _mean_correlation(matrix)
+    return rolling, fresh, date[step], mean
+
+
+def run_stonk_analytics(ctx: dict) -> dict:
+    """Correlation matrix over the last [data_service] analytics_window dates,
+    the mean correlation of each ticker with the others in the window ending
+    at each of the last analytics_series dates, percentile rank of every date
+    and clusters of analytics_line. Returns a dict with ticker, date,
+    correlation, rank and cluster arrays, and the series_date and its
+    (ticker, date) mean_correlation."""
+    if DEBUG:
+        logger.debug(f"run_stonk_analytics(ctx={type(ctx)})")
+    if not DEBUG:
+        print(" Begin analytics process:")
+
+    line = ctx["data_service"]["analytics_line"].lower()
+    window = int(ctx["data_service"]["analytics_window"])
+    block_size = int(ctx["data_service"]["analytics_block"])
+    min_periods = int(ctx["data_service"]["analytics_min_periods"])
+    series = int(ctx["data_service"]["analytics_series"])
+    corr_path, rank_path, series_path = _cache_path(ctx=ctx, line=line, window=window)
+
+    ticker, date, x = read_line_panel(ctx=ctx, line=line)
+    if not DEBUG:
+        print(f"  - {line} of {len(ticker)} tickers, {len(date)} dates")
+
+    # correlation, only the dates appended since the last run
+    rolling = RollingCorrelation.load(path=corr_path, block_size=block_size)
+    if rolling is None or rolling.window != window:
+        rolling = RollingCorrelation(ticker=ticker, window=window, block_size=block_size)
+    rolling, fresh, series_date, mean = _update_correlation(
+        rolling=rolling, ticker=ticker, date=date, x=x, min_periods=min_periods, series=series
+    )
+    correlation = rolling.matrix(min_periods=min_periods)
+    stepped = len(series_date)
+
+    # the series so far, unless the window started over
+    if not fresh and Path(series_path).exists():
+        with np.load(series_path) as data:
+            if data["ticker"].tolist() == ticker:
+                series_date = np.concatenate([data["date"], series_date])
+                mean = np.concatenate([data["mean"], mean], axis=1)
+    keep = max(len(series_date) - series, 0)
+    series_date, mean = series_date[keep:], mean[:, keep:]
+
+    # ranks of each date are independent, reuse the cached dates whose values are unchanged
+    rank = np.full(x.shape, np.nan)
+    known = np.zeros(len(date), dtype=bool)
+    if Path(rank_path).exists():
+        with np.load(rank_path) as data:
+            if data["ticker"].tolist() == ticker and "x" in data.files:
+                cached = np.flatnonzero(np.isin(data["date"], date))
+                column = np.searchsorted(date, data["date"][cached])
+                old, new = data["x"][:, cached], x[:, column]
+                same = ((old == new) | (np.isnan(old) & np.isnan(new))).all(axis=0)
+                known[column[same]] = True
+                rank[:, column[same]] = data["rank"][:, cached[same]]
+    rank[:, ~known] = cross_section_rank(x[:, ~known])
+
+    cluster = cluster_tickers(rolling.x, k=int(ctx["data_service"]["analytics_clusters"]), block_size=block_size)
+
+    Path(corr_path).parent.mkdir(parents=True, exist_ok=True)
+    rolling.save(corr_path)
+    np.savez(rank_path, ticker=np.array(ticker), date=date, x=x, rank=rank)
+    np.savez(series_path, ticker=np.array(ticker), date=series_date, mean=mean)
+
+    if not DEBUG:
+        print(f"  - {stepped} window steps, {len(series_date) - stepped} from cache")
+        print(f"  - {(~known).sum()} new dates ranked, {len(date) - (~known).sum()} from cache")
+        print(f"  - {np.bincount(cluster[cluster >= 0]).tolist()} tickers per cluster")
+        print(" finished.")
+    return {
+        "ticker": ticker,
+        "date": date,
+        "correlation": correlation,
+        "rank": rank,
+        "cluster": cluster,
+        "series_date": series_date,
+        "mean_correlation": mean,
+    }
@@ -0,0 +1,191 @@
+"""src/pkg/data_srv/blob.py\n
+Compressed storage for [data_service] storage_mode = blob. Each\n
+(ticker, data line, block of blob_block_days) is one BLOB of\n
+delta, zigzag and varint encoded integers, so a full series is a\n
+few BLOB reads that decode straight into numpy arrays. Dates are\n
+stored the same way, as the data line 'date'.\n
+decode_line(data: bytes, count: int) -> np.ndarray\n
+decode_lines(data: list, count: list) -> np.ndarray\n
+encode_line(x: np.ndarray) -> bytes\n
+read_blob_columns(cursor: object, table: str, column: list, since: int, until: int, last: int) -> tuple\n
+write_blob_rows(cursor: object, table: str, date: np.ndarray, line: dict, block_days: int) -> None
+"""
+
+import logging
+
+import numpy as np
+
+from pkg import DEBUG
+
+
+logger = logging.getLogger(__name__)
+
+BLOB_TABLE = "_blob"
+
+# a varint holds 7 bits per byte, 10 bytes cover 64 bits
+GROUPS = 10
+
+
+def encode_line(x: np.ndarray, order: int = 1) -> bytes:
+    """Flag byte, a bitmap of the nan values if flag bit 0 is set, then a
+    varint for the zigzag of each difference to the previous value. Nan
+    repeats the previous value so it costs one byte. Order 2 takes the
+    difference twice, evenly spaced dates are a byte each. Flag bit 1."""
+    x = np.asarray(x, dtype=float)
+    null = np.isnan(x)
+    flag = bytes([int(null.any()) | (order - 1) << 1])
+    head = flag + np.packbits(null).tobytes() if null.any() else flag
+
+    value = np.where(null, 0, np.round(x)).astype(np.int64)
+    if null.any():
+        # carry the last value forward over nan
+        index = np.maximum.accumulate(np.where(null, 0, np.arange(len(x))))
+        value = np.where(null[index], 0, value[index])
+    delta = value
+    for _ in range(order):
+        delta = np.diff(delta, prepend=np.int64(0))
+    zigzag = ((delta << 1) ^ (delta >> 63)).view(np.uint64)
+
+    # only as many 7 bit groups as the largest value needs
+    shift = np.arange(GROUPS, dtype=np.uint64) * np.uint64(7)
+    shift = shift[: 1 + int((zigzag.max(initial=0) >> shift[1:] > 0).sum())]
+    group = ((zigzag[:, None] >> shift) & np.uint64(0x7F)).astype(np.uint8)
+    size = 1 + (zigzag[:, None] >> shift[1:] > 0).sum(axis=1)
+    # high bit marks that another byte of the same value follows
+    group[np.arange(len(shift)) < size[:, None] - 1] |= 0x80
+    return head + group[np.arange(len(shift)) < size[:, None]].tobytes()
+
+
+def decode_line(data: bytes, count: int) -> np.ndarray:
+    """Returns the float array of count values, see encode_line()"""
+    return decode_lines(data=[data], count=[count])
+
+
+def decode_lines(data: list, count: list) -> np.ndarray:
+    """Returns the values of BLOBs encoded with the same order one after
+    the other, decoded together so a full series costs a few numpy calls
+    instead of a few per block"""
+    count = np.asarray(count, dtype=np.int64)
+    if not count.sum():
+        return np.empty(0)
+    offset = [1 + ((n + 7) // 8 if item[0] & 1 else 0) for item, n in zip(data, count.tolist())]
+    byte = np.frombuffer(b"".join(item[h:] for item, h in zip(data, offset)), dtype=np.uint8)
+
+    # each value ends with the first byte below 0x80, its groups are 7 bits apart
+    end = np.flatnonzero(byte < 0x80)
+    start = np.concatenate([[0], end[:-1] + 1])
+    shift = ((np.arange(len(byte)) - np.repeat(start, end - start + 1)) * 7).astype(np.uint64)
+    zigzag = np.add.reduceat((byte & 0x7F).astype(np.uint64) << shift, start)
+    delta = (zigzag >> np.uint64(1)).view(np.int64) ^ -(zigzag & np.uint64(1)).view(np.int64)
+    # running sums restart at each BLOB
+    first = np.cumsum(count) - count
+    for _ in range(1 + (data[0][0] >> 1)):
+        total = np.cumsum(delta)
+        delta = total - np.repeat(np.concatenate([[0], total])[first], count)
+    value = delta.astype(float)
+
+    null = [
+        np.unpackbits(np.frombuffer(item, dtype=np.uint8, count=h - 1, offset=1), count=n)
+        if item[0] & 1
+        else np.zeros(n, dtype=np.uint8)
+        for item, h, n in zip(data, offset, count.tolist())
+    ]
+    value[np.concatenate(null).astype(bool)] = np.nan
+    return value
+
+
+def _decode_blocks(rows: list) -> tuple:
+    """Returns a tuple (date, {line: array}) from (block, line, count, data) rows ordered by block"""
+    blob = dict()
+    for number, line, count, data in rows:
+        blob.setdefault(line, dict())[number] = count, data
+    if "date" not in blob:
+        return np.empty(0, dtype=np.int64), {line: np.empty(0) for line in blob}
+
+    block = list(blob.pop("date").items())
+    count = np.array([item[0] for _, item in block], dtype=np.int64)
+    date = decode_lines(data=[item[1] for _, item in block], count=count).astype(np.int64)
+    first = dict(zip((number for number, _ in block), (np.cumsum(count) - count).tolist()))
+
+    value = dict()
+    for line, item in sorted(blob.items()):
+        value[line] = np.full(len(date), np.nan)
+        index = np.concatenate([np.arange(first[number], first[number] + n) for number, (n, _) in item.items()])
+        value[line][index] = decode_lines(data=[data for _, data in item.values()], count=[n for n, _ in item.values()])
+    return date, value
+
+
+def read_blob_columns(
+    cursor: object, table: str, column: list = None, since: int = None, until: int = None, last: int = None
+) -> tuple:
+    """Returns a tuple (date, {line: array}) for table, every data line if
+    column is None. Since keeps dates >= since, until dates <= until and
+    last the newest last bars of those."""
+    if DEBUG:
+        logger.debug(f"read_blob_columns(table={table}, column={column}, since={since}, until={until}, last={last})")
+
+    # the newest block read may hold bars after until, they do not count for last
+    partial = until is not None
+    until = np.iinfo(np.int64).max if until is None else int(until)
+    count = cursor.execute(
+        f"SELECT block, count FROM {BLOB_TABLE} WHERE ticker = ? AND line = 'date' AND block <= ? ORDER BY block DESC",
+        (table, until),
+    ).fetchall()
+    # newest blocks until they hold the last bars, and not before the block of since
+    first = count[-1][0] if count else 0
+    if last is not None and count:
+        total = np.cumsum([item[1] for item in count])
+        need = last + (count[0][1] if partial else 0)
+        first = max(first, count[min(int(np.searchsorted(total, need)), len(count) - 1)][0])
+    if since is not None:
+        first = max(first, max((item[0] for item in count if item[0] <= since), default=first))
+
+    where = "" if column is None else f"AND line IN ({', '.join('?' * (len(column) + 1))})"
+    rows = cursor.execute(
+        f"SELECT block, line, count, data FROM {BLOB_TABLE} "
+        f"WHERE ticker = ? AND block >= ? AND block <= ? {where} ORDER BY block",
+        (table, first, until, *([] if column is None else ["date", *column])),
+    ).fetchall()
+    date, value = _decode_blocks(rows=rows)
+    for line in column or []:
+        value.setdefault(line, np.full(len(date), np.nan))
+
+    keep = date <= until
+    date, value = date[keep], {line: item[keep] for line, item in value.items()}
+    keep = slice(None) if last is None else slice(max(len(date) - last, 0), None)
+    date, value = date[keep], {line: item[keep] for line, item in value.items()}
+    if since is not None:
+        keep = date >= since
+        date, value = date[keep], {line: item[keep] for line, item in value.items()}
+    return date, value
+
+
+def write_blob_rows(cursor: object, table: str, date: np.ndarray, line: dict, block_days: int) -> None:
+    """Merge the bars into their blocks, a bar already stored for a date is
+    replaced, data lines it had that line does not are nan like a row write"""
+    if DEBUG:
+        logger.debug(f"write_blob_rows(table={table}, date={len(date)}, line={list(line)}, block_days={block_days})")
+
+    # a block is numbered by the epoch second it starts at
+    date = np.asarray(date, dtype=np.int64)
+    block = date // (block_days * 86400) * (block_days * 86400)
+    for number in np.unique(block):
+        new = block == number
+        rows = cursor.execute(
+            f"SELECT block, line, count, data FROM {BLOB_TABLE} WHERE ticker = ? AND block = ?", (table, int(number))
+        ).fetchall()
+        old_date, old_value = _decode_blocks(rows=rows)
+
+        merged = np.union1d(old_date, date[new])
+        value = {name: np.full(len(merged), np.nan) for name in {*old_value, *line}}
+        replaced = np.isin(old_date, date[new])
+        for name, item in old_value.items():
+            value[name][np.searchsorted(merged, old_date[~replaced])] = item[~replaced]
+        for name, item in line.items():
+            value[name][np.searchsorted(merged, date[new])] = np.asarray(item, dtype=float)[new]
+
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {BLOB_TABLE} (ticker, line, block, count, data) VALUES (?, ?, ?, ?, ?)",
+            [(table, "date", int(number), len(merged), encode_line(x=merged, order=2))]
+            + [(table, name, int(number), len(merged), encode_line(x=item)) for name, item in value.items()],
+        )
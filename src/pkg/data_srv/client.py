@@ -1,40 +1,322 @@
 """src/pkg/data_srv/client.py\n
-fetch_stonk_data(ctx: dict) -> None
+backfill_stonk_data(ctx: dict) -> None\n
+fetch_stonk_data(ctx: dict, processor: object) -> None\n
+ingest_local_data(ctx: dict) -> None
 """
 
-import logging
+import datetime, logging
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
 
 from pkg import DEBUG
-from pkg.data_srv import utils
+from pkg.data_srv import panel, planner, utils
+from pkg.data_srv.screener import compile_screen_rules, run_stonk_screen
+from pkg.data_srv.stream import DataLineStream
 
 
 logger = logging.getLogger(__name__)
 
 
-def fetch_stonk_data(ctx: dict) -> None:
-    """Data for calculating indicators i.e. clv, price, volume etc."""
+def backfill_stonk_data(ctx: dict) -> None:
+    """Resumable download of data_lookback days in chunks of [data_service]
+    backfill_chunk days. Each chunk is written as it arrives and recorded
+    in a checkpoint table, a rerun skips completed (ticker, chunk) pairs."""
+    if DEBUG:
+        logger.debug(f"backfill_stonk_data(ctx={ctx}")
+    if not DEBUG:
+        print(" Begin backfill process:")
+
+    # keep the existing database and its checkpoints
+    utils.create_sqlite_stonk_database(ctx=ctx, replace=False)
+    done = utils.read_backfill_checkpoint(ctx=ctx)
+
+    # select data provider
+    processor = _select_data_provider(ctx=ctx)
+    first, today = processor.start_date, processor.end_date
+    chunks = _backfill_chunks(start=first, end=today, days=int(ctx["data_service"]["backfill_chunk"]))
+
+    for index, ticker in enumerate(ctx["interface"]["ticker"]):
+        ctx["interface"]["index"] = index
+        for start, end in chunks:
+            if (ticker, start.isoformat()) in done:
+                continue
+            if not DEBUG:
+                print(f"  - {start} to {end}\t", end="")
+
+            try:
+                _fetch_range(ctx=ctx, processor=processor, ticker=ticker, start=max(start, first), end=min(end, today))
+            except Exception as e:
+                logger.debug(f"*** ERROR *** {ticker} {start} {e}")
+                if not DEBUG:
+                    print("failed, retry on next run")
+                continue
+
+            # the chunk holding today is still growing, fetch it again next run
+            if end <= today:
+                utils.write_backfill_checkpoint(ctx=ctx, ticker=ticker, start=start.isoformat(), end=end.isoformat())
+
+    _resample_stonk_data(ctx=ctx, processor=processor)
+    _roll_partitions(ctx=ctx)
+    if not DEBUG:
+        print(" finished.")
+
+
+def _backfill_chunks(start: datetime.date, end: datetime.date, days: int) -> list:
+    """Returns a list of (start, end) dates covering start to end. Chunks
+    are aligned to multiples of days, so they are the same on every run."""
+    first = start.toordinal() // days * days
+    return [
+        (datetime.date.fromordinal(ordinal), datetime.date.fromordinal(ordinal + days))
+        for ordinal in range(first, end.toordinal() + 1, days)
+    ]
+
+
+def fetch_stonk_data(ctx: dict, processor: object = None) -> None:
+    """Data for calculating indicators i.e. clv, price, volume etc.
+    A long running caller may pass the processor from an earlier run
+    to reuse its http session, dates are moved up to today."""
     if DEBUG:
         logger.debug(f"fetch_stonk_data(ctx={ctx}")
     if not DEBUG:
         print(" Begin download process:")
 
-    # create database
-    utils.create_sqlite_stonk_database(ctx=ctx)
+    # create database, a planned fetch adds to the bars already stored
+    fetch_plan = ctx["data_service"]["fetch_plan"]
+    if fetch_plan not in ("calendar", "none"):
+        raise ValueError(f"unknown fetch plan: {fetch_plan}")
+    utils.create_sqlite_stonk_database(ctx=ctx, replace=fetch_plan == "none")
+    # a bad rule is reported before the download, not after
+    rule = compile_screen_rules(ctx=ctx)
 
     # select data provider
-    processor = _select_data_provider(ctx=ctx)
+    if processor is None:
+        processor = _select_data_provider(ctx=ctx)
+    else:
+        processor.start_date, processor.end_date = processor._start_end_date
+
+    if fetch_plan == "calendar":
+        _fetch_planned(ctx=ctx, processor=processor)
+    elif processor.chunk_days:
+        _fetch_stream(ctx=ctx, processor=processor)
+    elif ctx["data_service"]["fetch_mode"] == "panel":
+        _fetch_panel(ctx=ctx, processor=processor)
+    else:
+        # get and save data for each ticker
+        for index, ticker in enumerate(ctx["interface"]["ticker"]):
+            if not DEBUG:
+                print(f"  - fetching {ticker}\t", end="")
+
+            ctx["interface"]["index"] = index  # alphavantage may throttle at five downloads
+            data_tuple = processor.download_and_parse_price_data(ticker=ticker)
+            utils.write_data_line_to_stonk_table(ctx=ctx, data_tuple=data_tuple)
+
+    _resample_stonk_data(ctx=ctx, processor=processor)
+    _roll_partitions(ctx=ctx)
+    run_stonk_screen(ctx=ctx, rule=rule)
+    if not DEBUG:
+        print(" finished.")
+
+
+def ingest_local_data(ctx: dict) -> None:
+    """Load the price files in [data_service] local_dir into a new stonk
+    database, every file if the ticker list is empty. Files are parsed and
+    their data lines derived in local_workers processes, 0 for one per cpu.
+    Every bar of a file is loaded, or those of the last local_lookback days."""
+    if DEBUG:
+        logger.debug(f"ingest_local_data(ctx={ctx}")
+    if not DEBUG:
+        print(" Begin local ingest process:")
+
+    from pkg.data_srv.agent import LocalDataProcessor
+
+    processor = LocalDataProcessor(ctx=ctx)
+    lookback = int(ctx["data_service"]["local_lookback"])
+    processor.start_date = datetime.date.today() - datetime.timedelta(days=lookback) if lookback else None
+    processor.end_date = None
+    if not ctx["interface"]["ticker"]:
+        ctx["interface"]["ticker"] = sorted(processor.files)
+    utils.create_sqlite_stonk_database(ctx=ctx)
+
+    workers = int(ctx["data_service"]["local_workers"]) or None
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for ticker, df in executor.map(_parse_local_file, repeat(processor), ctx["interface"]["ticker"], chunksize=8):
+            if df is not None:
+                utils.write_data_line_to_stonk_table(ctx=ctx, data_tuple=(ticker, df))
+
+    _resample_stonk_data(ctx=ctx, processor=processor)
+    _roll_partitions(ctx=ctx)
+    if not DEBUG:
+        print(" finished.")
+
 
-    # get and save data for each ticker
+def _parse_local_file(processor: object, ticker: str) -> tuple:
+    """Runs in a worker process. Returns a tuple (ticker, dataframe), dataframe is None on an error"""
+    try:
+        return processor.download_and_parse_price_data(ticker=ticker)
+    except Exception as e:
+        logger.debug(f"*** ERROR *** {ticker} {e}")
+        return ticker, None
+
+
+def _fetch_panel(ctx: dict, processor: object) -> None:
+    """Download bars for every ticker, align them on one date axis, then
+    derive and write each data line for all tickers at once"""
+    if DEBUG:
+        logger.debug(f"_fetch_panel(ctx={type(ctx)}, processor={processor})")
+
+    series = list()
     for index, ticker in enumerate(ctx["interface"]["ticker"]):
         if not DEBUG:
-            print(f"  - fetching {ticker}\t", end="")
+            print(f"  - fetching {ticker}")
+
+        ctx["interface"]["index"] = index
+        try:
+            series.append(processor.download_price_bars(ticker=ticker))
+        except Exception as e:
+            logger.debug(f"*** ERROR *** {ticker} {e}")
 
-        ctx["interface"]["index"] = index  # alphavantage may throttle at five downloads
-        data_tuple = processor.download_and_parse_price_data(ticker=ticker)
-        utils.write_data_line_to_stonk_table(ctx=ctx, data_tuple=data_tuple)
+    ticker, date, bars = panel.align_price_bars(series=series)
+    line = panel.panel_data_lines(processor=processor, bars=bars)
+    utils.write_panel_to_stonk_tables(ctx=ctx, ticker=ticker, date=date, line=line, present=~np.isnan(bars["close"]))
 
+
+def _fetch_planned(ctx: dict, processor: object) -> None:
+    """Download only the NYSE sessions of the lookback window that have no
+    stored bar, see planner.plan_requests(). The number of requests and an
+    estimate of the time they take are printed before the first one."""
+    if DEBUG:
+        logger.debug(f"_fetch_planned(ctx={type(ctx)}, processor={processor})")
+    if processor.chunk_days:
+        raise ValueError(f"fetch plan calendar needs daily bars: {processor.frequency}")
+
+    start, end = processor.start_date, processor.end_date
+    ticker = ctx["interface"]["ticker"]
+    sessions = planner.trading_sessions(start=start, end=end, closed=ctx["data_service"]["plan_closed"].split())
+    plan = planner.plan_requests(
+        sessions=sessions,
+        stored=utils.read_stored_days(ctx=ctx, ticker=ticker, start=start),
+        ticker=ticker,
+        merge_gap=int(ctx["data_service"]["plan_merge_gap"]),
+    )
+
+    requests = sum(len(item) for item in plan.values())
     if not DEBUG:
-        print(" finished.")
+        seconds = requests * float(ctx["data_service"]["plan_request_seconds"])
+        print(f"  planned {requests} requests for {len(plan)} tickers, {len(ticker) - len(plan)} up to date", end="")
+        print(f", about {seconds:.0f}s")
+
+    for index, item in enumerate(ticker):
+        ctx["interface"]["index"] = index
+        for first, last in plan.get(item, ()):
+            if not DEBUG:
+                print(f"  - {item} {first} to {last}\t", end="")
+            try:
+                _fetch_range(ctx=ctx, processor=processor, ticker=item, start=first.item(), end=last.item())
+            except Exception as e:
+                logger.debug(f"*** ERROR *** {item} {first} {e}")
+                if not DEBUG:
+                    print("failed, retry on next run")
+
+    processor.start_date, processor.end_date = start, end
+
+
+def _fetch_stream(ctx: dict, processor: object) -> None:
+    """Download each ticker in ranges the provider accepts for an intraday
+    data_frequency and write every chunk as it arrives. Data line state is
+    carried across chunks, see DataLineStream."""
+    if DEBUG:
+        logger.debug(f"_fetch_stream(ctx={type(ctx)}, processor={processor})")
+
+    for index, ticker in enumerate(ctx["interface"]["ticker"]):
+        if not DEBUG:
+            print(f"  - streaming {ticker}\t", end="")
+
+        ctx["interface"]["index"] = index
+        try:
+            rows = _write_stream(ctx=ctx, processor=processor, ticker=ticker)
+        except Exception as e:
+            logger.debug(f"*** ERROR *** {ticker} {e}")
+            rows = "failed,"
+        if not DEBUG:
+            print(f"{rows} bars")
+
+
+def _write_stream(ctx: dict, processor: object, ticker: str, since: float = None) -> int:
+    """Download ticker from the processor start to end date in chunk_days
+    ranges, see _fetch_stream(), and write the bars from since on. Returns
+    the number of bars derived. Raises OSError if a chunk could not be written."""
+    if DEBUG:
+        logger.debug(f"_write_stream(ctx={type(ctx)}, processor={processor}, ticker={ticker}, since={since})")
+
+    stream = DataLineStream(processor=processor, ticker=ticker, carry=int(ctx["data_service"]["stream_carry"]))
+    for _, date, bars in processor.download_price_chunks(ticker=ticker):
+        data_tuple = stream.update(date=date, bars=bars)
+        if data_tuple is None:
+            continue
+        ticker, df = data_tuple
+        if since is not None:
+            df = df[df.index >= since]
+        if len(df) and not utils.write_data_line_to_stonk_table(ctx=ctx, data_tuple=(ticker, df)):
+            raise OSError(f"write failed: {ticker} {processor.start_date} to {processor.end_date}")
+    return stream.rows
+
+
+def _fetch_range(ctx: dict, processor: object, ticker: str, start: datetime.date, end: datetime.date) -> None:
+    """Download and write the bars of ticker from start to end. The [data_service]
+    backfill_warmup days before start are fetched for the sliding window and
+    indicators, then dropped. Intraday bars are streamed in chunk_days ranges.
+    Moves the processor dates. Raises OSError if the bars could not be written."""
+    if DEBUG:
+        logger.debug(f"_fetch_range(ctx={type(ctx)}, processor={processor}, ticker={ticker}, start={start}, end={end})")
+
+    warmup = datetime.timedelta(days=int(ctx["data_service"]["backfill_warmup"]))
+    processor.start_date, processor.end_date = start - warmup, end
+    # drop the warmup bars, half a day early covers local or UTC midnight timestamps of daily bars
+    cutoff = datetime.datetime.combine(start, datetime.time(), datetime.timezone.utc).timestamp()
+    if processor.chunk_days:
+        _write_stream(ctx=ctx, processor=processor, ticker=ticker, since=cutoff)
+        return
+
+    ticker, df = processor.download_and_parse_price_data(ticker=ticker)
+    if not utils.write_data_line_to_stonk_table(ctx=ctx, data_tuple=(ticker, df[df.index >= cutoff - 43200])):
+        raise OSError(f"write failed: {ticker} {start} to {end}")
+
+
+def _resample_stonk_data(ctx: dict, processor: object) -> None:
+    """Derive the data lines of each [data_service] resample_frequency from
+    the stored daily bars instead of downloading every frequency"""
+    if DEBUG:
+        logger.debug(f"_resample_stonk_data(ctx={type(ctx)}, processor={processor})")
+
+    for frequency in ctx["data_service"]["resample_frequency"].split():
+        if not DEBUG:
+            print(f"  - resample {frequency}")
+        for ticker in ctx["interface"]["ticker"]:
+            try:
+                date, bars = utils.read_ohlcv_from_stonk_table(ctx=ctx, table=utils.stonk_table(ticker=ticker))
+                date, bars = utils.resample_ohlcv(date=date, bars=bars, frequency=frequency)
+                # stored prices are in cents
+                bars = {key: value if key == "volume" else value / 100 for key, value in bars.items()}
+                data_tuple = processor._data_line_frame(
+                    ticker=utils.stonk_table(ticker=ticker, frequency=frequency), date=date, bars=bars
+                )
+                utils.write_data_line_to_stonk_table(ctx=ctx, data_tuple=data_tuple)
+            except Exception as e:
+                logger.debug(f"*** ERROR *** {ticker} {frequency} {e}")
+
+
+def _roll_partitions(ctx: dict) -> None:
+    """Move past years into partition files if [data_service] partition_mode is year"""
+    match ctx["data_service"]["partition_mode"]:
+        case "none":
+            pass
+        case "year":
+            utils.roll_stonk_partitions(ctx=ctx)
+        case _:
+            raise ValueError(f"unknown partition mode: {ctx['data_service']['partition_mode']}")
 
 
 def _select_data_provider(ctx: dict) -> object:
@@ -43,6 +325,12 @@ def _select_data_provider(ctx: dict) -> object:
         logger.debug(f"_select_data_provider(ctx={type(ctx)})")
 
     match ctx["data_service"]["data_provider"]:
+        case "hedged":
+            from pkg.data_srv.agent import HedgedDataProcessor
+            return HedgedDataProcessor(ctx=ctx)
+        case "local":
+            from pkg.data_srv.agent import LocalDataProcessor
+            return LocalDataProcessor(ctx=ctx)
         case "tiingo":
             from pkg.data_srv.agent import TiingoDataProcessor
             return TiingoDataProcessor(ctx=ctx)
@@ -0,0 +1,145 @@
+"""src/pkg/data_srv/indicator.py\n
+Vectorized technical indicators on numpy arrays. Each runs in\n
+O(n), moving averages use a linear filter instead of a loop.\n
+Indicators are registered as data lines, add the name to\n
+[data_service] data_line, i.e. RSI or EMA_50 for a 50 bar period.\n
+atr(), ema(), macd(), obv(), rsi(), sma(), wilder(), zscore()\n
+data_line(name: str, bars: dict) -> np.ndarray
+"""
+
+import logging
+
+import numpy as np
+
+from scipy.signal import lfilter
+
+from pkg import DEBUG
+
+
+logger = logging.getLogger(__name__)
+
+
+def _smooth(x: np.ndarray, alpha: float, seed_at: int) -> np.ndarray:
+    """Exponential smoothing seeded with the mean of x[: seed_at + 1],
+    values before seed_at are nan"""
+    y = np.full(len(x), np.nan)
+    if len(x) <= seed_at:
+        return y
+    y[seed_at] = x[: seed_at + 1].mean()
+    # y[t] = alpha * x[t] + (1 - alpha) * y[t - 1]
+    y[seed_at + 1 :], _ = lfilter([alpha], [1, alpha - 1], x[seed_at + 1 :], zi=[(1 - alpha) * y[seed_at]])
+    return y
+
+
+def sma(x: np.ndarray, period: int) -> np.ndarray:
+    """Simple moving average, first period - 1 values are nan"""
+    y = np.full(len(x), np.nan)
+    if len(x) >= period:
+        total = np.cumsum(np.insert(np.asarray(x, dtype=float), 0, 0))
+        y[period - 1 :] = (total[period:] - total[:-period]) / period
+    return y
+
+
+def ema(x: np.ndarray, period: int) -> np.ndarray:
+    """Exponential moving average seeded with the simple average of the first period values"""
+    return _smooth(np.asarray(x, dtype=float), alpha=2 / (period + 1), seed_at=period - 1)
+
+
+def wilder(x: np.ndarray, period: int) -> np.ndarray:
+    """Wilder's moving average, x[0] is skipped as it has no previous bar"""
+    y = np.full(len(x), np.nan)
+    y[1:] = _smooth(np.asarray(x[1:], dtype=float), alpha=1 / period, seed_at=period - 1)
+    return y
+
+
+def rsi(close: np.ndarray, period: int = 14) -> np.ndarray:
+    """Wilder's relative strength index, 0 to 100"""
+    if not len(close):
+        return np.empty(0)
+    change = np.diff(close, prepend=close[0])
+    gain = wilder(np.maximum(change, 0), period)
+    loss = wilder(np.maximum(-change, 0), period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(loss == 0, np.where(np.isnan(gain), np.nan, 100.0), 100 - 100 / (1 + gain / loss))
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> np.ndarray:
+    """Average true range"""
+    prev = np.roll(close, 1)
+    true_range = np.maximum(high - low, np.maximum(np.abs(high - prev), np.abs(low - prev)))
+    return wilder(true_range, period)
+
+
+def obv(close: np.ndarray, volume: np.ndarray) -> np.ndarray:
+    """On balance volume"""
+    if not len(close):
+        return np.empty(0)
+    return np.cumsum(np.sign(np.diff(close, prepend=close[0])) * volume)
+
+
+def macd(close: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> tuple:
+    """Returns a tuple (macd, signal, histogram)"""
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = np.full(len(close), np.nan)
+    signal_line[slow - 1 :] = ema(line[slow - 1 :], signal)
+    return line, signal_line, line - signal_line
+
+
+def zscore(x: np.ndarray, period: int = 20) -> np.ndarray:
+    """Rolling z-score, distance from the simple average in standard deviations"""
+    x = np.asarray(x, dtype=float)
+    mean = sma(x, period)
+    variance = sma(x**2, period) - mean**2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(variance > 0, (x - mean) / np.sqrt(np.maximum(variance, 0)), 0.0 * mean)
+
+
+# data line name: (function(bars, period), default period or None if it takes no period)
+DATA_LINE = {
+    "ATR": (lambda b, p: atr(b["high"], b["low"], b["close"], p) * 100, 14),
+    "EMA": (lambda b, p: ema(b["close"], p) * 100, 20),
+    "MACD": (lambda b, p: macd(b["close"])[0] * 100, None),
+    "MACD_HIST": (lambda b, p: macd(b["close"])[2] * 100, None),
+    "MACD_SIGNAL": (lambda b, p: macd(b["close"])[1] * 100, None),
+    "OBV": (lambda b, p: obv(b["close"], b["volume"]), None),
+    "RSI": (lambda b, p: rsi(b["close"], p) * 100, 14),
+    "SMA": (lambda b, p: sma(b["close"], p) * 100, 20),
+    "ZSCORE": (lambda b, p: zscore(b["close"], p) * 100, 20),
+}
+
+# running totals, a chunk computed on its own is off by a constant
+CUMULATIVE = ("OBV",)
+
+
+def _parse_name(name: str) -> tuple:
+    """Split data line name into (indicator, period), i.e. 'EMA_50' -> ('EMA', 50)"""
+    name = name.upper()
+    head, _, tail = name.rpartition("_")
+    if tail.isdigit() and head in DATA_LINE and DATA_LINE[head][1]:
+        return head, int(tail)
+    if name in DATA_LINE:
+        return name, DATA_LINE[name][1]
+    return None, None
+
+
+def is_cumulative(name: str) -> bool:
+    """True if the data line is a running total, its level depends on the first bar"""
+    return _parse_name(name)[0] in CUMULATIVE
+
+
+def is_data_line(name: str) -> bool:
+    """True if name is a registered indicator data line"""
+    return _parse_name(name)[0] is not None
+
+
+def data_line(name: str, bars: dict) -> np.ndarray:
+    """Returns indicator values for data line name. Bars is a dict of
+    open, high, low, close, volume arrays. Values are rounded to integers,
+    prices are in cents, ratios are multiplied by 100. Warmup bars are nan."""
+    if DEBUG:
+        logger.debug(f"data_line(name={name}, bars={list(bars)})")
+
+    indicator, period = _parse_name(name)
+    if indicator is None:
+        raise ValueError(f"unknown data line: {name}")
+    return np.round(DATA_LINE[indicator][0](bars, period))
@@ -0,0 +1,254 @@
+"""src/pkg/data_srv/job_queue.py\n
+Share a ticker refresh between worker processes. The ticker\n
+list is split into jobs in a queue table of the stonk database.\n
+Workers on this host, or on others sharing the work directory,\n
+lease one job at a time and heartbeat while they work. A job\n
+whose lease runs out is claimed again, up to queue_retries times.\n
+Queue writes wait queue_timeout seconds for a lock held by another\n
+worker, then back off and try again.\n
+enqueue_stonk_refresh(ctx: dict) -> int\n
+read_queue_report(ctx: dict) -> list\n
+run_queue_worker(ctx: dict) -> None\n
+start_stonk_refresh(ctx: dict) -> None
+"""
+
+import logging, multiprocessing, os, random, socket, sqlite3, threading, time
+
+from pkg import DEBUG
+from pkg.ctx_mgr import SqliteConnectManager
+from pkg.data_srv import utils
+
+
+logger = logging.getLogger(__name__)
+
+QUEUE_TABLE = "_job"
+
+
+def enqueue_stonk_refresh(ctx: dict) -> int:
+    """Create a new stonk database and queue a job for every
+    [data_service] queue_batch tickers. Returns the number of jobs."""
+    if DEBUG:
+        logger.debug(f"enqueue_stonk_refresh(ctx={type(ctx)})")
+
+    utils.create_sqlite_stonk_database(ctx=ctx)
+
+    ticker = ctx["interface"]["ticker"]
+    batch = int(ctx["data_service"]["queue_batch"])
+    job = [" ".join(ticker[i : i + batch]) for i in range(0, len(ticker), batch)]
+    with SqliteConnectManager(ctx=ctx, mode="rw", timeout=float(ctx["data_service"]["queue_timeout"])) as con:
+        _create_queue_table(con=con)
+        con.cursor.executemany(f"INSERT INTO {QUEUE_TABLE} (ticker) VALUES (?)", [(item,) for item in job])
+
+    if not DEBUG:
+        print(f" queued {len(ticker)} tickers in {len(job)} jobs")
+    return len(job)
+
+
+def _retry_locked(call: object, backoff: float) -> object:
+    """Returns call(), called again while the queue is locked by other
+    workers. The wait doubles after each try, up to backoff seconds."""
+    wait = 0.1
+    while True:
+        try:
+            return call()
+        except sqlite3.OperationalError as e:
+            if "locked" not in f"{e}" and "busy" not in f"{e}":
+                raise
+            logger.debug(f"*** ERROR *** {e}, retry in {wait:.1f}s")
+        # jitter, so workers locked out together do not retry together
+        time.sleep(wait * random.uniform(0.5, 1.5))
+        wait = min(wait * 2, backoff)
+
+
+def _create_queue_table(con: object) -> None:
+    con.cursor.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {QUEUE_TABLE} (
+            job_id        INTEGER    PRIMARY KEY,
+            ticker        TEXT       NOT NULL,
+            state         TEXT       NOT NULL    DEFAULT 'pending',
+            attempts      INTEGER    NOT NULL    DEFAULT 0,
+            worker        TEXT,
+            lease_until   REAL,
+            heartbeat     REAL,
+            started       REAL,
+            finished      REAL,
+            error         TEXT
+        )
+    """
+    )
+
+
+class _Lease:
+    """Claim, heartbeat and finish jobs for one worker"""
+
+    def __init__(self, ctx: dict):
+        self.ctx = ctx
+        self.lease = float(ctx["data_service"]["queue_lease"])
+        self.retries = int(ctx["data_service"]["queue_retries"])
+        self.timeout = float(ctx["data_service"]["queue_timeout"])
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+
+    def claim(self) -> tuple:
+        """Lease the next pending or expired job. Returns a tuple (job_id,
+        ticker list), (None, None) when nothing is left, or (None, []) when
+        jobs are still leased by other workers. A worker started before the
+        jobs are queued finds an empty queue."""
+        now = time.time()
+        with SqliteConnectManager(ctx=self.ctx, mode="rw", timeout=self.timeout) as con:
+            _create_queue_table(con=con)
+            # out of retries, the first attempt is not one, either failed by a worker or its lease ran out
+            con.cursor.execute(
+                f"""
+                UPDATE {QUEUE_TABLE} SET state = 'failed', worker = NULL
+                WHERE attempts >= ? AND (state = 'pending' OR (state = 'leased' AND lease_until < ?))
+            """,
+                (self.retries + 1, now),
+            )
+            # a single statement, so two workers can not claim the same job
+            con.cursor.execute(
+                f"""
+                UPDATE {QUEUE_TABLE}
+                SET state = 'leased', worker = ?, lease_until = ?, heartbeat = ?, started = ?,
+                    attempts = attempts + 1
+                WHERE job_id = (
+                    SELECT job_id FROM {QUEUE_TABLE}
+                    WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?)
+                    ORDER BY job_id LIMIT 1
+                )
+            """,
+                (self.worker, now + self.lease, now, now, now),
+            )
+            row = con.cursor.execute(
+                f"SELECT job_id, ticker FROM {QUEUE_TABLE} WHERE state = 'leased' AND worker = ?", (self.worker,)
+            ).fetchone()
+            if row:
+                return row[0], row[1].split()
+            busy = con.cursor.execute(f"SELECT COUNT(*) FROM {QUEUE_TABLE} WHERE state = 'leased'").fetchone()[0]
+        return None, [] if busy else None
+
+    def heartbeat(self, job_id: int, stop: threading.Event):
+        """Extend the lease every third of its length until stop is set"""
+        while not stop.wait(timeout=self.lease / 3):
+            now = time.time()
+            try:
+                with SqliteConnectManager(ctx=self.ctx, mode="rw", timeout=self.timeout) as con:
+                    con.cursor.execute(
+                        f"UPDATE {QUEUE_TABLE} SET heartbeat = ?, lease_until = ? WHERE job_id = ? AND worker = ?",
+                        (now, now + self.lease, job_id, self.worker),
+                    )
+            except Exception as e:
+                logger.debug(f"*** ERROR *** heartbeat {job_id} {e}")
+
+    def finish(self, job_id: int, error: str = None):
+        """Mark a job done, or pending again with the error. A job already
+        reclaimed by another worker after the lease ran out is left alone."""
+        with SqliteConnectManager(ctx=self.ctx, mode="rw", timeout=self.timeout) as con:
+            con.cursor.execute(
+                f"""
+                UPDATE {QUEUE_TABLE}
+                SET state = ?, finished = ?, error = ?, lease_until = NULL
+                WHERE job_id = ? AND worker = ? AND state = 'leased'
+            """,
+                ("pending" if error else "done", time.time(), error, job_id, self.worker),
+            )
+
+
+def run_queue_worker(ctx: dict) -> None:
+    """Claim and run jobs until the queue is empty"""
+    if DEBUG:
+        logger.debug(f"run_queue_worker(ctx={type(ctx)})")
+
+    from pkg.data_srv.client import _select_data_provider, _write_stream
+
+    lease = _Lease(ctx=ctx)
+    processor = _select_data_provider(ctx=ctx)
+    while True:
+        job_id, ticker = _retry_locked(call=lease.claim, backoff=lease.lease / 3)
+        if ticker is None:
+            break
+        if not ticker:
+            # other workers hold the remaining jobs, wait in case a lease runs out
+            time.sleep(lease.lease / 3)
+            continue
+
+        stop = threading.Event()
+        threading.Thread(target=lease.heartbeat, args=(job_id, stop), daemon=True).start()
+        error = None
+        try:
+            for item in ticker:
+                # intraday bars in ranges the provider accepts
+                if processor.chunk_days:
+                    _write_stream(ctx=ctx, processor=processor, ticker=item)
+                    continue
+                data_tuple = processor.download_and_parse_price_data(ticker=item)
+                # the job goes back to pending, a retry rewrites its tickers
+                if not utils.write_data_line_to_stonk_table(ctx=ctx, data_tuple=data_tuple):
+                    raise OSError(f"write failed: {item}")
+        except Exception as e:
+            logger.debug(f"*** ERROR *** job {job_id} {e}")
+            error = f"{e}" or type(e).__name__
+        finally:
+            stop.set()
+        _retry_locked(call=lambda: lease.finish(job_id=job_id, error=error), backoff=lease.lease / 3)
+
+
+def read_queue_report(ctx: dict) -> list:
+    """Returns a list of tuples (worker, jobs, tickers, seconds), one for
+    each worker with a finished job, then ('failed', jobs, tickers, 0)"""
+    if DEBUG:
+        logger.debug(f"read_queue_report(ctx={type(ctx)})")
+
+    with SqliteConnectManager(ctx=ctx, mode="ro") as con:
+        rows = con.cursor.execute(
+            f"""
+            SELECT worker, COUNT(*), SUM(LENGTH(ticker) - LENGTH(REPLACE(ticker, ' ', '')) + 1),
+                SUM(finished - started)
+            FROM {QUEUE_TABLE} WHERE state = 'done' GROUP BY worker ORDER BY worker
+        """
+        ).fetchall()
+        failed = con.cursor.execute(
+            f"""
+            SELECT 'failed', COUNT(*), SUM(LENGTH(ticker) - LENGTH(REPLACE(ticker, ' ', '')) + 1), 0
+            FROM {QUEUE_TABLE} WHERE state = 'failed'
+        """
+        ).fetchone()
+    return rows + ([failed] if failed[1] else [])
+
+
+def start_stonk_refresh(ctx: dict) -> None:
+    """Queue the refresh, run [data_service] queue_workers local worker
+    processes, or work in this process if it is 0. Once the queue is
+    drained, resample, roll partitions and screen as fetch_stonk_data()
+    does, then print the throughput of every worker that took part."""
+    if DEBUG:
+        logger.debug(f"start_stonk_refresh(ctx={type(ctx)})")
+    if not DEBUG:
+        print(" Begin queued download process:")
+
+    from pkg.data_srv.client import _resample_stonk_data, _roll_partitions, _select_data_provider
+    from pkg.data_srv.screener import compile_screen_rules, run_stonk_screen
+
+    # a bad rule is reported before the download, not after
+    rule = compile_screen_rules(ctx=ctx)
+    enqueue_stonk_refresh(ctx=ctx)
+    worker = [
+        multiprocessing.Process(target=run_queue_worker, kwargs={"ctx": ctx})
+        for _ in range(int(ctx["data_service"]["queue_workers"]))
+    ]
+    for process in worker:
+        process.start()
+    if not worker:
+        run_queue_worker(ctx=ctx)
+    for process in worker:
+        process.join()
+
+    _resample_stonk_data(ctx=ctx, processor=_select_data_provider(ctx=ctx))
+    _roll_partitions(ctx=ctx)
+    run_stonk_screen(ctx=ctx, rule=rule)
+
+    if not DEBUG:
+        for name, jobs, tickers, seconds in read_queue_report(ctx=ctx):
+            rate = f"{tickers / seconds:.2f} tickers/s" if seconds else ""
+            print(f"  - {name}\t{jobs} jobs\t{tickers} tickers\t{rate}")
+        print(" finished.")
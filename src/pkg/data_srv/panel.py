@@ -0,0 +1,73 @@
+"""src/pkg/data_srv/panel.py\n
+Panel mode, every ticker aligned on one trading date axis.\n
+Each data line is a (ticker, date) array computed with single\n
+numpy operations instead of one dataframe per ticker.\n
+align_price_bars(series: list) -> tuple\n
+panel_data_lines(processor: object, bars: dict) -> dict
+"""
+
+import logging
+
+import numpy as np
+
+from pkg import DEBUG
+from pkg.data_srv import indicator
+from pkg.data_srv.scaler import scaled_data_line, window_scale
+
+
+logger = logging.getLogger(__name__)
+
+OHLCV = ("open", "high", "low", "close", "volume")
+
+
+def align_price_bars(series: list) -> tuple:
+    """Series is a list of (ticker, date, bars) tuples. Returns a tuple
+    (ticker, date, bars), date is the sorted union of all dates and each
+    bars value is a (ticker, date) array, nan where a ticker has no bar."""
+    if DEBUG:
+        logger.debug(f"align_price_bars(series={len(series)})")
+
+    ticker = [item[0] for item in series]
+    date = np.unique(np.concatenate([np.asarray(item[1], dtype=np.int64) for item in series] + [[]]))
+    date = date.astype(np.int64)
+
+    bars = {key: np.full((len(series), len(date)), np.nan) for key in OHLCV}
+    for row, (_, item_date, item_bars) in enumerate(series):
+        column = np.searchsorted(date, np.asarray(item_date, dtype=np.int64))
+        for key in OHLCV:
+            bars[key][row, column] = item_bars[key]
+    return ticker, date, bars
+
+
+def panel_data_lines(processor: object, bars: dict) -> dict:
+    """Returns a dict {data line: (ticker, date) array} for each of the
+    processor's data lines. Bars is the panel from align_price_bars()."""
+    if DEBUG:
+        logger.debug(f"panel_data_lines(processor={processor}, bars={np.shape(bars['close'])})")
+
+    line = processor._price_data_lines(bars=bars)
+    mass = line.pop("mass")
+
+    scaled = {"sc_cwap": line["cwap"], "sc_mass": mass, "sc_vol": line["volume"]}
+    for item in processor.data_line:
+        name = item.lower()
+        if name in line:
+            continue
+        elif name in scaled:
+            x = window_scale(x=scaled[name], window_size=processor.window_size, scaler=processor.scaler_name)
+            line[name] = scaled_data_line(scaled=x, valid=~np.isnan(scaled[name]), window_size=processor.window_size)
+        elif indicator.is_data_line(name):
+            # indicators are recurrences, run each ticker over its own bars
+            line[name] = np.full(bars["close"].shape, np.nan)
+            for row in range(len(line[name])):
+                valid = ~np.isnan(bars["close"][row])
+                if valid.any():
+                    line[name][row, valid] = indicator.data_line(
+                        name=name, bars={key: value[row, valid] for key, value in bars.items()}
+                    )
+        else:
+            raise ValueError(f"unknown data line: {item}")
+
+    line = {item.lower(): line[item.lower()] for item in processor.data_line}
+    line.update(processor._sweep_data_lines(scaled=scaled))
+    return line
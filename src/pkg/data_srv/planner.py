@@ -0,0 +1,97 @@
+"""src/pkg/data_srv/planner.py\n
+Plan the downloads an incremental fetch needs. NYSE sessions are\n
+computed locally from the exchange holiday rules, compared with\n
+the bars already stored for each ticker, and the missing sessions\n
+are coalesced into as few (ticker, start, end) requests as possible.\n
+nyse_holidays(year: int) -> list\n
+plan_requests(sessions: np.ndarray, stored: dict, ticker: list, merge_gap: int) -> dict\n
+trading_sessions(start: datetime.date, end: datetime.date, closed: list) -> np.ndarray
+"""
+
+import datetime, logging
+
+import numpy as np
+
+from pkg import DEBUG
+
+
+logger = logging.getLogger(__name__)
+
+
+def _easter(year: int) -> datetime.date:
+    """Gregorian easter sunday, anonymous algorithm"""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return datetime.date(year, month, day + 1)
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> datetime.date:
+    """nth weekday (monday is 0) of the month, n = -1 for the last"""
+    if n > 0:
+        first = datetime.date(year, month, 1)
+        return first + datetime.timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = datetime.date(year + month // 12, month % 12 + 1, 1) - datetime.timedelta(days=1)
+    return last - datetime.timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _observed(day: datetime.date) -> datetime.date:
+    """A saturday holiday is observed on friday, a sunday holiday on monday"""
+    return day + datetime.timedelta(days={5: -1, 6: 1}.get(day.weekday(), 0))
+
+
+def nyse_holidays(year: int) -> list:
+    """Returns a list of the dates NYSE is closed for a holiday in year"""
+    holiday = [
+        _nth_weekday(year, 1, 0, 3),  # martin luther king jr. day
+        _nth_weekday(year, 2, 0, 3),  # washington's birthday
+        _easter(year) - datetime.timedelta(days=2),  # good friday
+        _nth_weekday(year, 5, 0, -1),  # memorial day
+        _observed(datetime.date(year, 7, 4)),
+        _nth_weekday(year, 9, 0, 1),  # labor day
+        _nth_weekday(year, 11, 3, 4),  # thanksgiving
+        _observed(datetime.date(year, 12, 25)),
+    ]
+    # new year's day on a saturday is not moved back into the old year
+    if datetime.date(year, 1, 1).weekday() != 5:
+        holiday.append(_observed(datetime.date(year, 1, 1)))
+    if year >= 2022:
+        holiday.append(_observed(datetime.date(year, 6, 19)))  # juneteenth
+    return sorted(holiday)
+
+
+def trading_sessions(start: datetime.date, end: datetime.date, closed: list = ()) -> np.ndarray:
+    """Returns a datetime64[D] array of NYSE sessions from start up to, not
+    including, end. Closed is a list of extra closures, i.e. a day of mourning."""
+    if DEBUG:
+        logger.debug(f"trading_sessions(start={start}, end={end}, closed={closed})")
+
+    holiday = [day for year in range(start.year, end.year + 1) for day in nyse_holidays(year)]
+    holiday = np.array(holiday + [np.datetime64(day, "D") for day in closed], dtype="datetime64[D]")
+    day = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D"))
+    return day[np.is_busday(day, holidays=holiday)]
+
+
+def plan_requests(sessions: np.ndarray, stored: dict, ticker: list, merge_gap: int = 5) -> dict:
+    """Returns a dict {ticker: [(start, end), ...]} of datetime64[D] ranges, end
+    not included, covering each session a ticker has no stored bar for. Tickers
+    that are up to date are left out. Missing sessions with at most merge_gap
+    stored sessions between them share one request. Stored is a dict
+    {ticker: datetime64[D] array} of the days already in the database."""
+    if DEBUG:
+        logger.debug(f"plan_requests(sessions={len(sessions)}, stored={len(stored)}, ticker={len(ticker)})")
+
+    plan = dict()
+    for item in ticker:
+        missing = np.flatnonzero(~np.isin(sessions, stored.get(item, sessions[:0])))
+        if not len(missing):
+            continue
+        # split where more than merge_gap stored sessions lie between missing ones
+        group = np.split(missing, np.flatnonzero(np.diff(missing) > merge_gap + 1) + 1)
+        plan[item] = [(sessions[g[0]], sessions[g[-1]] + np.timedelta64(1, "D")) for g in group]
+    return plan
@@ -0,0 +1,211 @@
+"""src/pkg/data_srv/query.py\n
+Local query server for the stonk database. Ticker tables are\n
+read once and kept in memory, least recently used first out\n
+when [data_service] query_cache_mb is exceeded. Range queries\n
+are answered over a unix socket in a compact binary format.\n
+The cache is dropped when the database file changes, i.e.\n
+after fetch_stonk_data() writes new data.\n
+class DataLineCache\n
+class QueryHandler\n
+decode_reply(reply: bytes) -> tuple\n
+encode_reply(date: np.ndarray, value: np.ndarray) -> bytes\n
+query_data_lines(ctx: dict, ticker: str, line: list, start: int, end: int) -> tuple\n
+serve_data_lines(ctx: dict) -> None
+"""
+
+import logging, os, socket, socketserver, struct, threading
+
+from collections import OrderedDict
+
+import numpy as np
+
+from pkg import DEBUG
+from pkg.data_srv.utils import FREQUENCY_SUFFIX, read_stonk_columns, select_stonk_tables
+
+
+logger = logging.getLogger(__name__)
+
+# reply header: magic, number of dates, number of data lines
+HEADER = struct.Struct("<4sII")
+MAGIC, ERROR = b"STNK", b"ERR!"
+
+
+def _query_ctx(ctx: dict) -> dict:
+    """Context pointing at [data_service] query_database"""
+    return {
+        "data_service": ctx["data_service"],
+        "default": ctx["default"],
+        "interface": {"command": "data", "database": ctx["data_service"]["query_database"]},
+    }
+
+
+def _socket_path(ctx: dict) -> str:
+    return f"{ctx['default']['work_dir']}{ctx['data_service']['query_socket']}"
+
+
+class DataLineCache:
+    """Ticker tables as numpy arrays, bounded by size in bytes"""
+
+    def __init__(self, ctx: dict, max_bytes: int):
+        self.ctx = ctx
+        self.db_path = f"{ctx['default']['work_dir']}{ctx['interface']['command']}/{ctx['interface']['database']}"
+        self.lock = threading.Lock()
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.table = OrderedDict()  # ticker: (date, {line: array}), most recently used last
+        self.tables = None
+        self.version = None
+        self.hits, self.misses = 0, 0
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(db_path={self.db_path}, tables={len(self.table)}, "
+            f"nbytes={self.nbytes}, hits={self.hits}, misses={self.misses})"
+        )
+
+    def _check_version(self):
+        """Drop everything if the database file was rewritten or replaced"""
+        try:
+            stat = os.stat(self.db_path)
+            version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            version = None
+        if version != self.version:
+            if DEBUG:
+                logger.debug(f"_check_version() database changed, clear {self}")
+            self.table.clear()
+            self.nbytes, self.tables, self.version = 0, None, version
+
+    def _read_table(self, ticker: str) -> tuple:
+        """Read every column of a ticker table, NULL is nan"""
+        if self.tables is None:
+            # daily tables and every resampled frequency
+            self.tables = {
+                table for f in ("daily", *FREQUENCY_SUFFIX) for table in select_stonk_tables(ctx=self.ctx, frequency=f)
+            }
+        if ticker not in self.tables:
+            raise ValueError(f"unknown ticker: {ticker}")
+
+        return read_stonk_columns(ctx=self.ctx, table=ticker)
+
+    def get(self, ticker: str) -> tuple:
+        """Returns a tuple (date, {line: array}) for ticker"""
+        with self.lock:
+            self._check_version()
+            if ticker in self.table:
+                self.hits += 1
+                self.table.move_to_end(ticker)
+                return self.table[ticker]
+
+            self.misses += 1
+            date, line = self._read_table(ticker=ticker)
+            self.table[ticker] = date, line
+            self.nbytes += date.nbytes + sum(v.nbytes for v in line.values())
+            # evict least recently used, always keep the table just read
+            while self.nbytes > self.max_bytes and len(self.table) > 1:
+                _, (old_date, old_line) = self.table.popitem(last=False)
+                self.nbytes -= old_date.nbytes + sum(v.nbytes for v in old_line.values())
+            return date, line
+
+    def query(self, ticker: str, line: list, start: int = None, end: int = None) -> tuple:
+        """Returns a tuple (date, value), value is a (line, date) array of
+        the bars with start <= date <= end"""
+        date, table = self.get(ticker=ticker.upper())
+        for name in line:
+            if name.lower() not in table:
+                raise ValueError(f"unknown data line: {name}")
+        first = 0 if start is None else np.searchsorted(date, start, side="left")
+        last = len(date) if end is None else np.searchsorted(date, end, side="right")
+        value = np.array([table[name.lower()][first:last] for name in line]).reshape(len(line), -1)
+        return date[first:last], value
+
+
+class QueryHandler(socketserver.StreamRequestHandler):
+    """Request is one line 'TICKER line,line start end', start and end
+    are epoch seconds or '*'. Several requests may share a connection."""
+
+    def handle(self):
+        for request in self.rfile:
+            try:
+                ticker, line, start, end = request.decode().split()
+                date, value = self.server.cache.query(
+                    ticker=ticker,
+                    line=line.split(","),
+                    start=None if start == "*" else int(start),
+                    end=None if end == "*" else int(end),
+                )
+                reply = encode_reply(date=date, value=value)
+            except Exception as e:
+                logger.debug(f"*** ERROR *** {request} {e}")
+                message = f"{e}".encode()
+                reply = HEADER.pack(ERROR, len(message), 0) + message
+            self.wfile.write(reply)
+
+
+def encode_reply(date: np.ndarray, value: np.ndarray) -> bytes:
+    """Header, then int64 dates, then float64 values line by line, little endian"""
+    return (
+        HEADER.pack(MAGIC, len(date), len(value))
+        + np.asarray(date, dtype="<i8").tobytes()
+        + np.asarray(value, dtype="<f8").tobytes()
+    )
+
+
+def decode_reply(reply: bytes) -> tuple:
+    """Returns a tuple (date, value) from encode_reply() bytes"""
+    magic, rows, columns = HEADER.unpack_from(reply)
+    if magic == ERROR:
+        raise ValueError(reply[HEADER.size : HEADER.size + rows].decode())
+    date = np.frombuffer(reply, dtype="<i8", count=rows, offset=HEADER.size)
+    value = np.frombuffer(reply, dtype="<f8", count=rows * columns, offset=HEADER.size + rows * 8)
+    return date, value.reshape(columns, rows)
+
+
+def _read_exactly(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("query server closed the connection")
+        data += chunk
+    return bytes(data)
+
+
+def query_data_lines(ctx: dict, ticker: str, line: list, start: int = None, end: int = None) -> tuple:
+    """Ask the query server for data lines of ticker between start and end
+    (epoch seconds, inclusive). Returns a tuple (date, {line: array})."""
+    if DEBUG:
+        logger.debug(f"query_data_lines(ctx={type(ctx)}, ticker={ticker}, line={line}, start={start}, end={end})")
+
+    request = f"{ticker} {','.join(line)} {'*' if start is None else start} {'*' if end is None else end}\n"
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(_socket_path(ctx=ctx))
+        sock.sendall(request.encode())
+        header = _read_exactly(sock=sock, size=HEADER.size)
+        magic, rows, columns = HEADER.unpack(header)
+        size = rows if magic == ERROR else rows * 8 * (columns + 1)
+        date, value = decode_reply(header + _read_exactly(sock=sock, size=size))
+    return date, dict(zip(line, value))
+
+
+def serve_data_lines(ctx: dict) -> None:
+    """Run the query server in the foreground until interrupted"""
+    if DEBUG:
+        logger.debug(f"serve_data_lines(ctx={type(ctx)})")
+
+    socket_path = _socket_path(ctx=ctx)
+    query_ctx = _query_ctx(ctx=ctx)
+    # a socket left by a server that did not shut down cleanly
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    with socketserver.ThreadingUnixStreamServer(socket_path, QueryHandler) as server:
+        server.cache = DataLineCache(ctx=query_ctx, max_bytes=int(float(ctx["data_service"]["query_cache_mb"]) * 2**20))
+        if not DEBUG:
+            print(f" Query server listening on '{socket_path}'")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(socket_path)
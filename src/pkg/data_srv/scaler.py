@@ -0,0 +1,204 @@
+"""src/pkg/data_srv/scaler.py\n
+Rolling versions of the sklearn scalers used on each sliding\n
+window. The rolling classes take one bar at a time, window_scale()\n
+scales every window of a series or panel at once. The result for\n
+each bar matches fit_transform() on the window ending at that bar.\n
+class RollingMinMaxScaler\n
+class RollingRobustScaler\n
+rolling_scaler(scaler: str, window_size: int) -> object\n
+scaled_data_line(scaled: np.ndarray, valid: np.ndarray, window_size: int) -> np.ndarray\n
+sweep_columns(data_line: list, window_size: list, scaler: list) -> list\n
+window_scale(x: np.ndarray, window_size: int, scaler: str) -> np.ndarray\n
+window_scale_sweep(x: np.ndarray, window_size: list, scaler: list) -> dict
+"""
+
+import logging
+
+from bisect import bisect_left, insort
+from collections import deque
+
+import numpy as np
+
+from numpy.lib.stride_tricks import sliding_window_view
+
+from pkg import DEBUG
+
+
+logger = logging.getLogger(__name__)
+
+
+class RollingMinMaxScaler:
+    """MinMaxScaler over the last window_size bars. Monotonic deques
+    keep the window min and max, O(1) amortized per bar."""
+
+    def __init__(self, window_size: int):
+        self.window_size = window_size
+        self.count = 0
+        self.max_deque = deque()  # (index, value), values decreasing
+        self.min_deque = deque()  # (index, value), values increasing
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(window_size={self.window_size}, count={self.count})"
+
+    def update(self, value: float) -> float:
+        """Add a bar, returns its scaled value or None until the window is full"""
+        index, self.count = self.count, self.count + 1
+
+        while self.max_deque and self.max_deque[-1][1] <= value:
+            self.max_deque.pop()
+        self.max_deque.append((index, value))
+        while self.min_deque and self.min_deque[-1][1] >= value:
+            self.min_deque.pop()
+        self.min_deque.append((index, value))
+
+        # drop bars that have left the window
+        oldest = index - self.window_size + 1
+        if self.max_deque[0][0] < oldest:
+            self.max_deque.popleft()
+        if self.min_deque[0][0] < oldest:
+            self.min_deque.popleft()
+
+        if self.count < self.window_size:
+            return None
+        low, high = self.min_deque[0][1], self.max_deque[0][1]
+        # same float operations as sklearn, which uses a scale of 1 when the range is zero
+        scale = 1 / ((high - low) or 1)
+        return value * scale - low * scale
+
+
+class RollingRobustScaler:
+    """RobustScaler over the last window_size bars. The window is kept
+    sorted, bisect finds insert and remove positions so the median and
+    interquartile range are read directly by rank."""
+
+    def __init__(self, window_size: int):
+        self.window_size = window_size
+        self.window = deque()
+        self.ordered = list()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(window_size={self.window_size}, count={len(self.window)})"
+
+    def _percentile(self, q: float) -> float:
+        """Linear interpolation between ranks, same as numpy's default method"""
+        position = q * (len(self.ordered) - 1)
+        lower = int(position)
+        upper = min(lower + 1, len(self.ordered) - 1)
+        return self.ordered[lower] + (self.ordered[upper] - self.ordered[lower]) * (position - lower)
+
+    def update(self, value: float) -> float:
+        """Add a bar, returns its scaled value or None until the window is full"""
+        self.window.append(value)
+        insort(self.ordered, value)
+        if len(self.window) > self.window_size:
+            del self.ordered[bisect_left(self.ordered, self.window.popleft())]
+
+        if len(self.window) < self.window_size:
+            return None
+        median = self._percentile(0.5)
+        # sklearn uses a scale of 1 when the range is zero
+        scale = (self._percentile(0.75) - self._percentile(0.25)) or 1
+        return (value - median) / scale
+
+
+def rolling_scaler(scaler: str, window_size: int) -> object:
+    """Uses config file [data_service][sklearn_scaler] value"""
+    if DEBUG:
+        logger.debug(f"rolling_scaler(scaler={scaler}, window_size={window_size})")
+
+    if scaler == "MinMaxScaler":
+        return RollingMinMaxScaler(window_size=window_size)
+    elif scaler == "RobustScaler":
+        return RollingRobustScaler(window_size=window_size)
+    raise ValueError(f"unknown scaler: {scaler}")
+
+
+def _sorted_percentile(ordered: np.ndarray, count: np.ndarray, q: float) -> np.ndarray:
+    """Percentile of each sorted window, nan sorted last, count is the
+    number of valid values. Linear interpolation like numpy's default."""
+    position = q * np.maximum(count - 1, 0)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, np.maximum(count - 1, 0))
+    low = np.take_along_axis(ordered, lower[..., None], axis=-1)[..., 0]
+    high = np.take_along_axis(ordered, upper[..., None], axis=-1)[..., 0]
+    return low + (high - low) * (position - lower)
+
+
+def _scale_sorted(ordered: np.ndarray, count: np.ndarray, last: np.ndarray, scaler: str) -> np.ndarray:
+    """Scale last value of each window from its sorted values"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if scaler == "MinMaxScaler":
+            low = ordered[..., 0]
+            high = np.take_along_axis(ordered, np.maximum(count - 1, 0)[..., None], axis=-1)[..., 0]
+            # same float operations as sklearn, which uses a scale of 1 when the range is zero
+            scale = 1 / np.where(high > low, high - low, 1)
+            return last * scale - low * scale
+        elif scaler == "RobustScaler":
+            median = _sorted_percentile(ordered, count, 0.5)
+            iqr = _sorted_percentile(ordered, count, 0.75) - _sorted_percentile(ordered, count, 0.25)
+            return (last - median) / np.where(iqr != 0, iqr, 1)
+    raise ValueError(f"unknown scaler: {scaler}")
+
+
+def window_scale_sweep(x: np.ndarray, window_size: list, scaler: list, block_size: int = 2**22) -> dict:
+    """Returns a dict {(window_size, scaler): array} for every combination.
+    Each window size is viewed and sorted once, every scaler reads from
+    the same sorted windows. See window_scale()."""
+    if DEBUG:
+        logger.debug(f"window_scale_sweep(x={np.shape(x)}, window_size={window_size}, scaler={scaler})")
+
+    x = np.asarray(x, dtype=float)
+    panel = np.atleast_2d(x)
+    result = {(w, s): np.full(panel.shape, np.nan) for w in window_size for s in scaler}
+
+    for w in window_size:
+        if panel.shape[-1] < w:
+            continue
+        rows = max(1, block_size // (panel.shape[-1] * w))
+        for start in range(0, len(panel), rows):
+            view = sliding_window_view(panel[start : start + rows], window_shape=w, axis=-1)
+            ordered = np.sort(view, axis=-1)
+            count = (~np.isnan(view)).sum(axis=-1)
+            for s in scaler:
+                result[(w, s)][start : start + rows, w - 1 :] = _scale_sorted(ordered, count, view[..., -1], s)
+
+    return {key: value.reshape(x.shape) for key, value in result.items()}
+
+
+def window_scale(x: np.ndarray, window_size: int, scaler: str) -> np.ndarray:
+    """Scale the last value of each sliding window along the last axis of x,
+    same as fit_transform() on each window. Works on a 1-D series or a
+    2-D (ticker, date) panel. Nan values are skipped inside a window, the
+    result is nan where x is nan and for the first window_size - 1 dates.
+    Windows are sorted block by block to bound memory."""
+    return window_scale_sweep(x=x, window_size=[window_size], scaler=[scaler])[(window_size, scaler)]
+
+
+def scaled_data_line(scaled: np.ndarray, valid: np.ndarray, window_size: int) -> np.ndarray:
+    """Convert window_scale() output to stored values, int((value + 10) * 100).
+    The first window_size - 1 bars of each series are padded with its average,
+    like BaseProcessor._sliding_window_scaled_data(). Nan where not valid."""
+    shape = np.shape(scaled)
+    scaled = np.atleast_2d(np.trunc((scaled + 10) * 100))
+    valid = np.atleast_2d(valid)
+
+    # column of each series first bar, the window is full window_size - 1 columns later
+    column = np.arange(scaled.shape[1])
+    full = valid & (column >= np.argmax(valid, axis=1)[:, None] + window_size - 1)
+    with np.errstate(invalid="ignore"):
+        average = np.trunc(np.where(full, scaled, 0).sum(axis=1) / full.sum(axis=1))
+    pad = valid & ~full
+    scaled[pad] = np.broadcast_to(average[:, None], scaled.shape)[pad]
+    scaled[~valid] = np.nan
+    return scaled.reshape(shape)
+
+
+def sweep_columns(data_line: list, window_size: list, scaler: list) -> list:
+    """Column names for a sweep of each scaled data line, i.e. sc_vol_w5_robust"""
+    return [
+        f"{item.lower()}_w{w}_{s.removesuffix('Scaler').lower()}"
+        for item in data_line
+        if item.lower() in ("sc_cwap", "sc_mass", "sc_vol")
+        for w in window_size
+        for s in scaler
+    ]
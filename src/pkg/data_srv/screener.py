@@ -0,0 +1,271 @@
+"""src/pkg/data_srv/screener.py\n
+Screen every ticker with the rules in config file [screen_rule],\n
+i.e. volume_spike = sc_vol > 1100 and clv > 50. A rule is parsed\n
+once into numpy operations on (ticker, bar) arrays of the latest\n
+bars, so each rule checks the whole universe in one evaluation.\n
+Matches are written to a results table of the stonk database.\n
+class ScreenRule\n
+compile_screen_rules(ctx: dict) -> list\n
+read_latest_bars(ctx: dict, column: list, depth: int) -> tuple\n
+run_stonk_screen(ctx: dict, rule: list) -> dict
+"""
+
+import ast, logging, operator, sqlite3, time
+
+import numpy as np
+
+from pkg import DEBUG
+from pkg.ctx_mgr import SqliteConnectManager
+from pkg.data_srv.utils import read_latest_snapshot, read_stonk_columns, select_stonk_tables
+
+
+logger = logging.getLogger(__name__)
+
+# matches of each rule, date is the ticker's latest bar
+SCREEN_TABLE = "_screen"
+
+
+def _count(x: np.ndarray) -> np.ndarray:
+    return (~np.isnan(x)).sum(axis=1)
+
+
+def _mean(x: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid="ignore"):
+        return np.nansum(x, axis=1) / _count(x)
+
+
+def _min(x: np.ndarray) -> np.ndarray:
+    return np.where(_count(x) > 0, np.where(np.isnan(x), np.inf, x).min(axis=1), np.nan)
+
+
+def _max(x: np.ndarray) -> np.ndarray:
+    return np.where(_count(x) > 0, np.where(np.isnan(x), -np.inf, x).max(axis=1), np.nan)
+
+
+def _sum(x: np.ndarray) -> np.ndarray:
+    return np.where(_count(x) > 0, np.nansum(x, axis=1), np.nan)
+
+
+class ScreenRule:
+    """A rule compiled into numpy operations. Names are data lines of the
+    latest bar, mean(line, n), min, max and sum aggregate the last n bars,
+    ago(line, n) is the value n bars before the latest. Comparisons, and,
+    or, not and + - * / work as in python, but and, or and not only take
+    comparisons. A ticker missing any value the rule reads never matches."""
+
+    COMPARE = {
+        ast.Eq: operator.eq,
+        ast.Gt: operator.gt,
+        ast.GtE: operator.ge,
+        ast.Lt: operator.lt,
+        ast.LtE: operator.le,
+        ast.NotEq: operator.ne,
+    }
+    ARITHMETIC = {ast.Add: operator.add, ast.Div: operator.truediv, ast.Mult: operator.mul, ast.Sub: operator.sub}
+    AGGREGATE = {"max": _max, "mean": _mean, "min": _min, "sum": _sum}
+
+    def __init__(self, name: str, text: str):
+        self.name = name
+        self.text = text
+        self.column = set()
+        self.depth = 1  # bars needed, the latest is 1
+        self.value = list()  # functions(bars) of every data line value the rule reads
+        try:
+            node = ast.parse(text, mode="eval").body
+        except SyntaxError:
+            raise ValueError(f"unknown screen rule: {name} = {text}")
+        if not self._is_boolean(node):
+            raise ValueError(f"unknown screen rule: {name} = {text}")
+        self.match = self._compile(node)
+
+    def evaluate(self, bars: dict) -> np.ndarray:
+        """Returns a bool array, true for each ticker matching the rule"""
+        # comparisons with nan are false, but not would turn them true
+        valid = np.logical_and.reduce([~np.isnan(value(bars)) for value in self.value])
+        return np.logical_and(self.match(bars), valid)
+
+    def _is_boolean(self, node: ast.AST) -> bool:
+        """A comparison, or and, or and not of comparisons"""
+        match node:
+            case ast.Compare():
+                return True
+            case ast.BoolOp(values=values):
+                return all(self._is_boolean(item) for item in values)
+            case ast.UnaryOp(op=ast.Not(), operand=operand):
+                return self._is_boolean(operand)
+        return False
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(name={self.name}, text={self.text}, depth={self.depth})"
+
+    def _compile(self, node: ast.AST) -> object:
+        """Returns a function(bars) of the (ticker, bar) arrays in dict bars"""
+        match node:
+            case ast.BoolOp(op=ast.And() | ast.Or() as op, values=values):
+                parts = [self._compile(item) for item in values]
+                reduce = np.logical_and.reduce if isinstance(op, ast.And) else np.logical_or.reduce
+                return lambda bars: reduce([part(bars) for part in parts])
+            case ast.UnaryOp(op=ast.Not(), operand=operand):
+                part = self._compile(operand)
+                return lambda bars: np.logical_not(part(bars))
+            case ast.UnaryOp(op=ast.USub(), operand=operand):
+                part = self._compile(operand)
+                return lambda bars: -part(bars)
+            case ast.Compare(left=left, ops=ops, comparators=comparators) if all(
+                type(op) in self.COMPARE for op in ops
+            ):
+                # a < b < c is a < b and b < c
+                parts = [self._compile(item) for item in [left, *comparators]]
+                compare = [self.COMPARE[type(op)] for op in ops]
+
+                def evaluate(bars):
+                    value = [part(bars) for part in parts]
+                    with np.errstate(invalid="ignore"):
+                        return np.logical_and.reduce([f(a, b) for f, a, b in zip(compare, value, value[1:])])
+
+                return evaluate
+            case ast.BinOp(left=left, op=op, right=right) if type(op) in self.ARITHMETIC:
+                a, b, f = self._compile(left), self._compile(right), self.ARITHMETIC[type(op)]
+
+                def evaluate(bars):
+                    with np.errstate(divide="ignore", invalid="ignore"):
+                        return f(a(bars), b(bars))
+
+                return evaluate
+            case ast.Constant(value=value) if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return lambda bars: value
+            case ast.Name(id=name):
+                self.column.add(name.lower())
+                self.value.append(lambda bars: bars[name.lower()][:, -1])
+                return self.value[-1]
+            case ast.Call(func=ast.Name(id=func), args=[ast.Name(id=name), ast.Constant(value=int(n))]) if n > 0:
+                self.column.add(name.lower())
+                if func == "ago":
+                    self.depth = max(self.depth, n + 1)
+                    self.value.append(lambda bars: bars[name.lower()][:, -1 - n])
+                    return self.value[-1]
+                if func in self.AGGREGATE:
+                    # nan if none of the n bars has a value
+                    self.depth = max(self.depth, n)
+                    self.value.append(lambda bars: self.AGGREGATE[func](bars[name.lower()][:, -n:]))
+                    return self.value[-1]
+        raise ValueError(f"unknown screen rule: {self.name} = {self.text}")
+
+
+def read_latest_bars(ctx: dict, column: list, depth: int) -> tuple:
+    """Returns a tuple (ticker, date, bars), date is each ticker's latest bar
+    and bars a dict {column: (ticker, depth) array}, latest bar last, nan
+    padded in front for tickers with fewer bars. The latest bar alone comes
+    from the snapshot table in one read."""
+    if DEBUG:
+        logger.debug(f"read_latest_bars(ctx={type(ctx)}, column={column}, depth={depth})")
+
+    if depth == 1:
+        try:
+            ticker, date, line = read_latest_snapshot(ctx=ctx)
+        except sqlite3.OperationalError:
+            pass  # a database from before the snapshot table, read each table
+        else:
+            for name in column:
+                if name not in line:
+                    raise ValueError(f"unknown data line: {name}")
+            return ticker, date, {name: line[name][:, None] for name in column}
+
+    ticker = select_stonk_tables(ctx=ctx)
+    date = np.zeros(len(ticker), dtype=np.int64)
+    bars = {name: np.full((len(ticker), depth), np.nan) for name in column}
+    for row, table in enumerate(ticker):
+        try:
+            table_date, line = read_stonk_columns(ctx=ctx, table=table, column=column, last=depth)
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"unknown data line: {e}")
+        if not len(table_date):
+            continue
+        date[row] = table_date[-1]
+        for name in column:
+            bars[name][row, depth - len(table_date) :] = line[name]
+    return ticker, date, bars
+
+
+def compile_screen_rules(ctx: dict) -> list:
+    """Returns a list of ScreenRule, one for each [screen_rule]. A rule that
+    does not parse is logged and left out, the others still run."""
+    if DEBUG:
+        logger.debug(f"compile_screen_rules(ctx={type(ctx)})")
+
+    rule = list()
+    for name, text in ctx.get("screen_rule", {}).items():
+        if not text:
+            continue
+        try:
+            rule.append(ScreenRule(name=name, text=text))
+        except ValueError as e:
+            logger.debug(f"*** ERROR *** {e}")
+            if not DEBUG:
+                print(f"  - screen {name}\tskipped, {e}")
+    return rule
+
+
+def _match_rules(ctx: dict, rule: list) -> tuple:
+    """Returns a tuple (ticker, date, {rule: index of each matching ticker}),
+    the latest bars of every rule are read at once"""
+    column = sorted(set().union(*(item.column for item in rule)))
+    ticker, date, bars = read_latest_bars(ctx=ctx, column=column, depth=max(item.depth for item in rule))
+    return ticker, date, {item.name: np.flatnonzero(np.broadcast_to(item.evaluate(bars), len(ticker))) for item in rule}
+
+
+def run_stonk_screen(ctx: dict, rule: list = None) -> dict:
+    """Check each rule against the latest bars of every ticker and write the
+    matches to the screen table. Returns a dict {rule: tickers}. Rule is a
+    list from compile_screen_rules(), every [screen_rule] if None. A rule
+    that fails, i.e. reads an unknown data line, is logged and left out."""
+    if DEBUG:
+        logger.debug(f"run_stonk_screen(ctx={type(ctx)}, rule={rule})")
+
+    start = time.perf_counter()
+    if rule is None:
+        rule = compile_screen_rules(ctx=ctx)
+    if not rule:
+        return dict()
+
+    try:
+        ticker, date, match = _match_rules(ctx=ctx, rule=rule)
+    except Exception:
+        # find the rules failing on their own, screen with the others
+        good = list()
+        for item in rule:
+            try:
+                _match_rules(ctx=ctx, rule=[item])
+            except Exception as e:
+                logger.debug(f"*** ERROR *** {item.name} {e}")
+                if not DEBUG:
+                    print(f"  - screen {item.name}\tskipped, {e}")
+            else:
+                good.append(item)
+        if not good:
+            return dict()
+        ticker, date, match = _match_rules(ctx=ctx, rule=good)
+
+    with SqliteConnectManager(ctx=ctx, mode="rw") as con:
+        con.cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {SCREEN_TABLE} (
+                rule      TEXT       NOT NULL,
+                ticker    TEXT       NOT NULL,
+                date      INTEGER    NOT NULL,
+                run       REAL       NOT NULL,
+                PRIMARY KEY (rule, ticker, date)
+            )
+        """
+        )
+        run = time.time()
+        con.cursor.executemany(
+            f"INSERT OR REPLACE INTO {SCREEN_TABLE} VALUES (?, ?, ?, ?)",
+            [(name, ticker[i], int(date[i]), run) for name, index in match.items() for i in index],
+        )
+
+    if not DEBUG:
+        for name, index in match.items():
+            print(f"  - screen {name}\t{len(index)} of {len(ticker)} tickers")
+        print(f"  - screened in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return {name: [ticker[i] for i in index] for name, index in match.items()}
@@ -0,0 +1,70 @@
+"""src/pkg/data_srv/stream.py\n
+Streaming mode, data lines of one ticker derived chunk by chunk\n
+as the provider returns them, so months of intraday bars never\n
+sit in memory at once. The last bars of each chunk are carried\n
+in front of the next one, sliding windows continue where they\n
+left off and running totals continue from the last written row.\n
+class DataLineStream
+"""
+
+import logging
+
+import numpy as np
+
+from pkg import DEBUG
+from pkg.data_srv import indicator
+
+
+logger = logging.getLogger(__name__)
+
+OHLCV = ("open", "high", "low", "close", "volume")
+
+
+class DataLineStream:
+    """Data lines for ticker from consecutive chunks of bars. The last carry
+    bars, at least every window size, are run again in front of each chunk.
+    Scaled data lines match the unchunked values exactly, recursive
+    indicators (ema, rsi, ...) converge to them well within a few hundred
+    bars. The first window_size - 1 bars are padded with the average of the
+    first chunk instead of the whole series."""
+
+    def __init__(self, processor: object, ticker: str, carry: int):
+        self.processor = processor
+        self.ticker = ticker
+        self.carry = max(carry, processor.window_size, *processor.sweep_window)
+        self.cumulative = [item.lower() for item in processor.data_line if indicator.is_cumulative(item)]
+        self.date = np.empty(0, dtype=np.int64)
+        self.bars = {key: np.empty(0) for key in OHLCV}
+        self.last = None  # last written row
+        self.rows = 0
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(ticker={self.ticker}, carry={self.carry}, rows={self.rows})"
+
+    def update(self, date: np.ndarray, bars: dict) -> tuple:
+        """Add a chunk of bars, oldest first. Returns a tuple (ticker, dataframe)
+        of the rows not written before, None until there are window_size bars."""
+        if DEBUG:
+            logger.debug(f"update(self={self}, date={len(date)})")
+
+        # a provider with an inclusive end date repeats the last day of the previous chunk
+        date = np.asarray(date, dtype=np.int64)
+        new = date > self.date[-1] if len(self.date) else np.ones(len(date), dtype=bool)
+        self.date = np.concatenate([self.date, date[new]])
+        self.bars = {key: np.concatenate([self.bars[key], np.asarray(bars[key], dtype=float)[new]]) for key in OHLCV}
+        if len(self.date) < self.processor.window_size or not new.any():
+            return None
+
+        _, df = self.processor._data_line_frame(ticker=self.ticker, date=self.date, bars=self.bars)
+        written = 0 if self.last is None else int(np.searchsorted(self.date, self.last.name, side="right"))
+        if written:
+            # running totals restart at the first carried bar, shift them back onto the written level
+            for column in self.cumulative:
+                df[column] += self.last[column] - df[column].iloc[written - 1]
+        df = df.iloc[written:]
+
+        self.last = df.iloc[-1]
+        self.rows += len(df)
+        self.date = self.date[-self.carry :]
+        self.bars = {key: value[-self.carry :] for key, value in self.bars.items()}
+        return self.ticker, df
@@ -1,18 +1,42 @@
 """src/pkg/data_srv/utils.py\n
 create_sqlite_ohlc_database(ctx: dict) -> None\n
-create_sqlite_stonk_database(ctx: dict) -> None\n
-write_data_line_to_stonk_table(ctx: dict, data_tuple: tuple) -> None"""
+create_sqlite_stonk_database(ctx: dict, replace: bool) -> None\n
+read_backfill_checkpoint(ctx: dict) -> set\n
+read_latest_snapshot(ctx: dict, frequency: str) -> tuple\n
+read_ohlcv_from_stonk_table(ctx: dict, table: str) -> tuple\n
+read_stonk_columns(ctx: dict, table: str, column: list, since: int, until: int, last: int) -> tuple\n
+read_stored_days(ctx: dict, ticker: list, start: datetime.date) -> dict\n
+resample_ohlcv(date: np.ndarray, bars: dict, frequency: str) -> tuple\n
+roll_stonk_partitions(ctx: dict) -> None\n
+select_stonk_tables(ctx: dict, frequency: str) -> list\n
+stonk_table(ticker: str, frequency: str) -> str\n
+write_backfill_checkpoint(ctx: dict, ticker: str, start: str, end: str) -> None\n
+write_data_line_to_stonk_table(ctx: dict, data_tuple: tuple) -> bool\n
+write_panel_to_stonk_tables(ctx: dict, ticker: list, date: np.ndarray, line: dict, present: np.ndarray) -> None"""
 
-import logging
+import datetime, logging, os, sqlite3
 
 from pathlib import Path
 
+import numpy as np
+
 from pkg import DEBUG
 from pkg.ctx_mgr import SqliteConnectManager
+from pkg.data_srv.blob import BLOB_TABLE, read_blob_columns, write_blob_rows
+from pkg.data_srv.scaler import sweep_columns
 
 
 logger = logging.getLogger(__name__)
 
+# completed (ticker, chunk) pairs of a backfill
+BACKFILL_TABLE = "_backfill"
+
+# latest bar of every ticker table, kept up to date by each write
+LATEST_TABLE = "_latest"
+
+# table name suffix of bars resampled from daily bars, daily tables are the ticker
+FREQUENCY_SUFFIX = {"weekly": "_WEEKLY", "monthly": "_MONTHLY"}
+
 
 def create_sqlite_ohlc_database(ctx: dict) -> None:
     """Create sqlite3 database. Table for each ticker symbol, column for ohlc."""
@@ -50,37 +74,76 @@ def create_sqlite_ohlc_database(ctx: dict) -> None:
         print(f"\n Created db: '{con.db_path}'")
 
 
-def create_sqlite_stonk_database(ctx: dict) -> None:
-    """Create sqlite3 database. Table for each ticker symbol, column for each data line."""
+def create_sqlite_stonk_database(ctx: dict, replace: bool = True) -> None:
+    """Create sqlite3 database. Table for each ticker symbol, column for each data line.
+    If replace is False an existing database is kept, missing tables and columns are added."""
     if DEBUG:
-        logger.debug(f"create_sqlite_indicator_database(ctx={type(ctx)})")
+        logger.debug(f"create_sqlite_indicator_database(ctx={type(ctx)}, replace={replace})")
 
     # create data folder in users work_dir
     Path(f"{ctx['default']['work_dir']}{ctx['interface']['command']}").mkdir(parents=True, exist_ok=True)
     # if old database exists remove it
-    Path(f"{ctx['default']['work_dir']}{ctx['interface']['command']}/{ctx['interface']['database']}").unlink(
-        missing_ok=True
+    if replace:
+        Path(f"{ctx['default']['work_dir']}{ctx['interface']['command']}/{ctx['interface']['database']}").unlink(
+            missing_ok=True
+        )
+
+    # column for each indicator (data_line), then each sweep setting
+    sweep = sweep_columns(
+        data_line=ctx["interface"]["data_line"],
+        window_size=[int(w) for w in ctx["data_service"]["sweep_window"].split()],
+        scaler=ctx["data_service"]["sweep_scaler"].split(),
     )
+    columns = [col.lower() for col in ctx["interface"]["data_line"] + sweep]
+    # daily table for each ticker, then a table for each resampled frequency
+    frequency = ["daily", *ctx["data_service"]["resample_frequency"].split()]
+    tables = [stonk_table(ticker=ticker, frequency=f) for f in frequency for ticker in ctx["interface"]["ticker"]]
 
     try:
         with SqliteConnectManager(ctx=ctx, mode="rwc") as con:
             # create table for each ticker symbol
-            for table in ctx["interface"]["ticker"]:
+            for table in tables:
                 con.cursor.execute(
                     f"""
-                    CREATE TABLE {table.upper()} (
+                    CREATE TABLE IF NOT EXISTS {table.upper()} (
                         date    INTEGER    NOT NULL,
                         PRIMARY KEY (date)
                     )
                 """
                 )
-                # add column for each indicator (data_line)
-                for col in ctx["interface"]["data_line"]:
-                    con.cursor.execute(
-                        f"""
-                        ALTER TABLE {table} ADD COLUMN {col.lower()} INTEGER
-                    """
-                    )
+            # one row per table holding its latest bar
+            con.cursor.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {LATEST_TABLE} (
+                    ticker  TEXT       NOT NULL,
+                    date    INTEGER    NOT NULL,
+                    PRIMARY KEY (ticker)
+                )
+            """
+            )
+            # compressed data lines, the ticker tables stay empty
+            if _storage_mode(ctx=ctx) == "blob":
+                con.cursor.execute(
+                    f"""
+                    CREATE TABLE IF NOT EXISTS {BLOB_TABLE} (
+                        ticker  TEXT       NOT NULL,
+                        line    TEXT       NOT NULL,
+                        block   INTEGER    NOT NULL,
+                        count   INTEGER    NOT NULL,
+                        data    BLOB       NOT NULL,
+                        PRIMARY KEY (ticker, line, block)
+                    ) WITHOUT ROWID
+                """
+                )
+            for table in [*tables, LATEST_TABLE]:
+                existing = [row[1] for row in con.cursor.execute(f"PRAGMA table_info({table})").fetchall()]
+                for col in columns:
+                    if col not in existing:
+                        con.cursor.execute(
+                            f"""
+                            ALTER TABLE {table} ADD COLUMN {col} INTEGER
+                        """
+                        )
     except con.sqlite3.Error as e:
         logger.debug(f"*** ERROR *** {e}")
 
@@ -88,23 +151,371 @@ def create_sqlite_stonk_database(ctx: dict) -> None:
         print(f"\n Created db: '{con.db_path}'")
 
 
-def write_data_line_to_stonk_table(ctx: dict, data_tuple: tuple) -> None:
-    """"""
+def read_backfill_checkpoint(ctx: dict) -> set:
+    """Returns a set of completed (ticker, chunk start) pairs, creates the checkpoint table if needed"""
+    if DEBUG:
+        logger.debug(f"read_backfill_checkpoint(ctx={type(ctx)})")
+
+    with SqliteConnectManager(ctx=ctx, mode="rw") as con:
+        con.cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {BACKFILL_TABLE} (
+                ticker    TEXT       NOT NULL,
+                start     TEXT       NOT NULL,
+                end       TEXT       NOT NULL,
+                PRIMARY KEY (ticker, start)
+            )
+        """
+        )
+        rows = con.cursor.execute(f"SELECT ticker, start FROM {BACKFILL_TABLE}").fetchall()
+    return set(rows)
+
+
+def read_latest_snapshot(ctx: dict, frequency: str = "daily") -> tuple:
+    """Returns a tuple (ticker, date, dict) of the latest bar of every table
+    for frequency, one read of the snapshot table. The dict holds an array
+    for each data line, NULL is nan."""
+    if DEBUG:
+        logger.debug(f"read_latest_snapshot(ctx={type(ctx)}, frequency={frequency})")
+
+    with SqliteConnectManager(ctx=ctx, mode="pool", detect_types=False) as con:
+        rows = con.cursor.execute(f"SELECT * FROM {LATEST_TABLE} ORDER BY ticker").fetchall()
+        column = [item[0] for item in con.cursor.description]
+
+    rows = [row for row in rows if _is_frequency(table=row[0], frequency=frequency)]
+    data = np.array([row[1:] for row in rows], dtype=float).reshape(-1, len(column) - 1)
+    line = {name: data[:, i] for i, name in enumerate(column[2:], 1)}
+    return [row[0] for row in rows], data[:, 0].astype(np.int64), line
+
+
+def read_ohlcv_from_stonk_table(ctx: dict, table: str) -> tuple:
+    """Returns a tuple (date, dict) of arrays, oldest bar first. Open, high,
+    low, close are rebuilt from the clop, clv, cwap, hilo data lines:\n
+    close = cwap + clv * hilo / 400, high + low = 4 * cwap - 2 * close,\n
+    high - low = hilo, open = close - clop. Prices are in cents."""
+    if DEBUG:
+        logger.debug(f"read_ohlcv_from_stonk_table(ctx={type(ctx)}, table={table})")
+
+    date, line = read_stonk_columns(ctx=ctx, table=table, column=["clop", "clv", "cwap", "hilo", "volume"])
+    clop, clv, cwap, hilo, volume = (line[name] for name in ("clop", "clv", "cwap", "hilo", "volume"))
+
+    close = cwap + np.nan_to_num(clv) * hilo / 400
+    high_low = 4 * cwap - 2 * close
+    bars = {
+        "open": close - clop,
+        "high": (high_low + hilo) / 2,
+        "low": (high_low - hilo) / 2,
+        "close": close,
+        "volume": volume,
+    }
+    return date, bars
+
+
+def read_stonk_columns(
+    ctx: dict, table: str, column: list = None, since: int = None, until: int = None, last: int = None
+) -> tuple:
+    """Returns a tuple (date, {column: array}) of table, oldest bar first,
+    every data line if column is None, NULL is nan. Since keeps dates from
+    since on, until up to until, last only the newest last bars of those.
+    Reads rows or BLOBs depending on [data_service] storage_mode."""
     if DEBUG:
         logger.debug(
-            f"write_data_line_to_stonk_table(ctx={ctx}, data_tuple[0]: {data_tuple[0]}, data_tuple[1]:\n{data_tuple[1]})"
+            f"read_stonk_columns(ctx={type(ctx)}, table={table}, column={column}, since={since}, until={until}, "
+            f"last={last})"
         )
+
+    with SqliteConnectManager(ctx=ctx, mode="pool", detect_types=False) as con:
+        if _storage_mode(ctx=ctx) == "blob":
+            return read_blob_columns(cursor=con.cursor, table=table, column=column, since=since, until=until, last=last)
+
+        select = "*" if column is None else ", ".join(["date", *column])
+        bound = list()
+        if since is not None:
+            bound.append(f"date >= {int(since)}")
+        if until is not None:
+            bound.append(f"date <= {int(until)}")
+        where = f"WHERE {' AND '.join(bound)}" if bound else ""
+        if last is None:
+            rows = con.cursor.execute(f"SELECT {select} FROM {table} {where} ORDER BY date").fetchall()
+        else:
+            rows = con.cursor.execute(f"SELECT {select} FROM {table} {where} ORDER BY date DESC LIMIT {int(last)}")
+            rows = rows.fetchall()[::-1]
+        name = [item[0] for item in con.cursor.description][1:]
+
+    data = np.array(rows, dtype=float).reshape(-1, len(name) + 1)
+    return data[:, 0].astype(np.int64), {item: data[:, i].copy() for i, item in enumerate(name, 1)}
+
+
+def read_stored_days(ctx: dict, ticker: list, start: datetime.date) -> dict:
+    """Returns a dict {ticker: datetime64[D] array} of the days with a stored
+    daily bar from start on. Bars stamped at local or UTC midnight both round
+    to their session day."""
+    if DEBUG:
+        logger.debug(f"read_stored_days(ctx={type(ctx)}, ticker={len(ticker)}, start={start})")
+
+    since = datetime.datetime.combine(start, datetime.time(), datetime.timezone.utc).timestamp() - 43200
+    stored = dict()
+    for item in ticker:
+        date, _ = read_stonk_columns(ctx=ctx, table=stonk_table(ticker=item), column=[], since=since)
+        stored[item] = ((date + 43200) // 86400).astype("datetime64[D]")
+    return stored
+
+
+def resample_ohlcv(date: np.ndarray, bars: dict, frequency: str) -> tuple:
+    """Returns a tuple (date, dict) of daily bars grouped into 'weekly' or
+    'monthly' bars. Date is the timestamp of the first bar in each group."""
+    if DEBUG:
+        logger.debug(f"resample_ohlcv(date={len(date)}, bars={list(bars)}, frequency={frequency})")
+
+    if not len(date):
+        return date, bars
+
+    day = date.astype("datetime64[s]").astype("datetime64[D]")
+    if frequency == "weekly":
+        # epoch is a thursday, shift so weeks start on monday
+        group = (day.astype(np.int64) + 3) // 7
+    elif frequency == "monthly":
+        group = day.astype("datetime64[M]").astype(np.int64)
+    else:
+        raise ValueError(f"unknown frequency: {frequency}")
+
+    # index of the first bar in each group, date must be sorted
+    start = np.flatnonzero(np.diff(group, prepend=group[0] - 1))
+    end = np.append(start[1:], len(group)) - 1
+    resampled = {
+        "open": bars["open"][start],
+        "high": np.maximum.reduceat(bars["high"], start),
+        "low": np.minimum.reduceat(bars["low"], start),
+        "close": bars["close"][end],
+        "volume": np.add.reduceat(bars["volume"], start),
+    }
+    return date[start], resampled
+
+
+def _year_start(year: int) -> int:
+    """Epoch seconds dividing year from the year before. Bars are stamped
+    with a local or exchange midnight, half a day early keeps each bar
+    in its own year for timezones from UTC-12 to UTC+12."""
+    return int(datetime.datetime(year, 1, 1, tzinfo=datetime.timezone.utc).timestamp()) - 43200
+
+
+def roll_stonk_partitions(ctx: dict) -> None:
+    """Move bars from before this year out of the stonk database into a
+    file per year, i.e. stonk_2023.db. Partitions older than last year are
+    compacted and made read-only, bars for them are no longer moved. With
+    [data_service] partition_retention = n only the last n years are kept.
+    Raises ValueError in blob storage mode, or if the partitions to keep are
+    more than a connection can attach."""
+    if DEBUG:
+        logger.debug(f"roll_stonk_partitions(ctx={type(ctx)})")
+
+    if _storage_mode(ctx=ctx) == "blob":
+        raise ValueError("partition mode year needs storage mode row")
+
+    db_path = Path(f"{ctx['default']['work_dir']}{ctx['interface']['command']}/{ctx['interface']['database']}")
+    this_year = datetime.date.today().year
+    retention = int(ctx["data_service"]["partition_retention"])
+    oldest = this_year - retention + 1 if retention else 0
+
+    def partition_path(year: int) -> Path:
+        return db_path.with_name(f"{db_path.stem}_{year}{db_path.suffix}")
+
+    with SqliteConnectManager(ctx=ctx, mode="rw") as con:
+        table = [
+            row[0]
+            for row in con.cursor.execute(
+                r"SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE '\_%' ESCAPE '\'"
+            ).fetchall()
+        ]
+        # MIN(date) of an empty table is NULL
+        first = [con.cursor.execute(f"SELECT MIN(date) FROM {t}").fetchone()[0] for t in table]
+        first = min((v for v in first if v is not None), default=None)
+        first_year = datetime.datetime.fromtimestamp(first + 43200, datetime.timezone.utc).year if first else this_year
+
+        # partition years once rolled, each is attached to read the full history
+        kept = db_path.parent.glob(f"{db_path.stem}_[0-9][0-9][0-9][0-9]{db_path.suffix}")
+        kept = {int(path.stem[-4:]) for path in kept}
+        kept = {year for year in kept.union(range(first_year, this_year)) if year >= oldest}
+        if len(kept) > SqliteConnectManager.MAX_PARTITION:
+            raise ValueError(
+                f"{len(kept)} year partitions, at most {SqliteConnectManager.MAX_PARTITION} can be attached: "
+                f"set partition_retention to {SqliteConnectManager.MAX_PARTITION + 1} or less"
+            )
+
+        for year in range(first_year, this_year):
+            path, start, end = partition_path(year), _year_start(year), _year_start(year + 1)
+            if year >= oldest and not (path.exists() and not os.access(path, os.W_OK)):
+                con.connection.commit()
+                con.cursor.execute("ATTACH DATABASE ? AS part", (f"file:{path}?mode=rwc",))
+                for t in table:
+                    sql = con.cursor.execute("SELECT sql FROM sqlite_master WHERE name = ?", (t,)).fetchone()[0]
+                    con.cursor.execute(sql.replace("CREATE TABLE ", "CREATE TABLE IF NOT EXISTS part.", 1))
+                    column = [row[1] for row in con.cursor.execute(f"PRAGMA main.table_info({t})").fetchall()]
+                    existing = [row[1] for row in con.cursor.execute(f"PRAGMA part.table_info({t})").fetchall()]
+                    for col in column:
+                        if col not in existing:
+                            con.cursor.execute(f"ALTER TABLE part.{t} ADD COLUMN {col} INTEGER")
+                    con.cursor.execute(
+                        f"INSERT OR REPLACE INTO part.{t} ({', '.join(column)}) "
+                        f"SELECT {', '.join(column)} FROM main.{t} WHERE date >= ? AND date < ?",
+                        (start, end),
+                    )
+                con.connection.commit()
+                con.cursor.execute("DETACH DATABASE part")
+            # moved, or the partition is read-only or past retention
+            for t in table:
+                con.cursor.execute(f"DELETE FROM {t} WHERE date >= ? AND date < ?", (start, end))
+
+    for path in sorted(db_path.parent.glob(f"{db_path.stem}_[0-9][0-9][0-9][0-9]{db_path.suffix}")):
+        year = int(path.stem[-4:])
+        if year < oldest:
+            path.unlink()
+            if not DEBUG:
+                print(f" Removed partition: '{path}'")
+        elif year < this_year - 1 and os.access(path, os.W_OK):
+            # last year is still writable, a fetch may overlap the new year
+            connection = sqlite3.connect(path)
+            connection.execute("VACUUM")
+            connection.close()
+            path.chmod(0o444)
+            if not DEBUG:
+                print(f" Sealed partition: '{path}'")
+
+
+def select_stonk_tables(ctx: dict, frequency: str = "daily") -> list:
+    """Returns a list of table names for frequency in the stonk database and its partitions"""
+    if DEBUG:
+        logger.debug(f"select_stonk_tables(ctx={type(ctx)}, frequency={frequency})")
+
+    with SqliteConnectManager(ctx=ctx, mode="pool", detect_types=False) as con:
+        # tables starting with an underscore are bookkeeping, not tickers
+        rows = con.cursor.execute(
+            r"""
+            SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE '\_%' ESCAPE '\'
+            UNION SELECT name FROM sqlite_temp_master WHERE type = 'view' ORDER BY name
+        """
+        ).fetchall()
+    return [row[0] for row in rows if _is_frequency(table=row[0], frequency=frequency)]
+
+
+def _is_frequency(table: str, frequency: str) -> bool:
+    """True if table holds bars of frequency, see stonk_table()"""
+    if frequency == "daily":
+        return not table.endswith(tuple(FREQUENCY_SUFFIX.values()))
+    return table.endswith(FREQUENCY_SUFFIX[frequency])
+
+
+def _storage_mode(ctx: dict) -> str:
+    """[data_service] storage_mode, row for a row per date or blob"""
+    mode = ctx["data_service"].get("storage_mode", "row")
+    if mode not in ("blob", "row"):
+        raise ValueError(f"unknown storage mode: {mode}")
+    return mode
+
+
+def stonk_table(ticker: str, frequency: str = "daily") -> str:
+    """Table name for ticker at frequency, i.e. 'AAPL' or 'AAPL_WEEKLY'"""
+    if frequency == "daily":
+        return ticker.upper()
+    elif frequency in FREQUENCY_SUFFIX:
+        return f"{ticker.upper()}{FREQUENCY_SUFFIX[frequency]}"
+    raise ValueError(f"unknown frequency: {frequency}")
+
+
+def _update_latest(con: object, table: str, column: str) -> None:
+    """Copy the newest row of table into the snapshot table, in the
+    transaction of the write. Column is the comma separated column list."""
+    con.cursor.execute(
+        f"INSERT OR REPLACE INTO {LATEST_TABLE} (ticker, {column}) "
+        f"SELECT ?, {column} FROM {table} ORDER BY date DESC LIMIT 1",
+        (table,),
+    )
+
+
+def _write_blob(ctx: dict, con: object, table: str, date: np.ndarray, line: dict) -> None:
+    """Write bars as BLOBs, then the newest of them to the snapshot table
+    unless it already holds a newer bar"""
+    if not len(date):
+        return
+    write_blob_rows(
+        cursor=con.cursor, table=table, date=date, line=line, block_days=int(ctx["data_service"]["blob_block_days"])
+    )
+    newest = int(np.argmax(date))
+    value = [None if np.isnan(item[newest]) else float(item[newest]) for item in line.values()]
+    con.cursor.execute(
+        f"INSERT INTO {LATEST_TABLE} (ticker, {', '.join(['date', *line])}) "
+        f"VALUES ({', '.join('?' * (len(line) + 2))}) ON CONFLICT (ticker) DO UPDATE SET "
+        f"{', '.join(f'{name} = excluded.{name}' for name in ['date', *line])} "
+        f"WHERE excluded.date >= {LATEST_TABLE}.date",
+        (table, int(date[newest]), *value),
+    )
+
+
+def write_backfill_checkpoint(ctx: dict, ticker: str, start: str, end: str) -> None:
+    """Record a completed backfill chunk, dates are ISO format strings"""
+    if DEBUG:
+        logger.debug(f"write_backfill_checkpoint(ctx={type(ctx)}, ticker={ticker}, start={start}, end={end})")
+
+    with SqliteConnectManager(ctx=ctx, mode="rw") as con:
+        con.cursor.execute(f"INSERT OR REPLACE INTO {BACKFILL_TABLE} VALUES (?, ?, ?)", (ticker, start, end))
+
+
+def write_data_line_to_stonk_table(ctx: dict, data_tuple: tuple) -> bool:
+    """Write a (stonk table, dataframe) tuple of data lines by date.
+    Returns False if the write failed and nothing was committed."""
+    if DEBUG:
+        logger.debug("write_data_line_to_stonk_table(ctx=%s, data_tuple=(%s, %s))", type(ctx), *data_tuple)
     if not DEBUG:
         print(f"writing to db\t")
 
     stonk_table = data_tuple[0]
     data_list = list(data_tuple[1].itertuples(index=True, name=None))
+    # date column plus a column for each data line
+    column = ", ".join(["date", *data_tuple[1].columns])
+    value = ", ".join("?" * (len(data_tuple[1].columns) + 1))
     try:
         with SqliteConnectManager(ctx=ctx, mode="rw") as con:
             if DEBUG:
-                logger.debug(f"stonk_table: {stonk_table}, data_list: {data_list}, {type(data_list)}")
-            # con.cursor.executemany(f"INSERT INTO {stonk_table} VALUES (?,?,?)", data_list)
-            con.cursor.executemany(f"INSERT INTO {stonk_table} VALUES (?,?,?,?,?,?,?,?,?)", data_list)
+                logger.debug("stonk_table: %s, data_list: %s", stonk_table, data_list)
+            if _storage_mode(ctx=ctx) == "blob":
+                df = data_tuple[1]
+                date = df.index.to_numpy(dtype=np.int64)
+                line = {name: df[name].to_numpy(dtype=float) for name in df.columns}
+                _write_blob(ctx=ctx, con=con, table=stonk_table, date=date, line=line)
+            else:
+                con.cursor.executemany(f"INSERT OR REPLACE INTO {stonk_table} ({column}) VALUES ({value})", data_list)
+                _update_latest(con=con, table=stonk_table, column=column)
+    except sqlite3.Error as e:
+        logger.debug(f"*** Error *** {e}")
+        return False
+    return True
+
+
+def write_panel_to_stonk_tables(ctx: dict, ticker: list, date: np.ndarray, line: dict, present: np.ndarray) -> None:
+    """Write a (ticker, date) panel of data lines, one transaction for
+    every ticker. Present masks the dates each ticker has a bar for,
+    nan values are stored as NULL."""
+    if DEBUG:
+        logger.debug(f"write_panel_to_stonk_tables(ctx={type(ctx)}, ticker={ticker}, date={len(date)}, line={list(line)})")
+    if not DEBUG:
+        print(f" writing {len(ticker)} tickers to db")
+
+    # date column plus a column for each data line
+    column = ", ".join(["date", *line])
+    value = ", ".join("?" * (len(line) + 1))
+    try:
+        with SqliteConnectManager(ctx=ctx, mode="rw") as con:
+            for row, stonk_table in enumerate(ticker):
+                if _storage_mode(ctx=ctx) == "blob":
+                    row_line = {name: value[row][present[row]] for name, value in line.items()}
+                    _write_blob(ctx=ctx, con=con, table=stonk_table, date=date[present[row]], line=row_line)
+                    continue
+                data = np.column_stack([date, *(line[name][row] for name in line)])[present[row]]
+                # sqlite converts integral floats to INTEGER and nan to NULL
+                con.cursor.executemany(
+                    f"INSERT OR REPLACE INTO {stonk_table} ({column}) VALUES ({value})", data.tolist()
+                )
+                _update_latest(con=con, table=stonk_table, column=column)
     except con.sqlite3.Error as e:
         logger.debug(f"*** Error *** {e}")
 
@@ -0,0 +1,177 @@
+"""src/pkg/gui/gallery.py\n
+Gallery of the chart and heatmap images in the work directory. The\n
+list view only asks for the icons of the items it shows, so an\n
+image is only decoded once scrolled into view: its thumbnail from\n
+the thumbnail cache, or made by a worker while a placeholder is\n
+shown. An image that can not be decoded shows a broken icon until\n
+its file changes. A double click opens the full image, the last\n
+opened are kept in memory up to a size in bytes.\n
+class GalleryModel\n
+class GalleryView\n
+class PixmapCache
+"""
+
+import logging, os
+
+from collections import OrderedDict
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+from pkg import DEBUG
+
+
+logger = logging.getLogger(__name__)
+
+
+class PixmapCache:
+    """QPixmaps by (path, mtime_ns), least recently used evicted beyond max_bytes"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.pixmap = OrderedDict()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(pixmap={len(self.pixmap)}, nbytes={self.nbytes}, max_bytes={self.max_bytes})"
+
+    def get(self, path: str, mtime_ns: int) -> QtGui.QPixmap:
+        """Returns the pixmap of image path, read if not cached or changed since"""
+        key = path, mtime_ns
+        if key in self.pixmap:
+            self.pixmap.move_to_end(key)
+            return self.pixmap[key]
+
+        pixmap = QtGui.QPixmap(path)
+        self.pixmap[key] = pixmap
+        self.nbytes += pixmap.width() * pixmap.height() * pixmap.depth() // 8
+        # always keep the pixmap just read
+        while self.nbytes > self.max_bytes and len(self.pixmap) > 1:
+            _, old = self.pixmap.popitem(last=False)
+            self.nbytes -= old.width() * old.height() * old.depth() // 8
+        return pixmap
+
+
+class GalleryModel(QtCore.QAbstractListModel):
+    """The png images of folders, by folder then name. Icons are thumbnails
+    from thumbnails, a ThumbnailCache, held in a PixmapCache of icon_bytes."""
+
+    # emitted from a worker thread, delivered in the gui thread
+    thumbnail_ready = QtCore.pyqtSignal(str)
+
+    def __init__(self, folders: list, thumbnails: object, icon_bytes: int, parent: object = None):
+        super().__init__(parent)
+        self.folders = folders
+        self.thumbnails = thumbnails
+        self.icon = PixmapCache(max_bytes=icon_bytes)
+        self.image = list()  # (path, mtime_ns, file size)
+        self.row = dict()  # path: row
+        self.placeholder = QtGui.QPixmap(*thumbnails.size)
+        self.placeholder.fill(QtGui.QColor(48, 48, 48))
+        self.broken = QtGui.QPixmap(*thumbnails.size)
+        self.broken.fill(QtGui.QColor(48, 48, 48))
+        painter = QtGui.QPainter(self.broken)
+        painter.setPen(QtGui.QPen(QtGui.QColor(160, 40, 40), 3))
+        painter.drawLine(0, 0, thumbnails.size[0] - 1, thumbnails.size[1] - 1)
+        painter.drawLine(0, thumbnails.size[1] - 1, thumbnails.size[0] - 1, 0)
+        painter.end()
+        self.thumbnail_ready.connect(self._thumbnail_ready)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(folders={self.folders}, image={len(self.image)}, icon={self.icon})"
+
+    def refresh(self):
+        """List the images again, a changed file gets a new thumbnail"""
+        if DEBUG:
+            logger.debug(f"refresh(self={self})")
+
+        image = list()
+        for folder in self.folders:
+            try:
+                entries = sorted(os.scandir(folder), key=lambda entry: entry.name)
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if entry.name.lower().endswith(".png") and entry.is_file():
+                    stat = entry.stat()
+                    image.append((entry.path, stat.st_mtime_ns, stat.st_size))
+
+        self.beginResetModel()
+        self.image = image
+        self.row = {path: row for row, (path, _, _) in enumerate(image)}
+        self.endResetModel()
+
+    def _thumbnail_ready(self, path: str):
+        if path in self.row:
+            index = self.index(self.row[path])
+            self.dataChanged.emit(index, index, [QtCore.Qt.DecorationRole])
+
+    def _icon(self, row: int) -> QtGui.QPixmap:
+        path, mtime_ns, file_size = self.image[row]
+        thumbnail = self.thumbnails.lookup(path=path, mtime_ns=mtime_ns, file_size=file_size)
+        if thumbnail is None and self.thumbnails.failed(path=path, mtime_ns=mtime_ns, file_size=file_size):
+            return self.broken
+        if thumbnail is None:
+            self.thumbnails.request(
+                path=path, mtime_ns=mtime_ns, file_size=file_size, done=lambda p, _: self.thumbnail_ready.emit(p)
+            )
+            return self.placeholder
+        return self.icon.get(path=thumbnail, mtime_ns=mtime_ns)
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.image)
+
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.DisplayRole) -> object:
+        if not index.isValid():
+            return None
+        path = self.image[index.row()][0]
+        if role == QtCore.Qt.DisplayRole:
+            return os.path.splitext(os.path.basename(path))[0]
+        if role == QtCore.Qt.DecorationRole:
+            return self._icon(row=index.row())
+        if role == QtCore.Qt.ToolTipRole:
+            return path
+        return None
+
+
+class GalleryView(QtWidgets.QWidget):
+    """Icon grid of a GalleryModel with a refresh button, a double click
+    shows the full image from a PixmapCache of image_bytes"""
+
+    def __init__(self, model: GalleryModel, image_bytes: int, parent: object = None):
+        super().__init__(parent)
+        self.model = model
+        self.image = PixmapCache(max_bytes=image_bytes)
+
+        self.view = QtWidgets.QListView()
+        self.view.setModel(model)
+        self.view.setViewMode(QtWidgets.QListView.IconMode)
+        self.view.setResizeMode(QtWidgets.QListView.Adjust)
+        self.view.setMovement(QtWidgets.QListView.Static)
+        # same size items, the view lays out without asking every item for its icon
+        self.view.setUniformItemSizes(True)
+        self.view.setIconSize(QtCore.QSize(*model.thumbnails.size))
+        self.view.setGridSize(QtCore.QSize(model.thumbnails.size[0] + 16, model.thumbnails.size[1] + 32))
+        self.view.doubleClicked.connect(self.show_image)
+
+        refresh = QtWidgets.QPushButton("Refresh")
+        refresh.clicked.connect(model.refresh)
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addWidget(refresh)
+        layout.addWidget(self.view)
+
+    def show_image(self, index: QtCore.QModelIndex):
+        """Full size image of index in a scrollable window"""
+        path, mtime_ns, _ = self.model.image[index.row()]
+        if DEBUG:
+            logger.debug(f"show_image(path={path}, image={self.image})")
+
+        label = QtWidgets.QLabel()
+        label.setPixmap(self.image.get(path=path, mtime_ns=mtime_ns))
+        area = QtWidgets.QScrollArea()
+        area.setWidget(label)
+        dialog = QtWidgets.QDialog(self)
+        dialog.setWindowTitle(os.path.basename(path))
+        dialog.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+        QtWidgets.QVBoxLayout(dialog).addWidget(area)
+        dialog.resize(min(label.sizeHint().width() + 40, 1366), min(label.sizeHint().height() + 40, 768))
+        dialog.show()
@@ -4,9 +4,14 @@ import sys
 
 from os import path
 
-from PyQt5 import QtWidgets, uic
+from PyQt5 import QtCore, QtWidgets, uic
 
-# from pkg import DEBUG
+from pkg import DEBUG, config_dict
+from pkg.data_srv.utils import FREQUENCY_SUFFIX, read_stonk_columns, select_stonk_tables
+from pkg.gui.gallery import GalleryModel, GalleryView
+from pkg.gui.plot_widget import DataLinePlot
+from pkg.gui.table_model import DataLineTableModel
+from pkg.gui.thumbnail import ThumbnailCache
 
 
 logger = logging.getLogger(__name__)
@@ -15,9 +20,103 @@ logging.getLogger('PyQt5.uic').setLevel(logging.WARNING)
 ui_file = path.join(path.dirname(__file__), 'main_window.ui')
 
 
+def gui_ctx(ctx: dict) -> dict:
+    """Context for the stonk database named by [gui_service] gui_command, gui_database"""
+    return {
+        "data_service": ctx["data_service"],
+        "default": ctx["default"],
+        "interface": {"command": ctx["gui_service"]["gui_command"], "database": ctx["gui_service"]["gui_database"]},
+    }
+
+
+def _data_line_view(ctx: dict) -> object:
+    """Returns a widget, ticker box above a table of the ticker's bars and a plot of its data lines"""
+    if DEBUG:
+        logger.debug(f"_data_line_view(ctx={type(ctx)})")
+
+    stonk_ctx = gui_ctx(ctx=ctx)
+    model = DataLineTableModel(
+        ctx=stonk_ctx,
+        block_rows=int(ctx["gui_service"]["table_block_rows"]),
+        cache_blocks=int(ctx["gui_service"]["table_cache_blocks"]),
+    )
+    view = QtWidgets.QTableView()
+    view.setModel(model)
+    # fixed row height, the view never measures rows it does not show
+    view.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+    view.verticalHeader().setDefaultSectionSize(view.fontMetrics().height() + 4)
+    plot = DataLinePlot()
+
+    ticker = QtWidgets.QComboBox()
+    ticker.setEditable(True)
+    ticker.setInsertPolicy(QtWidgets.QComboBox.NoInsert)
+    tables = list()
+    try:
+        for frequency in ("daily", *FREQUENCY_SUFFIX):
+            tables += select_stonk_tables(ctx=stonk_ctx, frequency=frequency)
+    except Exception as e:
+        logger.debug(f"*** ERROR *** {e}")
+    ticker.addItems(tables)
+
+    def show_ticker(table: str):
+        # typed text is looked up once it names a table
+        if table.upper() not in tables:
+            return
+        model.set_table(table=table.upper())
+        view.resizeColumnToContents(0)
+        line = ctx["gui_service"]["plot_line"].lower().split() or model.column
+        line = [name for name in line if name in model.column]
+        plot.set_data(*read_stonk_columns(ctx=stonk_ctx, table=table.upper(), column=line))
+
+    ticker.currentTextChanged.connect(show_ticker)
+    view.selectionModel().currentRowChanged.connect(lambda current, _: plot.show_row(current.row()))
+
+    splitter = QtWidgets.QSplitter(QtCore.Qt.Vertical)
+    splitter.addWidget(view)
+    splitter.addWidget(plot)
+    widget = QtWidgets.QWidget()
+    layout = QtWidgets.QVBoxLayout(widget)
+    layout.addWidget(ticker)
+    layout.addWidget(splitter)
+    if ticker.count():
+        show_ticker(ticker.currentText())
+    return widget
+
+
+def _gallery_view(ctx: dict) -> object:
+    """Returns a gallery of the chart and heatmap images, thumbnails are closed on quit"""
+    if DEBUG:
+        logger.debug(f"_gallery_view(ctx={type(ctx)})")
+
+    work_dir = ctx["default"]["work_dir"]
+    thumbnails = ThumbnailCache(
+        thumbnail_dir=f"{work_dir}{ctx['gui_service']['thumbnail_dir']}",
+        size=tuple(int(i) for i in ctx["gui_service"]["thumbnail_size"].split("x")),
+        workers=int(ctx["gui_service"]["thumbnail_workers"]),
+    )
+    QtWidgets.QApplication.instance().aboutToQuit.connect(thumbnails.close)
+    model = GalleryModel(
+        folders=[f"{work_dir}{folder}" for folder in ctx["gui_service"]["gallery_dir"].split()],
+        thumbnails=thumbnails,
+        icon_bytes=int(float(ctx["gui_service"]["gallery_icon_mb"]) * 2**20),
+    )
+    model.refresh()
+    return GalleryView(model=model, image_bytes=int(float(ctx["gui_service"]["gallery_image_mb"]) * 2**20))
+
+
+def _add_views(window: object, ctx: dict):
+    """Data lines and gallery tabs in the central widget"""
+    tabs = QtWidgets.QTabWidget()
+    tabs.addTab(_data_line_view(ctx=ctx), "Data lines")
+    tabs.addTab(_gallery_view(ctx=ctx), "Gallery")
+    QtWidgets.QVBoxLayout(window.centralwidget).addWidget(tabs)
+    window.resize(1200, 700)
+
+
 def start_gui():
     """"""
     pyqt_app = QtWidgets.QApplication(sys.argv)
     window = uic.loadUi(ui_file)
+    _add_views(window=window, ctx=config_dict)
     window.show()
     pyqt_app.exec()
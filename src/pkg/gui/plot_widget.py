@@ -0,0 +1,156 @@
+"""src/pkg/gui/plot_widget.py\n
+Line plot of the data lines of one ticker, a lane for each line\n
+over a shared bar axis. Before drawing, the visible bars of each\n
+line are reduced to the min and max of every pixel column, so a\n
+frame costs the same for 100 bars or 10 years of them.\n
+class DataLinePlot\n
+decimate(x: np.ndarray, y: np.ndarray, width: int) -> tuple
+"""
+
+import logging
+
+import numpy as np
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+from pkg import DEBUG
+
+
+logger = logging.getLogger(__name__)
+
+# night color scheme, as the rendered stock charts
+BACKGROUND = QtGui.QColor(0, 0, 0)
+GRID = QtGui.QColor(48, 48, 48)
+TEXT = QtGui.QColor(200, 200, 200)
+CURSOR = QtGui.QColor(120, 120, 120)
+LINE = [QtGui.QColor(*rgb) for rgb in ((80, 160, 255), (0, 200, 0), (220, 0, 0), (230, 180, 0), (180, 100, 240))]
+
+# fewest bars a zoom can show
+MIN_BARS = 10
+
+
+def decimate(x: np.ndarray, y: np.ndarray, width: int) -> tuple:
+    """Returns (x, y) reduced to the first x, min y, last x and max y of width
+    buckets of consecutive points, a line through them covers the same pixels
+    as one through every point. Unchanged when there are fewer than 2 * width
+    points. Nan is ignored, a bucket of only nan stays nan."""
+    if len(y) <= 2 * width:
+        return x, y
+    start = np.arange(width) * len(y) // width
+    end = np.append(start[1:], len(y)) - 1
+    low, high = np.fmin.reduceat(y, start), np.fmax.reduceat(y, start)
+    return np.column_stack([x[start], x[end]]).ravel(), np.column_stack([low, high]).ravel()
+
+
+def _polygon(x: np.ndarray, y: np.ndarray) -> QtGui.QPolygonF:
+    """QPolygonF of the points, filled through its buffer instead of a QPointF each"""
+    polygon = QtGui.QPolygonF(len(x))
+    pointer = polygon.data()
+    pointer.setsize(len(x) * 16)
+    np.frombuffer(pointer, dtype=float).reshape(-1, 2)[:] = np.column_stack([x, y])
+    return polygon
+
+
+class DataLinePlot(QtWidgets.QWidget):
+    """Each lane is scaled to the range of its line over the visible bars.
+    The wheel zooms around the mouse, dragging pans."""
+
+    def __init__(self, parent: object = None):
+        super().__init__(parent)
+        self.date = np.empty(0, dtype=np.int64)
+        self.line = dict()
+        self.first, self.last = 0, 0  # visible bars, last excluded
+        self.cursor_row = None
+        self.drag = None  # (mouse x, first) at the press
+        self.setMinimumHeight(200)
+        self.setFocusPolicy(QtCore.Qt.WheelFocus)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(bars={len(self.date)}, range={self.first}:{self.last})"
+
+    def set_data(self, date: np.ndarray, line: dict):
+        """Plot the {line: array} bars of date, every bar visible"""
+        if DEBUG:
+            logger.debug(f"set_data(self={self}, date={len(date)}, line={list(line)})")
+
+        self.date = np.asarray(date)
+        self.line = {name: np.asarray(value, dtype=float) for name, value in line.items()}
+        self.first, self.last = 0, len(self.date)
+        self.cursor_row = None
+        self.update()
+
+    def set_range(self, first: int, last: int):
+        """Show bars first to last, moved inside the data and at least MIN_BARS wide"""
+        span = min(max(last - first, MIN_BARS), len(self.date))
+        self.first = int(min(max(first, 0), len(self.date) - span))
+        self.last = self.first + span
+        self.update()
+
+    def show_row(self, row: int):
+        """Mark bar row, centering it if it is not visible"""
+        self.cursor_row = row
+        if not self.first <= row < self.last:
+            span = self.last - self.first
+            self.set_range(first=row - span // 2, last=row - span // 2 + span)
+        self.update()
+
+    def _bar_at(self, x: float) -> float:
+        return self.first + x / max(self.width(), 1) * (self.last - self.first)
+
+    def wheelEvent(self, event: QtGui.QWheelEvent):
+        span = self.last - self.first
+        new_span = span * (0.8 if event.angleDelta().y() > 0 else 1.25)
+        anchor = self._bar_at(event.pos().x())
+        first = anchor - (anchor - self.first) * new_span / max(span, 1)
+        self.set_range(first=round(first), last=round(first + new_span))
+
+    def mousePressEvent(self, event: QtGui.QMouseEvent):
+        self.drag = event.pos().x(), self.first
+
+    def mouseMoveEvent(self, event: QtGui.QMouseEvent):
+        if self.drag is not None:
+            span = self.last - self.first
+            first = self.drag[1] + round((self.drag[0] - event.pos().x()) * span / max(self.width(), 1))
+            self.set_range(first=first, last=first + span)
+
+    def mouseReleaseEvent(self, event: QtGui.QMouseEvent):
+        self.drag = None
+
+    def paintEvent(self, event: QtGui.QPaintEvent):
+        painter = QtGui.QPainter(self)
+        painter.fillRect(self.rect(), BACKGROUND)
+        if self.last - self.first < 2 or not self.line:
+            return
+
+        width, height = self.width(), self.height()
+        lane = height / len(self.line)
+        bars = np.arange(self.first, self.last)
+        pixel = (bars - self.first) * (width - 1) / (len(bars) - 1)
+        for i, (name, value) in enumerate(self.line.items()):
+            top = i * lane
+            painter.setPen(GRID)
+            painter.drawLine(QtCore.QPointF(0, top), QtCore.QPointF(width, top))
+
+            x, y = decimate(pixel, value[self.first : self.last], width)
+            valid = ~np.isnan(y)
+            if valid.any():
+                x, y = x[valid], y[valid]
+                low, high = y.min(), y.max()
+                # 4 pixels of margin in the lane, a flat line in the middle
+                scale = (lane - 8) / (high - low) if high > low else 0
+                y = top + lane - 4 - (y - low) * scale if scale else np.full(len(y), top + lane / 2)
+                painter.setPen(LINE[i % len(LINE)])
+                painter.drawPolyline(_polygon(x, y))
+
+            painter.setPen(TEXT)
+            painter.drawText(QtCore.QPointF(4, top + 14), name)
+
+        if self.cursor_row is not None and self.first <= self.cursor_row < self.last:
+            x = (self.cursor_row - self.first) * (width - 1) / (len(bars) - 1)
+            painter.setPen(CURSOR)
+            painter.drawLine(QtCore.QPointF(x, 0), QtCore.QPointF(x, height))
+
+        painter.setPen(TEXT)
+        first, last = (str(np.datetime64(int(self.date[i]), "s"))[:10] for i in (self.first, self.last - 1))
+        painter.drawText(QtCore.QRectF(4, height - 18, width - 8, 16), QtCore.Qt.AlignLeft, first)
+        painter.drawText(QtCore.QRectF(4, height - 18, width - 8, 16), QtCore.Qt.AlignRight, last)
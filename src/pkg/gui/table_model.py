@@ -0,0 +1,105 @@
+"""src/pkg/gui/table_model.py\n
+Table model over one stonk table for a QTableView. The dates are\n
+read when a table is set, the data lines only block_rows rows at\n
+a time as the view scrolls to them. The last cache_blocks blocks\n
+stay in memory as numpy arrays.\n
+class DataLineTableModel
+"""
+
+import logging
+
+from collections import OrderedDict
+
+import numpy as np
+
+from PyQt5 import QtCore
+
+from pkg import DEBUG
+from pkg.data_srv.utils import read_stonk_columns
+
+
+logger = logging.getLogger(__name__)
+
+
+def _format_date(date: int) -> str:
+    """ISO date, with the time for intraday bars"""
+    text = str(np.datetime64(int(date), "s")).replace("T", " ")
+    return text[:10] if date % 86400 == 0 else text[:16]
+
+
+class DataLineTableModel(QtCore.QAbstractTableModel):
+    """Date column then a column for each data line of the table, NULL is blank"""
+
+    def __init__(self, ctx: dict, block_rows: int = 1000, cache_blocks: int = 16, parent: object = None):
+        super().__init__(parent)
+        self.ctx = ctx
+        self.block_rows = block_rows
+        self.cache_blocks = cache_blocks
+        self.table = None
+        self.date = np.empty(0, dtype=np.int64)
+        self.column = list()
+        self.block = OrderedDict()  # block number: (row, column) array, least recently used first
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(table={self.table}, rows={len(self.date)}, blocks={len(self.block)})"
+
+    def set_table(self, table: str):
+        """Show table, reads its dates and the names of its data lines"""
+        if DEBUG:
+            logger.debug(f"set_table(self={self}, table={table})")
+
+        self.beginResetModel()
+        self.table = table
+        self.date, _ = read_stonk_columns(ctx=self.ctx, table=table, column=[])
+        _, line = read_stonk_columns(ctx=self.ctx, table=table, last=1)
+        self.column = list(line)
+        self.block.clear()
+        self.endResetModel()
+
+    def _read_block(self, number: int) -> np.ndarray:
+        """Returns the (row, column) values of block number, read on first use"""
+        if number in self.block:
+            self.block.move_to_end(number)
+            return self.block[number]
+        if DEBUG:
+            logger.debug(f"_read_block(self={self}, number={number})")
+
+        date = self.date[number * self.block_rows : (number + 1) * self.block_rows]
+        found, line = read_stonk_columns(
+            ctx=self.ctx, table=self.table, column=self.column, since=int(date[0]), until=int(date[-1])
+        )
+        # rows written since the dates were read are left out
+        index = np.searchsorted(date, found).clip(max=len(date) - 1)
+        keep = date[index] == found
+        value = np.full((len(date), len(self.column)), np.nan)
+        for i, name in enumerate(self.column):
+            value[index[keep], i] = line[name][keep]
+
+        self.block[number] = value
+        while len(self.block) > self.cache_blocks:
+            self.block.popitem(last=False)
+        return value
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.date)
+
+    def columnCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() or self.table is None else len(self.column) + 1
+
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.DisplayRole) -> object:
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        if role == QtCore.Qt.DisplayRole:
+            if column == 0:
+                return _format_date(self.date[row])
+            value = self._read_block(row // self.block_rows)[row % self.block_rows, column - 1]
+            return "" if np.isnan(value) else f"{value:.0f}"
+        if role == QtCore.Qt.TextAlignmentRole and column:
+            return int(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section: int, orientation: int, role: int = QtCore.Qt.DisplayRole) -> object:
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return ["date", *self.column][section]
+        return super().headerData(section, orientation, role)
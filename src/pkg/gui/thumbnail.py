@@ -0,0 +1,128 @@
+"""src/pkg/gui/thumbnail.py\n
+On disk thumbnails of the chart and heatmap images. A thumbnail is\n
+named by the sha1 of its image file, an index keeps the digest of\n
+each image with its mtime and size so an unchanged file is never\n
+read again, and a rewritten file with the same content reuses its\n
+thumbnail. An image that can not be decoded is recorded as such\n
+and only read again once its file changes. Thumbnails are made\n
+in worker processes.\n
+class ThumbnailCache
+"""
+
+import hashlib, io, json, logging, os, threading
+
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from pkg import DEBUG
+
+
+logging.getLogger("PIL").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.json"
+
+
+def _make_thumbnail(path: str, thumbnail_dir: str, size: tuple) -> tuple:
+    """Returns a tuple (digest, error) for image path, runs in a worker process"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha1(data).hexdigest()
+        thumbnail = os.path.join(thumbnail_dir, f"{digest}_{size[0]}x{size[1]}.png")
+        if not os.path.exists(thumbnail):
+            image = Image.open(io.BytesIO(data))
+            image.draft("RGB", size)  # jpeg decodes at a smaller scale
+            image.thumbnail(size)
+            # other processes see the file complete or not at all
+            image.save(f"{thumbnail}.{os.getpid()}", "PNG")
+            os.replace(f"{thumbnail}.{os.getpid()}", thumbnail)
+    except Exception as e:
+        return None, f"{e}"
+    return digest, None
+
+
+class ThumbnailCache:
+    """Thumbnails of size (width, height) in thumbnail_dir, made by up to
+    workers processes, 0 for one per cpu"""
+
+    def __init__(self, thumbnail_dir: str, size: tuple, workers: int = 0):
+        self.thumbnail_dir = thumbnail_dir
+        self.size = size
+        self.workers = workers or None
+        self.executor = None  # started on the first request
+        self.lock = threading.Lock()
+        self.pending = set()
+        os.makedirs(thumbnail_dir, exist_ok=True)
+        try:
+            with open(os.path.join(thumbnail_dir, INDEX_FILE)) as f:
+                self.index = json.load(f)  # image path: [mtime_ns, file_size, digest or None if broken]
+        except (FileNotFoundError, ValueError):
+            self.index = dict()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(thumbnail_dir={self.thumbnail_dir}, index={len(self.index)})"
+
+    def _thumbnail_path(self, digest: str) -> str:
+        return os.path.join(self.thumbnail_dir, f"{digest}_{self.size[0]}x{self.size[1]}.png")
+
+    def lookup(self, path: str, mtime_ns: int, file_size: int) -> str:
+        """Returns the thumbnail path of image path as of mtime_ns and file_size, None if it is not made yet"""
+        entry = self.index.get(path)
+        if entry and entry[:2] == [mtime_ns, file_size] and entry[2]:
+            thumbnail = self._thumbnail_path(digest=entry[2])
+            if os.path.exists(thumbnail):
+                return thumbnail
+        return None
+
+    def failed(self, path: str, mtime_ns: int, file_size: int) -> bool:
+        """True if image path as of mtime_ns and file_size could not be decoded"""
+        return self.index.get(path) == [mtime_ns, file_size, None]
+
+    def request(self, path: str, mtime_ns: int, file_size: int, done: object):
+        """Make the thumbnail of image path in a worker, then call done(path,
+        thumbnail path or None) from a worker thread. Once per path at a time,
+        never for an image that failed before and has not changed since."""
+        with self.lock:
+            if path in self.pending or self.failed(path=path, mtime_ns=mtime_ns, file_size=file_size):
+                return
+            self.pending.add(path)
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        future = self.executor.submit(_make_thumbnail, path, self.thumbnail_dir, self.size)
+
+        def finished(future: object):
+            digest, error = future.result() if not future.cancelled() else (None, None)
+            with self.lock:
+                self.pending.discard(path)
+                # an empty or half written file is tried again once its mtime or size changes
+                if digest or error:
+                    self.index[path] = [mtime_ns, file_size, digest]
+                idle = not self.pending
+            if error:
+                logger.debug(f"*** ERROR *** {path} {error}")
+            if idle:
+                self.save()
+            done(path, self._thumbnail_path(digest=digest) if digest else None)
+
+        future.add_done_callback(finished)
+
+    def save(self):
+        """Write the index, entries of deleted images are dropped"""
+        name = os.path.join(self.thumbnail_dir, INDEX_FILE)
+        with self.lock:
+            self.index = {path: entry for path, entry in self.index.items() if os.path.exists(path)}
+            with open(f"{name}.tmp", "w") as f:
+                json.dump(self.index, f)
+            os.replace(f"{name}.tmp", name)
+
+    def close(self):
+        """Drop the requests not started, wait for the running ones"""
+        if DEBUG:
+            logger.debug(f"close(self={self})")
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+        self.save()
@@ -0,0 +1,148 @@
+"""src/pkg/log_mgr.py\n
+Debug logging off the hot path, set up from config file [log_service].\n
+log_mode = queue hands each record to a QueueListener thread that\n
+formats and writes it, the caller only puts it on a queue. Numpy\n
+arrays, dataframes and long lists passed as logging arguments, i.e.\n
+logger.debug("volume: %s", volume), are summarized by shape, head and\n
+stats instead of printed in full. A log call that fires more than\n
+log_burst times in log_interval seconds keeps every log_sample'th.\n
+class SampleFilter\n
+class SummaryFormatter\n
+start_logging(ctx: dict) -> object\n
+summarize(x: object, items: int) -> object
+"""
+
+import atexit, logging, logging.handlers, queue, threading
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+
+def summarize(x: object, items: int = 3) -> object:
+    """Returns a short string for arrays, dataframes and containers longer
+    than 2 * items, anything else as is so %d and %f still work"""
+    if isinstance(x, np.ndarray) or (hasattr(x, "to_numpy") and not hasattr(x, "columns")):
+        value = np.asarray(x)
+        text = f"<{type(x).__name__} {value.shape} {value.dtype}"
+        if value.size and np.issubdtype(value.dtype, np.number):
+            data = value.astype(float)
+            valid = data[~np.isnan(data)]
+            text += f" nan={data.size - valid.size}"
+            if valid.size:
+                text += f" min={valid.min():g} mean={valid.mean():g} max={valid.max():g}"
+        return f"{text} head={value.reshape(-1)[:items].tolist()}>"
+    if hasattr(x, "columns") and hasattr(x, "head"):
+        text = f"<{type(x).__name__} {x.shape[0]}x{x.shape[1]}"
+        if len(x):
+            text += f" {x.index[0]} .. {x.index[-1]}"
+        return f"{text}>\n{x.head(items).to_string()}"
+    if isinstance(x, dict) and any(isinstance(v, (list, tuple)) or hasattr(v, "shape") for v in x.values()):
+        return "{" + ", ".join(f"{k}: {summarize(v, items)}" for k, v in x.items()) + "}"
+    if isinstance(x, (list, tuple)) and len(x) > 2 * items:
+        return f"<{type(x).__name__} {len(x)} head={list(x[:items])} tail={list(x[-items:])}>"
+    return x
+
+
+class SummaryFormatter(logging.Formatter):
+    """Formatter that summarizes the arguments of a record before they are
+    merged into the message, see summarize()"""
+
+    def __init__(self, fmt: str = None, datefmt: str = None, items: int = 3):
+        super().__init__(fmt=fmt, datefmt=datefmt)
+        self.items = items
+
+    def format(self, record: logging.LogRecord) -> str:
+        if isinstance(record.args, dict) and "%(" in str(record.msg):
+            record.args = {k: summarize(v, self.items) for k, v in record.args.items()}
+        elif isinstance(record.args, dict):
+            # logging unpacks a lone dict argument, it fills a single %s
+            record.args = (summarize(record.args, self.items),)
+        elif record.args:
+            record.args = tuple(summarize(v, self.items) for v in record.args)
+        return super().format(record)
+
+
+class SampleFilter(logging.Filter):
+    """Rate limit of each log call, by file and line. The first burst debug
+    records in interval seconds pass, after that every sample'th, 0 drops
+    the rest. The next record to pass tells how many were dropped. Records
+    above debug level always pass."""
+
+    def __init__(self, burst: int, interval: float, sample: int):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.sample = sample
+        self.lock = threading.Lock()
+        self.seen = dict()  # (pathname, lineno): [window start, count, dropped]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        if hasattr(record, "sampled"):
+            return record.sampled  # decided by the filter of another handler
+        record.sampled = self._sample(record=record)
+        return record.sampled
+
+    def _sample(self, record: logging.LogRecord) -> bool:
+        with self.lock:
+            seen = self.seen.setdefault((record.pathname, record.lineno), [record.created, 0, 0])
+            if record.created - seen[0] >= self.interval:
+                seen[0], seen[1] = record.created, 0
+            seen[1] += 1
+            over = seen[1] - self.burst
+            if over > 0 and not (self.sample and over % self.sample == 0):
+                seen[2] += 1
+                return False
+            dropped, seen[2] = seen[2], 0
+        if dropped:
+            record.msg = f"{record.msg} [{dropped} similar dropped]"
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Puts the record on the queue unformatted, the listener thread merges
+    and summarizes its arguments"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def start_logging(ctx: dict) -> object:
+    """Apply [log_service] to the handlers configured from logger.ini.
+    Returns the running QueueListener, None for log_mode = sync."""
+    options = ctx["log_service"]
+    mode = options["log_mode"]
+    if mode not in ("queue", "sync"):
+        raise ValueError(f"unknown log mode: {mode}")
+    burst, items = int(options["log_burst"]), int(options["log_items"])
+
+    sample = SampleFilter(burst=burst, interval=float(options["log_interval"]), sample=int(options["log_sample"]))
+    configured = [logging.getLogger()] + [
+        item
+        for item in logging.Logger.manager.loggerDict.values()
+        if isinstance(item, logging.Logger) and item.handlers
+    ]
+    handlers = list(dict.fromkeys(handler for item in configured for handler in item.handlers))
+    for handler in handlers:
+        fmt = handler.formatter or logging.Formatter()
+        handler.setFormatter(SummaryFormatter(fmt=fmt._fmt, datefmt=fmt.datefmt, items=items))
+    if mode == "sync":
+        # log_burst = 0 turns sampling off
+        for handler in handlers if burst else []:
+            handler.addFilter(sample)
+        return None
+
+    record_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(record_queue)
+    if burst:
+        queue_handler.addFilter(sample)
+    for item in configured:
+        item.handlers = [queue_handler]
+    listener = logging.handlers.QueueListener(record_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # write what is still queued before the interpreter exits
+    atexit.register(listener.stop)
+    return listener
@@ -12,6 +12,61 @@ with open(os.path.join(os.path.dirname(__file__), "data.sql"), "rb") as f:
     _data_sql = f.read().decode("utf8")
 
 
+@pytest.fixture
+def ctx(tmp_path):
+    """Config of the package with the work directory in tmp_path"""
+    import copy
+
+    import pkg
+
+    ctx = copy.deepcopy(pkg.config_dict)
+    ctx["default"]["work_dir"] = f"{tmp_path}/"
+    ctx["interface"] = {
+        "command": "data",
+        "database": "stonk.db",
+        "data_line": ctx["data_service"]["data_line"].split(),
+        "index": 0,
+        "ticker": ["AAA", "BBB"],
+        "window_size": ctx["default"]["window_size"],
+    }
+    os.makedirs(f"{tmp_path}/data", exist_ok=True)
+    return ctx
+
+
+@pytest.fixture
+def local_dir(tmp_path):
+    """Directory of AAA.csv and BBB.csv, 60 daily bars from 2024-01-01 for the 'local' data provider"""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    os.makedirs(f"{tmp_path}/local")
+    for ticker in ("AAA", "BBB"):
+        close = 100 + rng.normal(0, 1, 60).cumsum()
+        open = close + rng.normal(0, 0.5, 60)
+        df = pd.DataFrame(
+            {
+                "date": pd.date_range("2024-01-01", periods=60).strftime("%Y-%m-%d"),
+                "open": open.round(2),
+                "high": (np.maximum(open, close) + rng.uniform(0, 1, 60)).round(2),
+                "low": (np.minimum(open, close) - rng.uniform(0, 1, 60)).round(2),
+                "close": close.round(2),
+                "volume": rng.integers(1000, 100000, 60),
+            }
+        )
+        df.to_csv(f"{tmp_path}/local/{ticker}.csv", index=False)
+    return f"{tmp_path}/local"
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    """QApplication on the offscreen platform, for the gui widgets and models"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5 import QtWidgets
+
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
 # @pytest.fixture
 # def app():
 #     """Create and configure a new app instance for each test."""
@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pkg.data_srv.analytics import RollingCorrelation, cross_section_rank, run_stonk_analytics
+
+
+@pytest.fixture
+def panel():
+    """(ticker, date) values of six tickers over 40 dates, two follow the first"""
+    rng = np.random.default_rng(0)
+    x = rng.normal(0, 1, (6, 40))
+    x[1] = x[0] + rng.normal(0, 0.3, 40)
+    x[2] = -x[0] + rng.normal(0, 0.5, 40)
+    return np.arange(40, dtype=np.int64) * 86400, x
+
+
+@pytest.mark.parametrize("window", [2, 5, 10, 40])
+def test_series_matches_corrcoef(panel, window):
+    date, x = panel
+    rolling = RollingCorrelation(ticker=list("ABCDEF"), window=window, block_size=4)
+    for end, (day, matrix) in enumerate(rolling.series(date=date, x=x)):
+        assert day == date[end]
+        if end + 1 < 2:
+            assert np.isnan(matrix).all()
+            continue
+        expected = np.corrcoef(x[:, max(end + 1 - window, 0) : end + 1])
+        assert np.allclose(matrix, expected)
+
+
+@pytest.mark.parametrize("window", [5, 12])
+def test_series_pairwise_complete(panel, window):
+    # a pair only counts the dates both have, as pandas does
+    date, x = panel
+    x = x.copy()
+    x[0, ::3] = np.nan
+    x[4, 10:20] = np.nan
+    rolling = RollingCorrelation(ticker=list("ABCDEF"), window=window)
+    for end, (_, matrix) in enumerate(rolling.series(date=date, x=x, min_periods=3)):
+        frame = pd.DataFrame(x[:, max(end + 1 - window, 0) : end + 1].T)
+        assert np.allclose(matrix, frame.corr(min_periods=3).to_numpy(), equal_nan=True)
+
+
+def test_update_in_blocks(panel):
+    date, x = panel
+    whole = RollingCorrelation(ticker=list("ABCDEF"), window=10)
+    whole.update(date=date, x=x)
+    parts = RollingCorrelation(ticker=list("ABCDEF"), window=10)
+    for start in range(0, 40, 7):
+        parts.update(date=date[start : start + 7], x=x[:, start : start + 7])
+    assert np.array_equal(parts.date, date[-10:])
+    assert np.allclose(parts.matrix(), whole.matrix())
+    assert np.allclose(whole.matrix(), np.corrcoef(x[:, -10:]))
+
+
+def test_save_load(panel, tmp_path):
+    date, x = panel
+    rolling = RollingCorrelation(ticker=list("ABCDEF"), window=10)
+    rolling.update(date=date, x=x)
+    rolling.save(f"{tmp_path}/corr.npz")
+    loaded = RollingCorrelation.load(f"{tmp_path}/corr.npz")
+    assert loaded.ticker == rolling.ticker and loaded.window == 10
+    assert np.array_equal(loaded.matrix(), rolling.matrix())
+    assert RollingCorrelation.load(f"{tmp_path}/missing.npz") is None
+
+
+def test_cross_section_rank():
+    x = np.array([[3, 1, np.nan], [1, 2, 5], [2, 3, 4.0]])
+    assert np.array_equal(cross_section_rank(x), np.array([[1, 0, np.nan], [0, 0.5, 1], [0.5, 1, 0]]), equal_nan=True)
+
+
+@pytest.fixture
+def stored(ctx):
+    """Returns a function writing the first n dates of a clv panel of three tickers, and the panel"""
+    from pkg.data_srv.utils import create_sqlite_stonk_database, write_panel_to_stonk_tables
+
+    rng = np.random.default_rng(1)
+    date = np.arange(60, dtype=np.int64) * 86400
+    clv = rng.integers(-100, 100, (3, 60)).astype(float)
+    clv[1] = np.round(clv[0] / 2 + rng.integers(-30, 30, 60))
+    ctx["interface"]["ticker"] = ["AAA", "BBB", "CCC"]
+    ctx["data_service"].update(
+        analytics_line="clv", analytics_min_periods="5", analytics_series="10", analytics_window="20"
+    )
+    create_sqlite_stonk_database(ctx=ctx)
+
+    def write(n: int):
+        present = np.ones((3, n), dtype=bool)
+        write_panel_to_stonk_tables(
+            ctx=ctx, ticker=["AAA", "BBB", "CCC"], date=date[:n], line={"clv": clv[:, :n]}, present=present
+        )
+
+    return write, clv
+
+
+def _mean_correlation(x):
+    matrix = np.corrcoef(x)
+    np.fill_diagonal(matrix, np.nan)
+    return np.nanmean(matrix, axis=1)
+
+
+def test_run_stonk_analytics(ctx, stored, capsys):
+    write, clv = stored
+    write(45)
+    first = run_stonk_analytics(ctx=ctx)
+    assert first["ticker"] == ["AAA", "BBB", "CCC"]
+    assert np.allclose(first["correlation"], np.corrcoef(clv[:, 25:45]))
+    assert np.array_equal(first["series_date"], first["date"][-10:])
+    for i, end in enumerate(range(36, 46)):
+        assert np.allclose(first["mean_correlation"][:, i], _mean_correlation(clv[:, end - 20 : end]))
+
+    # five more dates, the series steps through those and keeps the cached ones
+    write(50)
+    second = run_stonk_analytics(ctx=ctx)
+    assert "5 window steps, 5 from cache" in capsys.readouterr().out
+    assert np.allclose(second["correlation"], np.corrcoef(clv[:, 30:50]))
+    assert np.array_equal(second["series_date"], second["date"][-10:])
+    assert np.array_equal(second["mean_correlation"][:, :5], first["mean_correlation"][:, 5:])
+    for i, end in enumerate(range(41, 51)):
+        assert np.allclose(second["mean_correlation"][:, i], _mean_correlation(clv[:, end - 20 : end]))
+
+
+def test_run_stonk_analytics_changed_value(ctx, stored):
+    write, clv = stored
+    write(50)
+    run_stonk_analytics(ctx=ctx)
+    # a stored value inside the window changes, the window and its series start over
+    clv[2, 40] += 50
+    write(50)
+    result = run_stonk_analytics(ctx=ctx)
+    assert np.allclose(result["correlation"], np.corrcoef(clv[:, 30:50]))
+    for i, end in enumerate(range(41, 51)):
+        assert np.allclose(result["mean_correlation"][:, i], _mean_correlation(clv[:, end - 20 : end]))
@@ -0,0 +1,101 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pkg.data_srv import client
+from pkg.data_srv.utils import read_backfill_checkpoint, read_stonk_columns
+
+# a chunk start 60 to 89 days ago, so no chunk is shorter than the window
+FIRST = datetime.date.fromordinal((datetime.date.today().toordinal() - 60) // 30 * 30)
+BARS = (datetime.date.today() - FIRST).days
+
+
+@pytest.fixture
+def backfill_ctx(ctx, local_dir):
+    # a bar for every day from FIRST up to yesterday
+    for ticker in ("AAA", "BBB"):
+        df = pd.read_csv(f"{local_dir}/{ticker}.csv")
+        df = pd.concat([df, df]).iloc[:BARS]
+        df["date"] = pd.date_range(FIRST, periods=BARS).strftime("%Y-%m-%d")
+        df.to_csv(f"{local_dir}/{ticker}.csv", index=False)
+    ctx["interface"]["data_line"] = ["CLOP", "CLV", "CWAP", "HILO", "VOLUME", "SC_VOL"]
+    ctx["interface"]["window_size"] = "5"
+    ctx["data_service"].update(
+        backfill_chunk="30",
+        backfill_warmup="20",
+        data_lookback=f"{BARS}",
+        data_provider="local",
+        fetch_plan="none",
+        local_dir=local_dir,
+        resample_frequency="",
+        scaler_mode="batch",
+    )
+    ctx["screen_rule"] = {}
+    return ctx
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Chunk start dates passed to _fetch_range, a start in fail raises"""
+    calls, fetch_range = {"start": [], "fail": set()}, client._fetch_range
+
+    def _fetch_range(ctx, processor, ticker, start, end):
+        calls["start"].append((ticker, start))
+        if start in calls["fail"]:
+            raise OSError("no connection")
+        fetch_range(ctx=ctx, processor=processor, ticker=ticker, start=start, end=end)
+
+    monkeypatch.setattr(client, "_fetch_range", _fetch_range)
+    return calls
+
+
+def test_backfill_chunks():
+    chunks = client._backfill_chunks(start=datetime.date(2024, 1, 10), end=datetime.date(2024, 3, 1), days=30)
+    # aligned to multiples of 30 days, contiguous and covering start to end
+    assert all(start.toordinal() % 30 == 0 for start, _ in chunks)
+    assert all(a[1] == b[0] for a, b in zip(chunks, chunks[1:]))
+    assert chunks[0][0] <= datetime.date(2024, 1, 10) < chunks[0][1]
+    assert chunks[-1][0] <= datetime.date(2024, 3, 1) < chunks[-1][1]
+    # the same chunks from a later start
+    assert client._backfill_chunks(start=datetime.date(2024, 2, 1), end=datetime.date(2024, 3, 1), days=30) == [
+        item for item in chunks if item[1] > datetime.date(2024, 2, 1)
+    ]
+
+
+def test_backfill_matches_fetch(backfill_ctx):
+    client.backfill_stonk_data(ctx=backfill_ctx)
+    backfill = {ticker: read_stonk_columns(ctx=backfill_ctx, table=ticker) for ticker in ("AAA", "BBB")}
+    client.fetch_stonk_data(ctx=backfill_ctx)
+
+    for ticker, (date, line) in backfill.items():
+        fetch_date, fetch_line = read_stonk_columns(ctx=backfill_ctx, table=ticker)
+        assert len(date) == BARS and np.array_equal(date, fetch_date)
+        for name in line:
+            # the first bars of the window are padded with the average of their chunk
+            assert np.array_equal(line[name][4:], fetch_line[name][4:], equal_nan=True), name
+
+
+def test_backfill_resumes(backfill_ctx, calls):
+    chunks = client._backfill_chunks(start=FIRST, end=datetime.date.today(), days=30)
+    failed = chunks[1][0]
+    calls["fail"].add(failed)
+    client.backfill_stonk_data(ctx=backfill_ctx)
+
+    # every chunk is tried, the failed one and the one holding today are not checkpointed
+    assert len(calls["start"]) == 2 * len(chunks)
+    done = read_backfill_checkpoint(ctx=backfill_ctx)
+    assert done == {
+        (ticker, start.isoformat()) for ticker in ("AAA", "BBB") for start, end in chunks[:-1] if start != failed
+    }
+    date, _ = read_stonk_columns(ctx=backfill_ctx, table="AAA", column=["clv"])
+    assert 0 < len(date) < BARS
+
+    # the rerun fetches only what is missing, the bars already written are kept
+    calls["start"].clear()
+    calls["fail"].clear()
+    client.backfill_stonk_data(ctx=backfill_ctx)
+    assert calls["start"] == [(ticker, item) for ticker in ("AAA", "BBB") for item in (failed, chunks[-1][0])]
+    assert len(read_stonk_columns(ctx=backfill_ctx, table="AAA", column=["clv"])[0]) == BARS
+    assert len(read_backfill_checkpoint(ctx=backfill_ctx)) == 2 * (len(chunks) - 1)
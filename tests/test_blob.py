@@ -0,0 +1,146 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from pkg.data_srv.blob import decode_line, decode_lines, encode_line, read_blob_columns, write_blob_rows
+
+DAY = 86400
+INT64 = np.iinfo(np.int64)
+
+
+@pytest.fixture
+def cursor(ctx):
+    """Cursor of a new stonk database in blob storage mode"""
+    from pkg.data_srv.utils import create_sqlite_stonk_database
+
+    ctx["data_service"]["storage_mode"] = "blob"
+    create_sqlite_stonk_database(ctx=ctx)
+    connection = sqlite3.connect(f"{ctx['default']['work_dir']}data/stonk.db")
+    yield connection.cursor()
+    connection.close()
+
+
+@pytest.mark.parametrize(
+    "x",
+    [
+        [],
+        [0],
+        [5, 5, 5, 5],
+        [3, -7, 0, -1, 2**20, -(2**20)],
+        [np.nan, 1, np.nan, np.nan, -4, np.nan],
+        [np.nan, np.nan, np.nan],
+        np.arange(-1000, 1000, 7),
+    ],
+)
+@pytest.mark.parametrize("order", [1, 2])
+def test_round_trip(x, order):
+    x = np.asarray(x, dtype=float)
+    assert np.array_equal(decode_line(data=encode_line(x=x, order=order), count=len(x)), x, equal_nan=True)
+
+
+@pytest.mark.parametrize("order", [1, 2])
+def test_round_trip_int64_extremes(order):
+    # whole floats near the int64 limits, differences wrap around but decode back
+    x = np.array([0, INT64.max - 1023, INT64.min, -1, INT64.min, INT64.max - 1023, 1])
+    value = decode_line(data=encode_line(x=x.astype(float), order=order), count=len(x))
+    assert np.array_equal(value.astype(np.int64), x.astype(float).astype(np.int64))
+
+
+def test_round_trip_blocks():
+    rng = np.random.default_rng(0)
+    block = [rng.integers(-(10**9), 10**9, n).astype(float) for n in (1, 300, 0, 57, 1000)]
+    block[3][::4] = np.nan
+    data = [encode_line(x=x) for x in block]
+    value = decode_lines(data=data, count=[len(x) for x in block])
+    assert np.array_equal(value, np.concatenate(block), equal_nan=True)
+
+
+def test_round_trip_date_blocks():
+    # dates are order 2, each block restarts its running sums
+    date = [
+        np.arange(start, start + n * DAY, DAY, dtype=np.int64) for start, n in ((0, 5), (10 * DAY, 9), (40 * DAY, 2))
+    ]
+    value = decode_lines(data=[encode_line(x=x, order=2) for x in date], count=[len(x) for x in date])
+    assert np.array_equal(value.astype(np.int64), np.concatenate(date))
+
+
+def test_write_read(cursor):
+    date = np.arange(100, dtype=np.int64) * DAY
+    line = {"close": np.arange(100.0), "volume": np.arange(100.0) * 10}
+    write_blob_rows(cursor=cursor, table="AAA", date=date, line=line, block_days=7)
+
+    found, value = read_blob_columns(cursor=cursor, table="AAA")
+    assert np.array_equal(found, date)
+    assert set(value) == {"close", "volume"}
+    assert np.array_equal(value["close"], line["close"]) and np.array_equal(value["volume"], line["volume"])
+    # another ticker is not read
+    assert len(read_blob_columns(cursor=cursor, table="BBB")[0]) == 0
+
+
+def test_write_replace(cursor):
+    date = np.arange(20, dtype=np.int64) * DAY
+    write_blob_rows(cursor=cursor, table="AAA", date=date, line={"close": np.arange(20.0)}, block_days=7)
+    # rewritten bars replace the stored ones, a line they lack is nan like a row write
+    write_blob_rows(cursor=cursor, table="AAA", date=date[5:10], line={"volume": np.full(5, 7.0)}, block_days=7)
+
+    found, value = read_blob_columns(cursor=cursor, table="AAA", column=["close", "volume"])
+    assert np.array_equal(found, date)
+    close = np.arange(20.0)
+    close[5:10] = np.nan
+    assert np.array_equal(value["close"], close, equal_nan=True)
+    volume = np.full(20, np.nan)
+    volume[5:10] = 7.0
+    assert np.array_equal(value["volume"], volume, equal_nan=True)
+
+
+def test_write_merge(cursor):
+    even, odd = np.arange(0, 30, 2, dtype=np.int64) * DAY, np.arange(1, 30, 2, dtype=np.int64) * DAY
+    write_blob_rows(cursor=cursor, table="AAA", date=odd, line={"close": odd / DAY}, block_days=7)
+    write_blob_rows(cursor=cursor, table="AAA", date=even, line={"close": even / DAY}, block_days=7)
+
+    found, value = read_blob_columns(cursor=cursor, table="AAA", column=["close"])
+    assert np.array_equal(found, np.arange(30) * DAY)
+    assert np.array_equal(value["close"], np.arange(30.0))
+
+
+@pytest.fixture
+def stored(cursor):
+    """Cursor with 100 daily bars of AAA, close is the bar number"""
+    date = np.arange(100, dtype=np.int64) * DAY
+    write_blob_rows(cursor=cursor, table="AAA", date=date, line={"close": np.arange(100.0)}, block_days=7)
+    return cursor
+
+
+@pytest.mark.parametrize(
+    "since, until, last, expected",
+    [
+        (None, None, None, range(100)),
+        (40, None, None, range(40, 100)),
+        (None, 59, None, range(0, 60)),
+        (None, None, 10, range(90, 100)),
+        (40, 59, None, range(40, 60)),
+        (None, 59, 5, range(55, 60)),
+        (40, None, 200, range(40, 100)),
+        (95, 59, None, range(0)),
+        (40, 59, 50, range(40, 60)),
+        (None, None, 1, range(99, 100)),
+    ],
+)
+def test_read_since_until_last(stored, since, until, last, expected):
+    found, value = read_blob_columns(
+        cursor=stored,
+        table="AAA",
+        column=["close"],
+        since=None if since is None else since * DAY,
+        until=None if until is None else until * DAY,
+        last=last,
+    )
+    assert np.array_equal(found, np.array(expected, dtype=np.int64) * DAY)
+    assert np.array_equal(value["close"], np.array(expected, dtype=float))
+
+
+def test_read_missing_column(stored):
+    found, value = read_blob_columns(cursor=stored, table="AAA", column=["close", "volume"], last=3)
+    assert len(found) == 3
+    assert np.isnan(value["volume"]).all()
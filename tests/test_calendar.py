@@ -0,0 +1,61 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from pkg.data_srv.planner import nyse_holidays, plan_requests, trading_sessions
+
+D = datetime.date
+
+
+@pytest.mark.parametrize(
+    "year, expected",
+    [
+        # new year's day on a saturday is not observed in the old year
+        (2021, ["01-01", "01-18", "02-15", "04-02", "05-31", "07-05", "09-06", "11-25", "12-24"]),
+        (2022, ["01-17", "02-21", "04-15", "05-30", "06-20", "07-04", "09-05", "11-24", "12-26"]),
+        (2023, ["01-02", "01-16", "02-20", "04-07", "05-29", "06-19", "07-04", "09-04", "11-23", "12-25"]),
+        (2024, ["01-01", "01-15", "02-19", "03-29", "05-27", "06-19", "07-04", "09-02", "11-28", "12-25"]),
+        (2025, ["01-01", "01-20", "02-17", "04-18", "05-26", "06-19", "07-04", "09-01", "11-27", "12-25"]),
+        (2026, ["01-01", "01-19", "02-16", "04-03", "05-25", "06-19", "07-03", "09-07", "11-26", "12-25"]),
+    ],
+)
+def test_nyse_holidays(year, expected):
+    assert [day.isoformat()[5:] for day in nyse_holidays(year)] == expected
+
+
+def test_no_juneteenth_before_2022():
+    assert D(2021, 6, 18) not in nyse_holidays(2021) and D(2021, 6, 19) not in nyse_holidays(2021)
+
+
+@pytest.mark.parametrize("year, sessions", [(2022, 251), (2023, 250), (2024, 252)])
+def test_sessions_per_year(year, sessions):
+    assert len(trading_sessions(start=D(year, 1, 1), end=D(year + 1, 1, 1))) == sessions
+
+
+def test_sessions():
+    day = trading_sessions(start=D(2024, 3, 27), end=D(2024, 4, 3))
+    # good friday and the weekend are closed, end is not included
+    assert day.tolist() == [D(2024, 3, 27), D(2024, 3, 28), D(2024, 4, 1), D(2024, 4, 2)]
+    assert day.dtype == np.dtype("datetime64[D]")
+
+
+def test_sessions_closed():
+    # day of mourning for president carter
+    day = trading_sessions(start=D(2025, 1, 6), end=D(2025, 1, 11), closed=["2025-01-09"])
+    assert day.tolist() == [D(2025, 1, 6), D(2025, 1, 7), D(2025, 1, 8), D(2025, 1, 10)]
+
+
+def test_plan_requests():
+    sessions = trading_sessions(start=D(2024, 1, 2), end=D(2024, 2, 1))
+    stored = {"AAA": sessions[:-3], "BBB": sessions, "DDD": np.delete(sessions, [2, 5, 15])}
+    plan = plan_requests(sessions=sessions, stored=stored, ticker=["AAA", "BBB", "CCC", "DDD"], merge_gap=5)
+    # only missing sessions are asked for, an up to date ticker not at all, end is the day after
+    assert "BBB" not in plan
+    assert plan["AAA"] == [(sessions[-3], sessions[-1] + np.timedelta64(1, "D"))]
+    assert plan["CCC"] == [(sessions[0], sessions[-1] + np.timedelta64(1, "D"))]
+    # gaps of at most merge_gap stored sessions share a request
+    assert plan["DDD"] == [
+        (sessions[2], sessions[5] + np.timedelta64(1, "D")),
+        (sessions[15], sessions[15] + np.timedelta64(1, "D")),
+    ]
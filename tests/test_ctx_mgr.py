@@ -0,0 +1,91 @@
+import os
+import sqlite3
+import threading
+
+import pytest
+
+from pkg.ctx_mgr import SqliteConnectManager
+
+
+@pytest.fixture
+def db(ctx):
+    """A stonk database with one row in AAA"""
+    path = f"{ctx['default']['work_dir']}data/stonk.db"
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE AAA (date INTEGER PRIMARY KEY, clv INTEGER)")
+        connection.execute("INSERT INTO AAA VALUES (1, 10)")
+    connection.close()
+    return path
+
+
+def _pooled(ctx, detect_types: bool = False) -> object:
+    with SqliteConnectManager(ctx=ctx, mode="pool", detect_types=detect_types) as con:
+        assert con.cursor.execute("SELECT clv FROM AAA").fetchall() == [(10,)]
+        return con.connection
+
+
+def test_pool_reuses_connection(ctx, db):
+    connection = _pooled(ctx=ctx)
+    # still open after the with block, the same one next time
+    assert connection.execute("SELECT 1").fetchone() == (1,)
+    assert _pooled(ctx=ctx) is connection
+    assert connection.execute("PRAGMA cache_size").fetchone() == (-65536,)
+    assert connection.execute("PRAGMA temp_store").fetchone() == (2,)
+    # a connection for each detect_types setting
+    assert _pooled(ctx=ctx, detect_types=True) is not connection
+
+
+def test_pool_is_read_only(ctx, db):
+    with SqliteConnectManager(ctx=ctx, mode="pool") as con:
+        with pytest.raises(sqlite3.OperationalError, match="readonly"):
+            con.cursor.execute("INSERT INTO AAA VALUES (2, 20)")
+
+
+def test_pool_per_thread(ctx, db):
+    connection = _pooled(ctx=ctx)
+    other = list()
+    thread = threading.Thread(target=lambda: other.append(_pooled(ctx=ctx)))
+    thread.start()
+    thread.join()
+    assert other[0] is not connection
+
+
+def test_pool_per_process(ctx, db):
+    connection = _pooled(ctx=ctx)
+    # as if forked, the child does not use the parent's connection
+    SqliteConnectManager._pool.pid = -1
+    assert _pooled(ctx=ctx) is not connection
+    assert SqliteConnectManager._pool.pid == os.getpid()
+
+
+def test_pool_reopens_replaced_file(ctx, db):
+    connection = _pooled(ctx=ctx)
+    # a new database is written next to the old one, then moved over it
+    with sqlite3.connect(f"{db}.new") as new:
+        new.execute("CREATE TABLE AAA (date INTEGER PRIMARY KEY, clv INTEGER)")
+        new.execute("INSERT INTO AAA VALUES (1, 10)")
+    new.close()
+    os.replace(f"{db}.new", db)
+    assert _pooled(ctx=ctx) is not connection
+
+
+def test_pool_sees_new_rows(ctx, db):
+    connection = _pooled(ctx=ctx)
+    with SqliteConnectManager(ctx=ctx, mode="rw") as con:
+        con.cursor.execute("INSERT INTO AAA VALUES (2, 20)")
+    with SqliteConnectManager(ctx=ctx, mode="pool", detect_types=False) as con:
+        assert con.connection is connection
+        assert con.cursor.execute("SELECT clv FROM AAA ORDER BY date").fetchall() == [(10,), (20,)]
+
+
+def test_pool_reopens_on_new_partition(ctx, db):
+    connection = _pooled(ctx=ctx)
+    with sqlite3.connect(db.replace("stonk.db", "stonk_2020.db")) as partition:
+        partition.execute("CREATE TABLE AAA (date INTEGER PRIMARY KEY, clv INTEGER)")
+        partition.execute("INSERT INTO AAA VALUES (0, 5)")
+    partition.close()
+    with SqliteConnectManager(ctx=ctx, mode="pool", detect_types=False) as con:
+        assert con.connection is not connection
+        # the view over both files
+        assert con.cursor.execute("SELECT clv FROM AAA ORDER BY date").fetchall() == [(5,), (10,)]
+
@@ -0,0 +1,153 @@
+import numpy as np
+import pytest
+
+from pkg.gui import table_model
+from pkg.gui.plot_widget import LINE, DataLinePlot, decimate
+from pkg.gui.table_model import DataLineTableModel
+
+DAY = 86400
+
+
+def _decimate(x, y, width):
+    """Bucket by bucket of equal size within a bar, first x, min y, last x, max y"""
+    edge = [i * len(y) // width for i in range(width + 1)]
+    out_x, out_y = list(), list()
+    for start, end in zip(edge, edge[1:]):
+        item = np.arange(start, end)
+        valid = y[item][~np.isnan(y[item])]
+        out_x += [x[item[0]], x[item[-1]]]
+        out_y += [valid.min(), valid.max()] if len(valid) else [np.nan, np.nan]
+    return np.array(out_x), np.array(out_y)
+
+
+@pytest.mark.parametrize("n, width", [(1000, 100), (1001, 7), (250, 100), (201, 100)])
+def test_decimate(n, width):
+    rng = np.random.default_rng(0)
+    x, y = np.arange(n) * 1.5, rng.normal(0, 1, n)
+    y[10:14] = np.nan
+    found_x, found_y = decimate(x, y, width)
+    assert len(found_x) == len(found_y) == 2 * width
+    expected_x, expected_y = _decimate(x, y, width)
+    assert np.array_equal(found_x, expected_x) and np.array_equal(found_y, expected_y, equal_nan=True)
+    # every extreme is kept
+    assert np.nanmin(found_y) == np.nanmin(y) and np.nanmax(found_y) == np.nanmax(y)
+
+
+def test_decimate_short():
+    x, y = np.arange(20.0), np.arange(20.0)
+    assert decimate(x, y, 10) == (x, y)
+
+
+def test_decimate_nan_bucket():
+    y = np.arange(100.0)
+    y[:10] = np.nan
+    _, found = decimate(np.arange(100.0), y, 10)
+    assert np.isnan(found[:2]).all() and not np.isnan(found[2:]).any()
+
+
+@pytest.fixture
+def plot(qapp):
+    plot = DataLinePlot()
+    plot.resize(400, 200)
+    return plot
+
+
+def test_set_range(plot):
+    plot.set_data(date=np.arange(100) * DAY, line={"clv": np.arange(100.0)})
+    assert (plot.first, plot.last) == (0, 100)
+    plot.set_range(first=90, last=95)
+    # at least MIN_BARS wide and inside the data
+    assert (plot.first, plot.last) == (90, 100)
+    plot.set_range(first=-20, last=30)
+    assert (plot.first, plot.last) == (0, 50)
+    plot.show_row(row=80)
+    assert (plot.first, plot.last) == (50, 100) and plot.cursor_row == 80
+
+
+def test_paint(plot):
+    # far more bars than pixels
+    n = 200000
+    plot.set_data(date=np.arange(n) * DAY, line={"clv": np.sin(np.arange(n) / 1000), "volume": np.full(n, np.nan)})
+    image = plot.grab().toImage()
+    colors = {image.pixel(x, y) for x in range(0, 400, 2) for y in range(0, 100)}
+    assert LINE[0].rgb() in colors
+    # a line of only nan is not drawn
+    assert LINE[1].rgb() not in {image.pixel(x, y) for x in range(400) for y in range(100, 200)}
+
+
+@pytest.fixture(params=["row", "blob"])
+def model(ctx, qapp, request, monkeypatch):
+    """Model over AAA, 250 daily bars of clv and volume, NULL volume on every 7th, blocks of 40 rows, 3 cached"""
+    from pkg.data_srv.utils import create_sqlite_stonk_database, write_panel_to_stonk_tables
+
+    ctx["data_service"]["storage_mode"] = request.param
+    ctx["interface"].update(data_line=["CLV", "VOLUME"], ticker=["AAA"])
+    create_sqlite_stonk_database(ctx=ctx)
+    clv = np.arange(250.0)[None]
+    volume = np.where(np.arange(250) % 7, np.arange(250.0) * 10, np.nan)[None]
+    write_panel_to_stonk_tables(
+        ctx=ctx,
+        ticker=["AAA"],
+        date=np.arange(250, dtype=np.int64) * DAY,
+        line={"clv": clv, "volume": volume},
+        present=np.ones((1, 250), dtype=bool),
+    )
+
+    # count range reads
+    model = DataLineTableModel(ctx=ctx, block_rows=40, cache_blocks=3)
+    model.reads = list()
+    read = table_model.read_stonk_columns
+
+    def read_stonk_columns(**kwargs):
+        if kwargs.get("since") is not None:
+            model.reads.append(kwargs["since"] // DAY)
+        return read(**kwargs)
+
+    monkeypatch.setattr(table_model, "read_stonk_columns", read_stonk_columns)
+    model.set_table("AAA")
+    return model
+
+
+def _cell(model, row: int, column: int) -> str:
+    return model.data(model.index(row, column))
+
+
+def test_model_cells(model):
+    from pkg.data_srv.utils import read_stonk_columns
+
+    assert (model.rowCount(), model.columnCount()) == (250, 3)
+    assert [model.headerData(i, 1) for i in range(3)] == ["date", "clv", "volume"]
+    date, line = read_stonk_columns(ctx=model.ctx, table="AAA")
+    for row in range(250):
+        assert _cell(model, row, 0) == str(np.datetime64(int(date[row]), "s"))[:10]
+        assert _cell(model, row, 1) == f"{line['clv'][row]:.0f}"
+        # NULL is blank
+        assert _cell(model, row, 2) == ("" if np.isnan(line["volume"][row]) else f"{line['volume'][row]:.0f}")
+
+
+def test_model_block_cache(model):
+    for row in (0, 39, 40, 85, 5, 130):
+        _cell(model, row, 1)
+    # a read for each block on first use, the least recently used block is dropped
+    assert model.reads == [0, 40, 80, 120]
+    assert list(model.block) == [2, 0, 3]
+    _cell(model, 45, 1)
+    assert model.reads == [0, 40, 80, 120, 40]
+    assert len(model.block) == 3
+
+
+def test_model_rows_written_later(model):
+    from pkg.data_srv.utils import write_panel_to_stonk_tables
+
+    # a bar written after the dates were read is not shown until the table is set again
+    write_panel_to_stonk_tables(
+        ctx=model.ctx,
+        ticker=["AAA"],
+        date=np.array([249 * DAY + 3600]),
+        line={"clv": np.array([[-1.0]]), "volume": np.array([[-1.0]])},
+        present=np.ones((1, 1), dtype=bool),
+    )
+    assert _cell(model, 249, 1) == "249" and model.rowCount() == 250
+    model.set_table("AAA")
+    assert model.rowCount() == 251 and _cell(model, 250, 1) == "-1"
+    assert _cell(model, 250, 0) == "1970-09-07 01:00"
@@ -0,0 +1,140 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pkg.chart_srv.render.heat_map import COLOR_STOP, ImageRenderer, squarify
+
+
+def _overlap(a, b) -> float:
+    """Area of the intersection of two (x, y, dx, dy) rectangles"""
+    dx = min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0])
+    dy = min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1])
+    return max(dx, 0) * max(dy, 0)
+
+
+@pytest.mark.parametrize("sizes", [[6, 6, 4, 3, 2, 2, 1], [1], [5, 5, 5, 5], np.sort(np.arange(1, 40) ** 2)[::-1]])
+@pytest.mark.parametrize("box", [(0, 0, 600, 400), (10, 20, 100, 300)])
+def test_squarify(sizes, box):
+    x, y, dx, dy = box
+    rect = squarify(np.array(sizes), x, y, dx, dy)
+    assert rect.shape == (len(sizes), 4)
+    # area in proportion to size, the tiles fill the box
+    assert np.allclose(rect[:, 2] * rect[:, 3], np.array(sizes) * dx * dy / np.sum(sizes))
+    assert np.all(rect[:, 0] >= x - 1e-9) and np.all(rect[:, 1] >= y - 1e-9)
+    assert np.all(rect[:, 0] + rect[:, 2] <= x + dx + 1e-9) and np.all(rect[:, 1] + rect[:, 3] <= y + dy + 1e-9)
+    for i in range(len(rect)):
+        for j in range(i):
+            assert _overlap(rect[i], rect[j]) < 1e-6
+
+
+def test_squarify_aspect_ratio():
+    # the squarified layout of the Bruls paper, every tile close to a square
+    rect = squarify(np.array([6, 6, 4, 3, 2, 2, 1]), 0, 0, 6, 4)
+    ratio = np.maximum(rect[:, 2] / rect[:, 3], rect[:, 3] / rect[:, 2])
+    assert ratio.max() < 3
+    assert np.allclose(rect[:2], [[0, 0, 3, 2], [0, 2, 3, 2]])
+
+
+def test_squarify_empty():
+    assert squarify(np.array([]), 0, 0, 10, 10).shape == (0, 4)
+    assert not squarify(np.zeros(3), 0, 0, 10, 10).any()
+
+
+@pytest.fixture
+def stonk_ctx(ctx, local_dir):
+    """A stonk database of the AAA and BBB local files"""
+    from pkg.data_srv.client import ingest_local_data
+
+    ctx["data_service"].update(data_provider="local", local_dir=local_dir, local_lookback="0", local_workers="1")
+    ingest_local_data(ctx=ctx)
+    return ctx
+
+
+def test_read_ohlcv_from_stonk_table(stonk_ctx, local_dir):
+    from pkg.data_srv.utils import read_ohlcv_from_stonk_table
+
+    date, bars = read_ohlcv_from_stonk_table(ctx=stonk_ctx, table="AAA")
+    df = pd.read_csv(f"{local_dir}/AAA.csv")
+    assert np.array_equal(date, pd.to_datetime(df["date"]).to_numpy().astype("datetime64[s]").astype(np.int64))
+    assert np.array_equal(bars["volume"], df["volume"])
+    # clv is stored in whole percent of the range, close is within half a percent of it
+    hilo = (df["high"] - df["low"]).to_numpy() * 100
+    for name in ("open", "high", "low", "close"):
+        assert np.all(np.abs(bars[name] - df[name].to_numpy() * 100) <= hilo / 400 + 0.75), name
+    assert np.allclose(bars["high"] - bars["low"], hilo)
+
+
+def test_read_ohlcv_exact_bars(ctx):
+    from pkg.data_srv.agent import BaseProcessor
+    from pkg.data_srv.utils import (
+        create_sqlite_stonk_database,
+        read_ohlcv_from_stonk_table,
+        write_data_line_to_stonk_table,
+    )
+
+    # close at the low, the high and in the middle of the range, clv has no rounding
+    bars = {
+        "open": np.array([10.0, 11.0, 12.5]),
+        "high": np.array([11.0, 12.0, 13.0]),
+        "low": np.array([9.0, 10.0, 12.0]),
+        "close": np.array([9.0, 12.0, 12.5]),
+        "volume": np.array([100.0, 200.0, 300.0]),
+    }
+    date = np.arange(3, dtype=np.int64) * 86400
+    ctx["interface"]["ticker"] = ["AAA"]
+    create_sqlite_stonk_database(ctx=ctx)
+    ticker, df = BaseProcessor(ctx=ctx)._data_line_frame(ticker="AAA", date=date, bars=bars)
+    write_data_line_to_stonk_table(ctx=ctx, data_tuple=(ticker, df))
+    found_date, found = read_ohlcv_from_stonk_table(ctx=ctx, table="AAA")
+    assert np.array_equal(found_date, date)
+    for name in ("open", "high", "low", "close"):
+        assert np.allclose(found[name], bars[name] * 100), name
+
+
+@pytest.fixture
+def renderer(stonk_ctx):
+    stonk_ctx["interface"].update(command="heatmap", arguments=["1W", "1M"])
+    stonk_ctx["chart_service"]["heatmap_size"] = "300x200"
+    os.makedirs(f"{stonk_ctx['default']['work_dir']}heatmap")
+    return ImageRenderer(ctx=stonk_ctx)
+
+
+def test_period_change(renderer, local_dir):
+    ticker, weight, change = renderer._period_change(bars=renderer._read_ticker_bars(), period="1W")
+    assert ticker.tolist() == ["AAA", "BBB"]
+    for i, symbol in enumerate(ticker):
+        df = pd.read_csv(f"{local_dir}/{symbol}.csv")
+        # five bars of return, from the close before them
+        assert change[i] == pytest.approx((df["close"].iloc[-1] / df["close"].iloc[-6] - 1) * 100, abs=0.02)
+        assert weight[i] == pytest.approx(np.mean(df["close"].iloc[-5:] * 100 * df["volume"].iloc[-5:]), rel=1e-3)
+
+
+def test_change_color(renderer):
+    color = renderer._change_color(change=np.array([-10.0, -5.0, 0.0, 2.5, 50.0]), limit=5)
+    assert np.array_equal(color[[0, 1]], [COLOR_STOP[0], COLOR_STOP[0]])
+    assert np.array_equal(color[2], COLOR_STOP[1])
+    assert np.array_equal(color[3], np.round((COLOR_STOP[1] + COLOR_STOP[2]) / 2))
+    assert np.array_equal(color[4], COLOR_STOP[2])
+
+
+def test_renderer(renderer):
+    from PIL import Image
+
+    renderer.renderer()
+    for period in ("1w", "1m"):
+        path = f"{renderer.heatmap_dir}/SP500_{period}.png"
+        assert os.path.isfile(path)
+        with Image.open(path) as image:
+            assert image.size == (300, 200)
+
+
+def test_draw_treemap_sectors(renderer):
+    renderer.sector = {"AAA": "Tech", "BBB": "Energy"}
+    image = renderer._draw_treemap(
+        ticker=np.array(["AAA", "BBB"]), weight=np.array([3.0, 1.0]), change=np.array([-50.0, 50.0]), period="1W"
+    )
+    # Tech is the bigger sector on the left, all red, Energy green on the right
+    assert image.getpixel((5, 150)) == tuple(COLOR_STOP[0].astype(int))
+    assert image.getpixel((295, 150)) == tuple(COLOR_STOP[2].astype(int))
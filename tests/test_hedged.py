@@ -0,0 +1,137 @@
+import datetime
+import json
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+
+class _PriceHandler(BaseHTTPRequestHandler):
+    """Tiingo daily prices after server.delay seconds, or server.status if it is not 200"""
+
+    def do_GET(self):
+        self.server.request.append(time.perf_counter())
+        self.server.path.append(self.path)
+        time.sleep(self.server.delay)
+        if self.server.status != 200:
+            self.send_error(self.server.status)
+            return
+        row = {"adjOpen": 1.0, "adjHigh": 2.0, "adjLow": 0.5, "adjClose": self.server.close, "adjVolume": 1000}
+        body = json.dumps([{"date": f"2024-01-{day:02d}T00:00:00.000Z", **row} for day in range(2, 12)]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", f"{len(body)}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    """Returns a function starting a local price server, (close, delay, status) set its replies"""
+    running = list()
+
+    def start(close: float, delay: float = 0.0, status: int = 200) -> ThreadingHTTPServer:
+        httpd = ThreadingHTTPServer(("127.0.0.1", 0), _PriceHandler)
+        httpd.daemon_threads = True
+        httpd.close, httpd.delay, httpd.status, httpd.request, httpd.path = close, delay, status, list(), list()
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        running.append(httpd)
+        return httpd
+
+    yield start
+    for httpd in running:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+@pytest.fixture
+def hedged(ctx):
+    """Returns a function making a HedgedDataProcessor over a tiingo processor for each named server"""
+    from pkg.data_srv.agent import HedgedDataProcessor, ProviderLatency, TiingoDataProcessor
+
+    processors = list()
+
+    def make(hedge_delay: float = 5.0, **servers) -> HedgedDataProcessor:
+        ctx["data_service"].update(data_provider="hedged", hedge_delay=f"{hedge_delay}", hedge_provider="tiingo")
+        processor = HedgedDataProcessor(ctx=ctx)
+        processor.provider = dict()
+        for name, httpd in servers.items():
+            provider = TiingoDataProcessor(ctx=ctx)
+            provider.data_provider = "tiingo"
+            provider.client = provider.TiingoClient({"api_key": "test", "session": True})
+            provider.client._base_url = f"http://127.0.0.1:{httpd.server_address[1]}"
+            processor.provider[name] = provider
+        processor.latency = ProviderLatency(provider=list(servers))
+        processors.append(processor)
+        return processor
+
+    yield make
+    for processor in processors:
+        processor.executor.shutdown(wait=True, cancel_futures=True)
+
+
+def test_hedge_after_percentile_delay(server, hedged):
+    slow, fast = server(close=1.0, delay=1.0), server(close=2.0)
+    processor = hedged(primary=slow, backup=fast)
+    for _ in range(5):
+        processor.latency.record(provider="primary", seconds=0.2)
+        processor.latency.record(provider="backup", seconds=0.3)
+
+    start = time.perf_counter()
+    ticker, date, bars = processor.download_price_bars(ticker="AAA")
+    assert time.perf_counter() - start < 0.9
+    assert np.all(bars["close"] == 2.0)
+    assert len(date) == 10
+    # hedged once the primary took longer than its 90th percentile, not before
+    assert len(slow.request) == 1 and len(fast.request) == 1
+    assert 0.15 < fast.request[0] - slow.request[0] < 0.6
+
+
+def test_failover_on_error(server, hedged):
+    broken, backup = server(close=1.0, status=500), server(close=2.0)
+    processor = hedged(hedge_delay=5.0, primary=broken, backup=backup)
+
+    start = time.perf_counter()
+    ticker, date, bars = processor.download_price_bars(ticker="AAA")
+    # the backup is asked at once, not after the hedge delay
+    assert time.perf_counter() - start < 2.0
+    assert np.all(bars["close"] == 2.0)
+    assert len(broken.request) == 1 and len(backup.request) == 1
+
+
+def test_all_providers_fail(server, hedged):
+    processor = hedged(primary=server(close=1.0, status=500), backup=server(close=2.0, status=404))
+    with pytest.raises(RuntimeError, match="all providers failed"):
+        processor.download_price_bars(ticker="AAA")
+
+
+def test_primary_reranked(server, hedged):
+    first, second = server(close=1.0, status=500), server(close=2.0)
+    processor = hedged(primary=first, backup=second)
+    assert processor.latency.ranked() == ["primary", "backup"]
+
+    processor.download_price_bars(ticker="AAA")
+    # a failure counts as infinite latency, the backup is the primary from now on
+    assert processor.latency.ranked() == ["backup", "primary"]
+    for ticker in ("BBB", "CCC"):
+        processor.download_price_bars(ticker=ticker)
+    assert len(first.request) == 1 and len(second.request) == 3
+
+
+def test_dates_passed_per_download(server, hedged):
+    primary = server(close=1.0)
+    processor = hedged(primary=primary)
+    start_date, end_date = processor.provider["primary"].start_date, processor.provider["primary"].end_date
+
+    processor.start_date, processor.end_date = datetime.date(2024, 1, 2), datetime.date(2024, 1, 12)
+    processor.download_price_bars(ticker="AAA")
+    assert "startDate=2024-01-02" in primary.path[0] and "endDate=2024-01-12" in primary.path[0]
+    # the download used a copy, a request still running can not see the dates of the next one
+    assert processor.provider["primary"].start_date == start_date
+    assert processor.provider["primary"].end_date == end_date
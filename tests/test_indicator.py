@@ -0,0 +1,138 @@
+import numpy as np
+import pytest
+
+from pkg.data_srv import indicator
+
+
+@pytest.fixture
+def bars():
+    """120 bars of a random walk, with flat runs so gains and losses can be zero"""
+    rng = np.random.default_rng(0)
+    close = 100 + rng.normal(0, 1, 120).cumsum()
+    close[30:36] = close[30]
+    open = close + rng.normal(0, 0.5, 120)
+    high = np.maximum(open, close) + rng.uniform(0, 1, 120)
+    low = np.minimum(open, close) - rng.uniform(0, 1, 120)
+    return {"open": open, "high": high, "low": low, "close": close, "volume": rng.integers(1, 1000, 120).astype(float)}
+
+
+def _sma(x, period):
+    return [np.nan if t < period - 1 else sum(x[t - period + 1 : t + 1]) / period for t in range(len(x))]
+
+
+def _smooth(x, alpha, seed_at):
+    y = [np.nan] * len(x)
+    for t in range(seed_at, len(x)):
+        y[t] = sum(x[: seed_at + 1]) / (seed_at + 1) if t == seed_at else alpha * x[t] + (1 - alpha) * y[t - 1]
+    return y
+
+
+def _ema(x, period):
+    return _smooth(list(x), 2 / (period + 1), period - 1)
+
+
+def _wilder(x, period):
+    return [np.nan] + _smooth(list(x[1:]), 1 / period, period - 1)
+
+
+def _rsi(close, period):
+    gain, loss = [0.0], [0.0]
+    for t in range(1, len(close)):
+        gain.append(max(close[t] - close[t - 1], 0))
+        loss.append(max(close[t - 1] - close[t], 0))
+    y = list()
+    for g, l in zip(_wilder(gain, period), _wilder(loss, period)):
+        y.append(np.nan if np.isnan(g) else 100.0 if l == 0 else 100 - 100 / (1 + g / l))
+    return y
+
+
+def _atr(high, low, close, period):
+    true_range = [high[0] - low[0]]
+    for t in range(1, len(close)):
+        true_range.append(max(high[t] - low[t], abs(high[t] - close[t - 1]), abs(low[t] - close[t - 1])))
+    return _wilder(true_range, period)
+
+
+def _obv(close, volume):
+    total, y = 0.0, [0.0]
+    for t in range(1, len(close)):
+        total += volume[t] if close[t] > close[t - 1] else -volume[t] if close[t] < close[t - 1] else 0
+        y.append(total)
+    return y
+
+
+@pytest.mark.parametrize("period", [1, 5, 20])
+def test_moving_averages(bars, period):
+    close = bars["close"]
+    assert np.allclose(indicator.sma(close, period), _sma(close, period), equal_nan=True)
+    assert np.allclose(indicator.ema(close, period), _ema(close, period), equal_nan=True)
+    assert np.allclose(indicator.wilder(close, period), _wilder(close, period), equal_nan=True)
+
+
+@pytest.mark.parametrize("period", [2, 14])
+def test_rsi(bars, period):
+    assert np.allclose(indicator.rsi(bars["close"], period), _rsi(bars["close"], period), equal_nan=True)
+
+
+def test_rsi_without_losses():
+    assert indicator.rsi(np.arange(20.0), 14)[-1] == 100
+
+
+def test_atr(bars):
+    expected = _atr(bars["high"], bars["low"], bars["close"], 14)
+    # the first bar has no previous close, atr starts on the second
+    assert np.allclose(indicator.atr(bars["high"], bars["low"], bars["close"], 14)[1:], expected[1:], equal_nan=True)
+
+
+def test_obv(bars):
+    assert np.allclose(indicator.obv(bars["close"], bars["volume"]), _obv(bars["close"], bars["volume"]))
+
+
+def test_macd(bars):
+    close = bars["close"]
+    line, signal, histogram = indicator.macd(close)
+    expected = np.array(_ema(close, 12)) - np.array(_ema(close, 26))
+    assert np.allclose(line, expected, equal_nan=True)
+    assert np.allclose(signal[25:], _ema(expected[25:], 9), equal_nan=True)
+    assert np.isnan(signal[:25]).all()
+    assert np.allclose(histogram, line - signal, equal_nan=True)
+
+
+def test_zscore(bars):
+    close = bars["close"]
+    expected = [
+        np.nan if t < 19 else (close[t] - np.mean(close[t - 19 : t + 1])) / np.std(close[t - 19 : t + 1])
+        for t in range(len(close))
+    ]
+    assert np.allclose(indicator.zscore(close, 20), expected, equal_nan=True)
+    # no spread is a z-score of 0
+    assert indicator.zscore(np.ones(30), 20)[-1] == 0
+
+
+def test_short_input(bars):
+    short = {key: value[:3] for key, value in bars.items()}
+    assert np.isnan(indicator.data_line("RSI", short)).all()
+    assert np.isnan(indicator.data_line("SMA_5", short)).all()
+
+
+@pytest.mark.parametrize("name", list(indicator.DATA_LINE))
+def test_empty_input(name):
+    # a download without bars
+    bars = {key: np.empty(0) for key in ("open", "high", "low", "close", "volume")}
+    assert indicator.data_line(name, bars).shape == (0,)
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [("rsi", ("RSI", 14)), ("EMA_50", ("EMA", 50)), ("macd_hist", ("MACD_HIST", None)), ("OBV_5", (None, None))],
+)
+def test_parse_name(name, expected):
+    assert indicator._parse_name(name) == expected
+    assert indicator.is_data_line(name) == (expected[0] is not None)
+
+
+def test_data_line_rounds(bars):
+    value = indicator.data_line("EMA_10", bars)
+    assert np.allclose(value, np.round(np.array(_ema(bars["close"], 10)) * 100), equal_nan=True)
+    with pytest.raises(ValueError):
+        indicator.data_line("NOPE", bars)
@@ -0,0 +1,104 @@
+import sqlite3
+import threading
+
+import pytest
+
+from pkg.data_srv.job_queue import (
+    QUEUE_TABLE,
+    _Lease,
+    _retry_locked,
+    enqueue_stonk_refresh,
+    read_queue_report,
+    start_stonk_refresh,
+)
+
+
+def _state(ctx) -> list:
+    with sqlite3.connect(f"{ctx['default']['work_dir']}data/stonk.db") as connection:
+        return connection.execute(f"SELECT state, attempts FROM {QUEUE_TABLE} ORDER BY job_id").fetchall()
+
+
+def test_retries(ctx):
+    # one retry, a job is tried twice before it fails
+    ctx["data_service"].update(queue_batch="10", queue_retries="1")
+    assert enqueue_stonk_refresh(ctx=ctx) == 1
+    lease = _Lease(ctx=ctx)
+
+    job_id, ticker = lease.claim()
+    assert ticker == ["AAA", "BBB"]
+    lease.finish(job_id=job_id, error="boom")
+    assert lease.claim() == (job_id, ["AAA", "BBB"])
+    lease.finish(job_id=job_id, error="boom")
+    assert lease.claim() == (None, None)
+    assert _state(ctx=ctx) == [("failed", 2)]
+    assert read_queue_report(ctx=ctx) == [("failed", 1, 2, 0)]
+
+
+def test_no_retries(ctx):
+    ctx["data_service"].update(queue_batch="1", queue_retries="0")
+    enqueue_stonk_refresh(ctx=ctx)
+    lease = _Lease(ctx=ctx)
+
+    job_id, _ = lease.claim()
+    lease.finish(job_id=job_id, error="boom")
+    job_id, ticker = lease.claim()
+    # the failed job is not claimed again, the next one is
+    assert ticker == ["BBB"]
+    lease.finish(job_id=job_id)
+    assert _state(ctx=ctx) == [("failed", 1), ("done", 1)]
+
+
+def test_claim_waits_for_lock(ctx):
+    ctx["data_service"].update(queue_timeout="0.05")
+    enqueue_stonk_refresh(ctx=ctx)
+    lease = _Lease(ctx=ctx)
+
+    # another worker holds the write lock longer than the busy timeout
+    lock = sqlite3.connect(f"{ctx['default']['work_dir']}data/stonk.db", check_same_thread=False)
+    lock.execute("BEGIN EXCLUSIVE")
+    with pytest.raises(sqlite3.OperationalError, match="locked"):
+        lease.claim()
+
+    release = threading.Timer(0.5, lock.rollback)
+    release.start()
+    job_id, ticker = _retry_locked(call=lease.claim, backoff=0.2)
+    release.join()
+    lock.close()
+    assert ticker == ["AAA", "BBB"]
+    assert _state(ctx=ctx) == [("leased", 1)]
+
+
+def test_retry_locked_raises_other_errors():
+    def call():
+        raise sqlite3.OperationalError("no such table: _job")
+
+    with pytest.raises(sqlite3.OperationalError, match="no such table"):
+        _retry_locked(call=call, backoff=0.2)
+
+
+def test_start_stonk_refresh(ctx, local_dir):
+    from pkg.data_srv.utils import read_stonk_columns, select_stonk_tables
+
+    ctx["data_service"].update(
+        data_lookback="36500",
+        data_provider="local",
+        local_dir=local_dir,
+        queue_batch="1",
+        queue_workers="0",
+        resample_frequency="weekly",
+    )
+    ctx["screen_rule"] = {"any_bar": "volume > 0"}
+    start_stonk_refresh(ctx=ctx)
+
+    assert _state(ctx=ctx) == [("done", 1), ("done", 1)]
+    (worker, jobs, tickers, seconds), *failed = read_queue_report(ctx=ctx)
+    assert (jobs, tickers, failed) == (2, 2, [])
+    assert select_stonk_tables(ctx=ctx) == ["AAA", "BBB"]
+    assert len(read_stonk_columns(ctx=ctx, table="AAA", column=["cwap"])[0]) == 60
+    # the steps fetch_stonk_data runs after the download ran once the queue drained
+    assert select_stonk_tables(ctx=ctx, frequency="weekly") == ["AAA_WEEKLY", "BBB_WEEKLY"]
+    with sqlite3.connect(f"{ctx['default']['work_dir']}data/stonk.db") as connection:
+        assert connection.execute("SELECT rule, ticker FROM _screen ORDER BY ticker").fetchall() == [
+            ("any_bar", "AAA"),
+            ("any_bar", "BBB"),
+        ]
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pkg.data_srv.utils import (
+    create_sqlite_stonk_database,
+    read_latest_snapshot,
+    read_stonk_columns,
+    select_stonk_tables,
+    write_data_line_to_stonk_table,
+    write_panel_to_stonk_tables,
+)
+
+DAY = 86400
+
+
+@pytest.fixture(params=["row", "blob"])
+def write(ctx, request):
+    """Returns a function writing a (ticker, date) panel of clv and volume, in row or blob storage mode"""
+    ctx["data_service"]["storage_mode"] = request.param
+    ctx["interface"]["data_line"] = ["CLV", "VOLUME"]
+    ctx["interface"]["ticker"] = ["AAA", "BBB"]
+    create_sqlite_stonk_database(ctx=ctx)
+
+    def write(ticker: list, day: list, clv: np.ndarray, present: np.ndarray = None):
+        clv = np.asarray(clv, dtype=float)
+        present = np.ones(clv.shape, dtype=bool) if present is None else np.asarray(present, dtype=bool)
+        write_panel_to_stonk_tables(
+            ctx=ctx,
+            ticker=ticker,
+            date=np.asarray(day, dtype=np.int64) * DAY,
+            line={"clv": clv, "volume": clv * 10},
+            present=present,
+        )
+
+    return write
+
+
+def test_latest_bar(ctx, write):
+    write(["AAA", "BBB"], [1, 2, 3], [[1, 2, 3], [4, 5, np.nan]], present=[[1, 1, 1], [1, 1, 0]])
+    ticker, date, line = read_latest_snapshot(ctx=ctx)
+    # BBB has no bar on day 3
+    assert ticker == ["AAA", "BBB"]
+    assert date.tolist() == [3 * DAY, 2 * DAY]
+    assert line["clv"].tolist() == [3, 5] and line["volume"].tolist() == [30, 50]
+    for i, table in enumerate(ticker):
+        table_date, table_line = read_stonk_columns(ctx=ctx, table=table)
+        assert table_date[-1] == date[i]
+        assert all(table_line[name][-1] == line[name][i] for name in line)
+
+
+def test_backfill_keeps_newer_bar(ctx, write):
+    write(["AAA"], [10, 11], [[1, 2]])
+    # older bars arrive after the newest one
+    write(["AAA"], [3, 4], [[7, 8]])
+    _, date, line = read_latest_snapshot(ctx=ctx)
+    assert date.tolist() == [11 * DAY] and line["clv"].tolist() == [2]
+    assert len(read_stonk_columns(ctx=ctx, table="AAA")[0]) == 4
+
+
+def test_newest_bar_rewritten(ctx, write):
+    write(["AAA"], [10, 11], [[1, 2]])
+    # the bar of the day is fetched again with new values, nan is NULL
+    write(["AAA"], [11], [[np.nan]])
+    _, date, line = read_latest_snapshot(ctx=ctx)
+    assert date.tolist() == [11 * DAY] and np.isnan(line["clv"][0]) and np.isnan(line["volume"][0])
+    write(["AAA"], [12], [[5]])
+    assert read_latest_snapshot(ctx=ctx)[2]["clv"].tolist() == [5]
+
+
+def test_write_data_line_to_stonk_table(ctx, write):
+    df = pd.DataFrame({"clv": [1, 2, 3], "volume": [10, 20, 30]}, index=pd.Index([5, 6, 7]) * DAY)
+    df.index.name = "date"
+    assert write_data_line_to_stonk_table(ctx=ctx, data_tuple=("BBB", df))
+    ticker, date, line = read_latest_snapshot(ctx=ctx)
+    assert ticker == ["BBB"] and date.tolist() == [7 * DAY] and line["clv"].tolist() == [3]
+
+
+def test_frequency(ctx, write):
+    ctx["data_service"]["resample_frequency"] = "weekly"
+    create_sqlite_stonk_database(ctx=ctx)
+    write(["AAA", "AAA_WEEKLY"], [1, 2], [[1, 2], [3, 4]])
+    assert read_latest_snapshot(ctx=ctx)[0] == ["AAA"]
+    ticker, date, line = read_latest_snapshot(ctx=ctx, frequency="weekly")
+    assert ticker == ["AAA_WEEKLY"] and line["clv"].tolist() == [4]
+    # the snapshot is bookkeeping, not a ticker
+    assert "_latest" not in select_stonk_tables(ctx=ctx)
+
+
+def test_empty(ctx, write):
+    ticker, date, line = read_latest_snapshot(ctx=ctx)
+    assert ticker == [] and len(date) == 0 and line["clv"].shape == (0,)
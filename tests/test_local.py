@@ -0,0 +1,77 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pkg.data_srv.client import ingest_local_data
+from pkg.data_srv.utils import read_stonk_columns, select_stonk_tables
+
+
+@pytest.fixture
+def local_ctx(ctx, local_dir):
+    ctx["data_service"].update(data_provider="local", local_dir=local_dir, local_lookback="0", local_workers="2")
+    ctx["interface"]["ticker"] = []
+    return ctx
+
+
+def test_ingest_every_file(local_ctx, local_dir):
+    ingest_local_data(ctx=local_ctx)
+    # an empty ticker list loads every file in local_dir
+    assert local_ctx["interface"]["ticker"] == ["AAA", "BBB"]
+    assert select_stonk_tables(ctx=local_ctx) == ["AAA", "BBB"]
+
+    for ticker in ("AAA", "BBB"):
+        df = pd.read_csv(f"{local_dir}/{ticker}.csv")
+        date, line = read_stonk_columns(ctx=local_ctx, table=ticker, column=["clop", "hilo", "volume"])
+        # every bar of the file, not only the online data_lookback days
+        assert np.array_equal(date, pd.to_datetime(df["date"]).to_numpy().astype("datetime64[s]").astype(np.int64))
+        assert np.array_equal(line["clop"], np.round((df["close"] - df["open"]).to_numpy() * 100))
+        assert np.array_equal(line["hilo"], np.round((df["high"] - df["low"]).to_numpy() * 100))
+        assert np.array_equal(line["volume"], df["volume"].to_numpy())
+
+
+def test_ingest_ticker_list(local_ctx):
+    local_ctx["interface"]["ticker"] = ["BBB"]
+    ingest_local_data(ctx=local_ctx)
+    assert select_stonk_tables(ctx=local_ctx) == ["BBB"]
+
+
+def test_ingest_skips_bad_file(local_ctx, local_dir):
+    # no date column, the other files are still loaded
+    pd.DataFrame({"open": [1.0], "high": [1.0], "low": [1.0], "close": [1.0], "volume": [1]}).to_csv(
+        f"{local_dir}/CCC.csv", index=False
+    )
+    ingest_local_data(ctx=local_ctx)
+    assert local_ctx["interface"]["ticker"] == ["AAA", "BBB", "CCC"]
+    assert len(read_stonk_columns(ctx=local_ctx, table="AAA", column=["clop"])[0]) == 60
+    assert len(read_stonk_columns(ctx=local_ctx, table="CCC", column=["clop"])[0]) == 0
+
+
+def test_ingest_lookback(local_ctx, local_dir):
+    # unsorted rows, the last ten days up to today
+    today = datetime.date.today()
+    day = [today - datetime.timedelta(days=n) for n in (0, 20, 3, 9, 11, 30)]
+    pd.DataFrame({"Date": day, "Open": 1.0, "High": 2.0, "Low": 0.5, "Close": 1.5, "Volume": range(6)}).to_csv(
+        f"{local_dir}/CCC.csv.gz", index=False
+    )
+    local_ctx["data_service"]["local_lookback"] = "10"
+    local_ctx["interface"]["ticker"] = ["CCC"]
+    ingest_local_data(ctx=local_ctx)
+
+    date, line = read_stonk_columns(ctx=local_ctx, table="CCC", column=["volume"])
+    assert line["volume"].tolist() == [3, 2, 0]
+    assert np.all(np.diff(date) > 0)
+
+
+def test_ingest_parquet(local_ctx, local_dir):
+    pytest.importorskip("pyarrow")
+    df = pd.read_csv(f"{local_dir}/AAA.csv")
+    df.to_parquet(f"{local_dir}/DDD.parquet")
+    local_ctx["interface"]["ticker"] = ["AAA", "DDD"]
+    ingest_local_data(ctx=local_ctx)
+
+    aaa = read_stonk_columns(ctx=local_ctx, table="AAA")
+    ddd = read_stonk_columns(ctx=local_ctx, table="DDD")
+    assert np.array_equal(aaa[0], ddd[0])
+    assert all(np.array_equal(aaa[1][name], ddd[1][name], equal_nan=True) for name in aaa[1])
@@ -0,0 +1,150 @@
+import atexit
+import io
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pkg.log_mgr import SampleFilter, SummaryFormatter, start_logging, summarize
+
+
+def test_summarize_array():
+    text = summarize(np.array([[1.0, np.nan, 3.0], [4.0, 5.0, 6.0]]))
+    assert text == "<ndarray (2, 3) float64 nan=1 min=1 mean=3.8 max=6 head=[1.0, nan, 3.0]>"
+    assert summarize(np.array([], dtype=np.int64)) == "<ndarray (0,) int64 head=[]>"
+    assert summarize(np.array(["a", "b"])) == "<ndarray (2,) <U1 head=['a', 'b']>"
+    assert summarize(pd.Series([1, 2, 3, 4]), items=2) == "<Series (4,) int64 nan=0 min=1 mean=2.5 max=4 head=[1, 2]>"
+
+
+def test_summarize_frame():
+    df = pd.DataFrame({"clv": range(10)}, index=range(100, 110))
+    text = summarize(df, items=2)
+    assert text.splitlines()[0] == "<DataFrame 10x1 100 .. 109>"
+    # a header and two rows
+    assert len(text.splitlines()) == 4
+
+
+def test_summarize_containers():
+    assert summarize(list(range(10))) == "<list 10 head=[0, 1, 2] tail=[7, 8, 9]>"
+    assert (
+        summarize({"a": np.zeros(2), "b": 1})
+        == "{a: <ndarray (2,) float64 nan=0 min=0 mean=0 max=0 head=[0.0, 0.0]>, b: 1}"
+    )
+    # short containers and scalars are kept, so %d and %f still work
+    assert summarize([1, 2]) == [1, 2]
+    assert summarize(1.5) == 1.5
+    assert summarize({"a": 1}) == {"a": 1}
+
+
+def _record(msg: str, args: tuple = (), created: float = 0.0, lineno: int = 1, level: int = logging.DEBUG):
+    record = logging.LogRecord("pkg", level, "agent.py", lineno, msg, args, None)
+    record.created = created
+    return record
+
+
+def test_summary_formatter():
+    formatter = SummaryFormatter(fmt="%(message)s", items=2)
+    assert formatter.format(_record("volume: %s", (np.arange(5),))) == (
+        "volume: <ndarray (5,) int64 nan=0 min=0 mean=2 max=4 head=[0, 1]>"
+    )
+    assert formatter.format(_record("%d bars %.1f", (3, 2.0))) == "3 bars 2.0"
+    assert formatter.format(_record("%(n)s", ({"n": list(range(6))},))) == "<list 6 head=[0, 1] tail=[4, 5]>"
+    # a lone dict argument fills a single %s
+    assert formatter.format(_record("line: %s", ({"clv": np.ones(1)},))) == (
+        "line: {clv: <ndarray (1,) float64 nan=0 min=1 mean=1 max=1 head=[1.0]>}"
+    )
+
+
+def test_sample_filter():
+    sample = SampleFilter(burst=3, interval=60, sample=5)
+    passed = [i for i in range(20) if sample.filter(_record("bar %s", (i,), created=i))]
+    # the burst, then every fifth record over it
+    assert passed == [0, 1, 2, 7, 12, 17]
+    assert not any(sample.filter(_record("bar", created=t)) for t in (20, 21))
+    record = _record("bar", created=22)
+    assert sample.filter(record) and record.msg == "bar [4 similar dropped]"
+
+
+def test_sample_filter_interval_and_line():
+    sample = SampleFilter(burst=2, interval=10, sample=0)
+    assert [sample.filter(_record("bar", created=t)) for t in (0, 1, 2, 3)] == [True, True, False, False]
+    # another log call has its own count
+    assert sample.filter(_record("bar", created=4, lineno=2))
+    # a new interval, the drop count is noted
+    record = _record("bar", created=10)
+    assert sample.filter(record) and record.msg == "bar [2 similar dropped]"
+    # warnings always pass
+    assert all(sample.filter(_record("bar", created=11, level=logging.WARNING)) for _ in range(5))
+
+
+def test_sample_filter_decides_once():
+    # a record passed to a second handler keeps the first decision
+    sample = SampleFilter(burst=1, interval=60, sample=0)
+    first, second = _record("bar"), _record("bar")
+    assert sample.filter(first) and sample.filter(first)
+    assert not sample.filter(second) and not sample.filter(second)
+
+
+@pytest.fixture
+def stream():
+    """A logger with a handler writing to a string, handlers and formatters restored after the test"""
+    saved = {
+        item: list(item.handlers)
+        for item in [logging.getLogger(), *logging.Logger.manager.loggerDict.values()]
+        if isinstance(item, logging.Logger)
+    }
+    formatter = {
+        handler: (handler.formatter, list(handler.filters)) for handlers in saved.values() for handler in handlers
+    }
+    text = io.StringIO()
+    handler = logging.StreamHandler(text)
+    handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    test_logger = logging.getLogger("pkg.test_log_mgr")
+    test_logger.handlers, test_logger.propagate, test_logger.level = [handler], False, logging.DEBUG
+    yield test_logger, text
+    for item, handlers in saved.items():
+        item.handlers = handlers
+    for item, (fmt, filters) in formatter.items():
+        item.setFormatter(fmt)
+        item.filters = filters
+    test_logger.handlers = []
+
+
+def _options(**options) -> dict:
+    return {
+        "log_service": {
+            "log_burst": "0",
+            "log_interval": "60",
+            "log_items": "2",
+            "log_mode": "sync",
+            "log_sample": "0",
+            **options,
+        }
+    }
+
+
+def test_start_logging_sync(stream):
+    test_logger, text = stream
+    assert start_logging(ctx=_options(log_burst="2")) is None
+    for _ in range(4):
+        test_logger.debug("line: %s", np.arange(4))
+    test_logger.warning("done")
+    assert text.getvalue().splitlines() == [
+        "DEBUG line: <ndarray (4,) int64 nan=0 min=0 mean=1.5 max=3 head=[0, 1]>"
+    ] * 2 + ["WARNING done"]
+
+
+def test_start_logging_queue(stream):
+    test_logger, text = stream
+    listener = start_logging(ctx=_options(log_mode="queue"))
+    # the record is formatted and written in the listener thread
+    test_logger.debug("line: %s", np.arange(3))
+    listener.stop()
+    atexit.unregister(listener.stop)
+    assert text.getvalue() == "DEBUG line: <ndarray (3,) int64 nan=0 min=0 mean=1 max=2 head=[0, 1]>\n"
+
+
+def test_start_logging_unknown_mode():
+    with pytest.raises(ValueError):
+        start_logging(ctx=_options(log_mode="async"))
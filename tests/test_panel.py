@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pkg.data_srv.panel import align_price_bars
+
+DATA_LINE = ["CLOP", "CLV", "CWAP", "HILO", "VOLUME", "SC_CWAP", "SC_MASS", "SC_VOL", "RSI", "EMA_10", "OBV"]
+
+
+def _bars(close: list) -> dict:
+    close = np.array(close, dtype=float)
+    return {"open": close - 1, "high": close + 1, "low": close - 2, "close": close, "volume": close * 10}
+
+
+def test_align_price_bars():
+    ticker, date, bars = align_price_bars(
+        series=[("AAA", [10, 20, 40], _bars([1, 2, 4])), ("BBB", [30, 20], _bars([3, 2])), ("CCC", [], _bars([]))]
+    )
+    assert ticker == ["AAA", "BBB", "CCC"]
+    # the sorted union of dates, nan where a ticker has no bar
+    assert date.dtype == np.int64 and date.tolist() == [10, 20, 30, 40]
+    assert np.array_equal(bars["close"], [[1, 2, np.nan, 4], [np.nan, 2, 3, np.nan], [np.nan] * 4], equal_nan=True)
+    assert np.array_equal(bars["volume"][1], [np.nan, 20, 30, np.nan], equal_nan=True)
+
+
+def test_align_price_bars_empty():
+    ticker, date, bars = align_price_bars(series=[])
+    assert ticker == [] and len(date) == 0
+    assert bars["close"].shape == (0, 0)
+
+
+@pytest.fixture
+def fetch(ctx, local_dir):
+    """Returns a function fetching the local files in ticker or panel mode, then reading every stored data line"""
+    from pkg.data_srv.client import fetch_stonk_data
+    from pkg.data_srv.utils import read_stonk_columns
+
+    ctx["interface"]["data_line"] = DATA_LINE
+    ctx["data_service"].update(data_lookback="36500", data_provider="local", local_dir=local_dir, scaler_mode="batch")
+    ctx["screen_rule"] = {}
+
+    def fetch(fetch_mode: str) -> dict:
+        ctx["data_service"]["fetch_mode"] = fetch_mode
+        fetch_stonk_data(ctx=ctx)
+        return {ticker: read_stonk_columns(ctx=ctx, table=ticker) for ticker in ctx["interface"]["ticker"]}
+
+    return fetch
+
+
+def _assert_same(a: dict, b: dict):
+    assert list(a) == list(b)
+    for ticker in a:
+        assert np.array_equal(a[ticker][0], b[ticker][0]), ticker
+        assert list(a[ticker][1]) == list(b[ticker][1])
+        for name in a[ticker][1]:
+            assert np.array_equal(a[ticker][1][name], b[ticker][1][name], equal_nan=True), f"{ticker} {name}"
+
+
+def test_panel_matches_ticker_mode(fetch):
+    ticker = fetch("ticker")
+    panel = fetch("panel")
+    assert len(panel["AAA"][0]) == 60
+    _assert_same(ticker, panel)
+
+
+def test_panel_matches_ticker_mode_with_sweep(ctx, fetch):
+    ctx["data_service"].update(sweep_scaler="MinMaxScaler RobustScaler", sweep_window="5 20")
+    ticker = fetch("ticker")
+    assert "sc_vol_w20_robust" in ticker["AAA"][1]
+    _assert_same(ticker, fetch("panel"))
+
+
+def test_panel_missing_dates(local_dir, fetch):
+    # BBB has no bars for ten dates, only its own dates are written
+    df = pd.read_csv(f"{local_dir}/BBB.csv")
+    df.drop(index=range(30, 40)).to_csv(f"{local_dir}/BBB.csv", index=False)
+    ticker = fetch("ticker")
+    panel = fetch("panel")
+
+    assert np.array_equal(panel["BBB"][0], ticker["BBB"][0]) and len(panel["BBB"][0]) == 50
+    _assert_same({"AAA": ticker["AAA"]}, {"AAA": panel["AAA"]})
+    # lines of one bar and indicators over the ticker's own bars are the same, windows span the gap
+    for name in ("clop", "clv", "cwap", "hilo", "volume", "rsi", "ema_10", "obv"):
+        assert np.array_equal(panel["BBB"][1][name], ticker["BBB"][1][name], equal_nan=True), name
+
+
+def test_panel_download_error(ctx, fetch):
+    from pkg.data_srv.utils import read_stonk_columns
+
+    # no file for ZZZ, the other tickers are still written
+    ctx["interface"]["ticker"] = ["AAA", "ZZZ", "BBB"]
+    found = fetch("panel")
+    assert len(found["AAA"][0]) == len(found["BBB"][0]) == 60
+    assert len(read_stonk_columns(ctx=ctx, table="ZZZ")[0]) == 0
@@ -0,0 +1,130 @@
+import datetime
+import os
+import sqlite3
+import stat
+
+import numpy as np
+import pytest
+
+from pkg.data_srv.utils import (
+    _year_start,
+    create_sqlite_stonk_database,
+    read_stonk_columns,
+    roll_stonk_partitions,
+    select_stonk_tables,
+    write_panel_to_stonk_tables,
+)
+
+THIS_YEAR = datetime.date.today().year
+DAY = 86400
+
+
+def _date(year: int, month: int, day: int, hour: int = 0) -> int:
+    return int(datetime.datetime(year, month, day, hour, tzinfo=datetime.timezone.utc).timestamp())
+
+
+@pytest.fixture
+def db(ctx):
+    """Stonk database of AAA and BBB with bars from three years ago to this year, returns the bar dates"""
+    ctx["data_service"].update(partition_mode="year", partition_retention="0")
+    create_sqlite_stonk_database(ctx=ctx)
+    date = np.array(
+        [_date(year, month, day) for year in range(THIS_YEAR - 3, THIS_YEAR) for month, day in ((1, 2), (12, 31))]
+        + [_date(THIS_YEAR, 1, 2)],
+        dtype=np.int64,
+    )
+    value = np.tile(np.arange(len(date), dtype=float), (2, 1))
+    write_panel_to_stonk_tables(
+        ctx=ctx, ticker=["AAA", "BBB"], date=date, line={"clv": value}, present=np.ones(value.shape, dtype=bool)
+    )
+    return date
+
+
+def _path(ctx, year: int = None) -> str:
+    return f"{ctx['default']['work_dir']}data/stonk{'' if year is None else f'_{year}'}.db"
+
+
+def _main_dates(ctx, table: str = "AAA") -> list:
+    with sqlite3.connect(_path(ctx)) as connection:
+        return [row[0] for row in connection.execute(f"SELECT date FROM {table} ORDER BY date").fetchall()]
+
+
+def test_year_start():
+    # a bar at local midnight stays in its year from UTC-12 to UTC+12
+    assert _date(2024, 1, 1, 5) >= _year_start(2024)
+    assert _date(2023, 12, 31, 12) >= _year_start(2024)
+    assert _date(2023, 12, 31, 11) < _year_start(2024)
+    assert _date(2024, 12, 31, 11) < _year_start(2025)
+
+
+def test_roll(ctx, db):
+    roll_stonk_partitions(ctx=ctx)
+    # only this year is left in the main file, a file for each past year
+    assert _main_dates(ctx) == db[-1:].tolist()
+    for year in range(THIS_YEAR - 3, THIS_YEAR):
+        with sqlite3.connect(f"file:{_path(ctx, year)}?mode=ro", uri=True) as connection:
+            assert connection.execute("SELECT date FROM AAA ORDER BY date").fetchall() == [
+                (_date(year, 1, 2),),
+                (_date(year, 12, 31),),
+            ]
+        # older than last year is sealed
+        writable = os.stat(_path(ctx, year)).st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
+        assert bool(writable) == (year == THIS_YEAR - 1)
+
+
+def test_union_view(ctx, db):
+    roll_stonk_partitions(ctx=ctx)
+    # the read helpers see the full history across files
+    date, line = read_stonk_columns(ctx=ctx, table="AAA", column=["clv"])
+    assert np.array_equal(date, db)
+    assert np.array_equal(line["clv"], np.arange(len(db)))
+    date, _ = read_stonk_columns(ctx=ctx, table="BBB", since=_date(THIS_YEAR - 1, 1, 1), until=_date(THIS_YEAR, 1, 1))
+    assert np.array_equal(date, db[4:6])
+    assert select_stonk_tables(ctx=ctx) == ["AAA", "BBB"]
+
+
+def test_roll_again(ctx, db):
+    roll_stonk_partitions(ctx=ctx)
+    # a later fetch writes bars of last year and this year, last year's file takes them
+    value = np.array([[100.0, 101.0]])
+    date = np.array([_date(THIS_YEAR - 1, 6, 1), _date(THIS_YEAR, 1, 3)], dtype=np.int64)
+    write_panel_to_stonk_tables(ctx=ctx, ticker=["AAA"], date=date, line={"clv": value}, present=value > 0)
+    roll_stonk_partitions(ctx=ctx)
+
+    assert _main_dates(ctx) == [db[-1], date[-1]]
+    date, line = read_stonk_columns(ctx=ctx, table="AAA", column=["clv"])
+    assert len(date) == len(db) + 2 and np.all(np.diff(date) > 0)
+    assert line["clv"][date.tolist().index(_date(THIS_YEAR - 1, 6, 1))] == 100
+
+
+def test_retention(ctx, db):
+    roll_stonk_partitions(ctx=ctx)
+    ctx["data_service"]["partition_retention"] = "2"
+    roll_stonk_partitions(ctx=ctx)
+    # this year and last year are kept
+    assert not os.path.exists(_path(ctx, THIS_YEAR - 3)) and not os.path.exists(_path(ctx, THIS_YEAR - 2))
+    date, _ = read_stonk_columns(ctx=ctx, table="AAA", column=["clv"])
+    assert np.array_equal(date, db[4:])
+
+
+def test_retention_before_first_roll(ctx, db):
+    ctx["data_service"]["partition_retention"] = "1"
+    roll_stonk_partitions(ctx=ctx)
+    # past years are dropped, not moved
+    assert not any(os.path.exists(_path(ctx, year)) for year in range(THIS_YEAR - 3, THIS_YEAR))
+    assert _main_dates(ctx, table="BBB") == db[-1:].tolist()
+
+
+def test_ticker_only_in_partition(ctx, db):
+    roll_stonk_partitions(ctx=ctx)
+    with sqlite3.connect(_path(ctx)) as connection:
+        connection.execute("DROP TABLE BBB")
+    assert select_stonk_tables(ctx=ctx) == ["AAA", "BBB"]
+    date, _ = read_stonk_columns(ctx=ctx, table="BBB", column=["clv"])
+    assert np.array_equal(date, db[:-1])
+
+
+def test_blob_storage(ctx, db):
+    ctx["data_service"]["storage_mode"] = "blob"
+    with pytest.raises(ValueError):
+        roll_stonk_partitions(ctx=ctx)
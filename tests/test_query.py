@@ -0,0 +1,139 @@
+import numpy as np
+import pytest
+
+from pkg.data_srv.query import ERROR, HEADER, DataLineCache, _query_ctx, decode_reply, encode_reply
+
+DAY = 86400
+
+
+@pytest.fixture
+def write(ctx):
+    """Returns a function writing n daily bars of clv and volume for each ticker, value is the bar number plus add"""
+    from pkg.data_srv.utils import create_sqlite_stonk_database, write_panel_to_stonk_tables
+
+    ctx["interface"]["ticker"] = ["AAA", "BBB", "CCC"]
+    create_sqlite_stonk_database(ctx=ctx)
+
+    def write(n: int, ticker: list = ("AAA", "BBB", "CCC"), add: float = 0.0):
+        value = np.tile(np.arange(n, dtype=float) + add, (len(ticker), 1))
+        write_panel_to_stonk_tables(
+            ctx=ctx,
+            ticker=list(ticker),
+            date=np.arange(n, dtype=np.int64) * DAY,
+            line={"clv": value, "volume": value * 10},
+            present=np.ones(value.shape, dtype=bool),
+        )
+
+    return write
+
+
+def _cache(ctx, tables: float) -> DataLineCache:
+    """Cache holding tables ticker tables of 10 bars, every data line is read"""
+    from pkg.data_srv.utils import read_stonk_columns
+
+    date, line = read_stonk_columns(ctx=ctx, table="AAA")
+    return DataLineCache(ctx=_query_ctx(ctx=ctx), max_bytes=int(tables * (date.nbytes + 10 * 8 * len(line))))
+
+
+def test_query(ctx, write):
+    write(10)
+    cache = _cache(ctx=ctx, tables=3)
+    date, value = cache.query(ticker="aaa", line=["VOLUME", "clv"], start=2 * DAY, end=5 * DAY)
+    # start and end are inclusive, a row for each data line
+    assert np.array_equal(date, np.arange(2, 6) * DAY)
+    assert np.array_equal(value, [[20, 30, 40, 50], [2, 3, 4, 5]])
+    date, value = cache.query(ticker="AAA", line=["clv"])
+    assert len(date) == 10 and value.shape == (1, 10)
+    date, value = cache.query(ticker="AAA", line=["clv"], start=20 * DAY)
+    assert len(date) == 0 and value.shape == (1, 0)
+
+
+def test_unknown(ctx, write):
+    write(10)
+    cache = _cache(ctx=ctx, tables=3)
+    with pytest.raises(ValueError, match="unknown ticker"):
+        cache.query(ticker="ZZZ", line=["clv"])
+    with pytest.raises(ValueError, match="unknown data line"):
+        cache.query(ticker="AAA", line=["nope"])
+
+
+def test_lru_eviction(ctx, write):
+    write(10)
+    cache = _cache(ctx=ctx, tables=2)
+    cache.get("AAA")
+    cache.get("BBB")
+    cache.get("AAA")
+    assert (cache.hits, cache.misses) == (1, 2)
+    # BBB is the least recently used
+    cache.get("CCC")
+    assert list(cache.table) == ["AAA", "CCC"]
+    assert cache.nbytes <= cache.max_bytes
+    cache.get("BBB")
+    assert list(cache.table) == ["CCC", "BBB"]
+    assert (cache.hits, cache.misses) == (1, 4)
+
+
+def test_keeps_table_larger_than_cache(ctx, write):
+    write(10)
+    cache = _cache(ctx=ctx, tables=0.5)
+    cache.get("AAA")
+    cache.get("BBB")
+    assert list(cache.table) == ["BBB"]
+    assert cache.nbytes > cache.max_bytes
+
+
+def test_rebuild_after_database_change(ctx, write):
+    write(10)
+    cache = _cache(ctx=ctx, tables=3)
+    cache.get("AAA")
+    cache.get("BBB")
+    assert cache.get("AAA")[1]["clv"][-1] == 9
+
+    # a fetch writes new bars, every cached table is dropped
+    write(12, ticker=["AAA"], add=100)
+    date, line = cache.get("AAA")
+    assert len(date) == 12 and line["clv"][-1] == 111
+    assert list(cache.table) == ["AAA"]
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_rebuild_after_database_replaced(ctx, write):
+    from pkg.data_srv.utils import create_sqlite_stonk_database
+
+    write(10)
+    cache = _cache(ctx=ctx, tables=3)
+    cache.get("CCC")
+    # a new database without CCC
+    ctx["interface"]["ticker"] = ["AAA"]
+    create_sqlite_stonk_database(ctx=ctx)
+    write(5, ticker=["AAA"])
+    with pytest.raises(ValueError, match="unknown ticker"):
+        cache.get("CCC")
+    assert len(cache.get("AAA")[0]) == 5
+
+
+@pytest.mark.parametrize("rows, columns", [(0, 0), (0, 2), (1, 1), (50, 3)])
+def test_reply_round_trip(rows, columns):
+    rng = np.random.default_rng(0)
+    date = rng.integers(-(2**62), 2**62, rows)
+    value = rng.normal(0, 1e6, (columns, rows))
+    if value.size:
+        value.flat[::3] = np.nan
+    reply = encode_reply(date=date, value=value)
+    assert len(reply) == HEADER.size + rows * 8 * (columns + 1)
+
+    found_date, found_value = decode_reply(reply)
+    assert found_date.dtype == np.int64 and np.array_equal(found_date, date)
+    assert found_value.shape == (columns, rows)
+    assert np.array_equal(found_value, value, equal_nan=True)
+
+
+def test_reply_little_endian():
+    reply = encode_reply(date=np.array([1]), value=np.array([[1.0]]))
+    assert reply == HEADER.pack(b"STNK", 1, 1) + (1).to_bytes(8, "little") + np.float64(1).tobytes()
+
+
+def test_error_reply():
+    message = "unknown ticker: ZZZ".encode()
+    with pytest.raises(ValueError, match="unknown ticker: ZZZ"):
+        decode_reply(HEADER.pack(ERROR, len(message), 0) + message)
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pkg.data_srv.utils import read_stonk_columns, select_stonk_tables
+
+DATA_LINE = ["CLOP", "CLV", "CWAP", "HILO", "VOLUME", "SC_VOL", "RSI", "OBV"]
+
+
+@pytest.fixture
+def local_dir(tmp_path):
+    """AAA.csv and BBB.csv, 120 days of whole dollar bars closing at the low, high or middle of an
+    even range, so the bars rebuilt from the stored data lines are exact"""
+    rng = np.random.default_rng(0)
+    (tmp_path / "local").mkdir()
+    for ticker in ("AAA", "BBB"):
+        low = 100 + rng.integers(-5, 5, 120).cumsum()
+        high = low + 2 * rng.integers(0, 4, 120)
+        close = np.choose(rng.integers(0, 3, 120), [low, high, (low + high) // 2])
+        pd.DataFrame(
+            {
+                "date": pd.date_range("2024-01-01", periods=120).strftime("%Y-%m-%d"),
+                "open": rng.integers(low, high + 1),
+                "high": high,
+                "low": low,
+                "close": close,
+                "volume": rng.integers(1000, 100000, 120),
+            }
+        ).to_csv(tmp_path / "local" / f"{ticker}.csv", index=False)
+    return f"{tmp_path}/local"
+
+
+@pytest.fixture
+def resample_ctx(ctx, local_dir):
+    ctx["interface"].update(data_line=DATA_LINE, window_size="3")
+    ctx["data_service"].update(
+        data_lookback="36500", data_provider="local", local_dir=local_dir, resample_frequency="weekly monthly"
+    )
+    ctx["screen_rule"] = {}
+    return ctx
+
+
+def test_resample_tables(resample_ctx):
+    from pkg.data_srv.client import fetch_stonk_data
+
+    fetch_stonk_data(ctx=resample_ctx)
+    # the heatmap sees only daily tables
+    assert select_stonk_tables(ctx=resample_ctx) == ["AAA", "BBB"]
+    assert select_stonk_tables(ctx=resample_ctx, frequency="weekly") == ["AAA_WEEKLY", "BBB_WEEKLY"]
+    assert select_stonk_tables(ctx=resample_ctx, frequency="monthly") == ["AAA_MONTHLY", "BBB_MONTHLY"]
+
+
+@pytest.mark.parametrize("frequency, period", [("weekly", "W"), ("monthly", "M")])
+def test_resample_matches_provider_bars(resample_ctx, local_dir, frequency, period):
+    from pkg.data_srv.agent import BaseProcessor
+    from pkg.data_srv.client import fetch_stonk_data
+
+    fetch_stonk_data(ctx=resample_ctx)
+    processor = BaseProcessor(ctx=resample_ctx)
+    for ticker in ("AAA", "BBB"):
+        # the same data lines as from weekly or monthly bars of the provider
+        df = pd.read_csv(f"{local_dir}/{ticker}.csv", index_col="date", parse_dates=True)
+        group = df.groupby(df.index.to_period(period))
+        bars = group.agg({"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"})
+        first = df.index.to_series().groupby(df.index.to_period(period)).first()
+        date = first.to_numpy().astype("datetime64[s]").astype(np.int64)
+        _, expected = processor._data_line_frame(
+            ticker=ticker, date=date, bars={k: bars[k].to_numpy(dtype=float) for k in bars}
+        )
+
+        found_date, found = read_stonk_columns(ctx=resample_ctx, table=f"{ticker}_{frequency.upper()}")
+        assert np.array_equal(found_date, date)
+        assert list(found) == [name.lower() for name in DATA_LINE]
+        for name in found:
+            assert np.array_equal(found[name], expected[name].to_numpy(dtype=float), equal_nan=True), name
+
+
+def test_resample_without_download(resample_ctx, monkeypatch):
+    from pkg.data_srv.agent import LocalDataProcessor
+    from pkg.data_srv.client import fetch_stonk_data
+
+    calls = list()
+    download = LocalDataProcessor.download_and_parse_price_data
+
+    def download_and_parse_price_data(self, ticker):
+        calls.append(ticker)
+        return download(self, ticker=ticker)
+
+    monkeypatch.setattr(LocalDataProcessor, "download_and_parse_price_data", download_and_parse_price_data)
+    fetch_stonk_data(ctx=resample_ctx)
+    # one request for each ticker, weekly and monthly come from the stored bars
+    assert calls == ["AAA", "BBB"]
+
+
+def test_query_serves_resampled(resample_ctx):
+    from pkg.data_srv.client import fetch_stonk_data
+    from pkg.data_srv.query import DataLineCache, _query_ctx
+
+    fetch_stonk_data(ctx=resample_ctx)
+    cache = DataLineCache(ctx=_query_ctx(ctx=resample_ctx), max_bytes=2**20)
+    date, value = cache.query(ticker="aaa_monthly", line=["volume"])
+    assert len(date) == 4 and value.sum() == read_stonk_columns(ctx=resample_ctx, table="AAA")[1]["volume"].sum()
@@ -0,0 +1,112 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from sklearn.preprocessing import MinMaxScaler, RobustScaler
+
+from pkg.data_srv.scaler import (
+    RollingMinMaxScaler,
+    RollingRobustScaler,
+    rolling_scaler,
+    scaled_data_line,
+    sweep_columns,
+    window_scale,
+    window_scale_sweep,
+)
+
+SKLEARN = {"MinMaxScaler": MinMaxScaler, "RobustScaler": RobustScaler}
+
+
+@pytest.fixture
+def x():
+    """Volumes with repeats and a flat run, so some windows have no range"""
+    rng = np.random.default_rng(0)
+    x = rng.integers(0, 50, 200).astype(float)
+    x[60:80] = 7.0
+    return x
+
+
+def _fit_transform(x: np.ndarray, window_size: int, scaler: str) -> np.ndarray:
+    """fit_transform() of each sliding window, the value of its last bar"""
+    y = np.full(len(x), np.nan)
+    with warnings.catch_warnings():
+        # a window of nan only
+        warnings.simplefilter("ignore", RuntimeWarning)
+        for end in range(window_size, len(x) + 1):
+            y[end - 1] = SKLEARN[scaler]().fit_transform(x[end - window_size : end].reshape(-1, 1))[-1, 0]
+    return y
+
+
+@pytest.mark.parametrize("scaler", ["MinMaxScaler", "RobustScaler"])
+@pytest.mark.parametrize("window_size", [1, 2, 3, 10, 30])
+def test_rolling_scaler(x, scaler, window_size):
+    rolling = rolling_scaler(scaler=scaler, window_size=window_size)
+    assert isinstance(rolling, {"MinMaxScaler": RollingMinMaxScaler, "RobustScaler": RollingRobustScaler}[scaler])
+    value = [rolling.update(value=item) for item in x.tolist()]
+    # None until the window is full, then exactly the sklearn value
+    assert value[: window_size - 1] == [None] * (window_size - 1)
+    assert np.array_equal(value[window_size - 1 :], _fit_transform(x, window_size, scaler)[window_size - 1 :])
+
+
+@pytest.mark.parametrize("scaler", ["MinMaxScaler", "RobustScaler"])
+@pytest.mark.parametrize("window_size", [1, 3, 10, 30])
+def test_window_scale(x, scaler, window_size):
+    assert np.array_equal(
+        window_scale(x=x, window_size=window_size, scaler=scaler),
+        _fit_transform(x, window_size, scaler),
+        equal_nan=True,
+    )
+
+
+@pytest.mark.parametrize("scaler", ["MinMaxScaler", "RobustScaler"])
+@pytest.mark.parametrize("window_size", [3, 10])
+def test_window_scale_nan_gaps(x, scaler, window_size):
+    # sklearn skips nan in fit and keeps it nan in transform
+    x[5] = x[90:97] = x[150:152] = np.nan
+    expected = _fit_transform(x, window_size, scaler)
+    assert np.array_equal(window_scale(x=x, window_size=window_size, scaler=scaler), expected, equal_nan=True)
+
+
+def test_window_scale_panel(x):
+    panel = np.stack([x, x[::-1], np.full(len(x), 3.0)])
+    panel[1, 40:45] = np.nan
+    value = window_scale(x=panel, window_size=10, scaler="RobustScaler")
+    assert value.shape == panel.shape
+    for row in range(3):
+        assert np.array_equal(value[row], _fit_transform(panel[row], 10, "RobustScaler"), equal_nan=True)
+
+
+def test_window_scale_short(x):
+    assert np.isnan(window_scale(x=x[:5], window_size=10, scaler="MinMaxScaler")).all()
+
+
+def test_window_scale_sweep(x):
+    # small blocks so the windows are sorted in several blocks
+    sweep = window_scale_sweep(x=x, window_size=[5, 20], scaler=["MinMaxScaler", "RobustScaler"], block_size=500)
+    assert set(sweep) == {(w, s) for w in (5, 20) for s in ("MinMaxScaler", "RobustScaler")}
+    for (w, s), value in sweep.items():
+        assert np.array_equal(value, _fit_transform(x, w, s), equal_nan=True)
+
+
+def test_scaled_data_line(x):
+    x[:3] = np.nan
+    scaled = window_scale(x=x, window_size=5, scaler="MinMaxScaler")
+    line = scaled_data_line(scaled=scaled, valid=~np.isnan(x), window_size=5)
+    full = np.trunc((scaled[7:] + 10) * 100)
+    assert np.isnan(line[:3]).all()
+    # the first window_size - 1 bars of the series are its average
+    assert np.all(line[3:7] == np.trunc(np.nanmean(full)))
+    assert np.array_equal(line[7:], full)
+
+
+def test_sweep_columns():
+    assert sweep_columns(data_line=["SC_VOL", "CLV"], window_size=[5], scaler=["RobustScaler", "MinMaxScaler"]) == [
+        "sc_vol_w5_robust",
+        "sc_vol_w5_minmax",
+    ]
+
+
+def test_unknown_scaler():
+    with pytest.raises(ValueError):
+        rolling_scaler(scaler="StandardScaler", window_size=3)
@@ -0,0 +1,71 @@
+import datetime
+
+import pytest
+
+from pkg.daemon_srv.utils import next_run, parse_schedule
+
+
+def test_parse_schedule():
+    minute, hour, day, month, weekday = parse_schedule("*/15 9-16 * 1,6-7 1-5")
+    assert minute == {0, 15, 30, 45}
+    assert hour == set(range(9, 17))
+    assert day == set(range(1, 32))
+    assert month == {1, 6, 7}
+    assert weekday == {1, 2, 3, 4, 5}
+
+
+def test_parse_schedule_steps():
+    minute, hour, day, _, weekday = parse_schedule("5/20 1-23/11 1-31/10 * 0")
+    assert minute == {5, 25, 45}
+    assert hour == {1, 12, 23}
+    assert day == {1, 11, 21, 31}
+    assert weekday == {0}
+
+
+@pytest.mark.parametrize(
+    "expr",
+    [
+        "* * * *",
+        "* * * * * *",
+        "60 * * * *",
+        "* 24 * * *",
+        "* * 0 * *",
+        "* * * 13 *",
+        "* * * * 7",
+        "5-1 * * * *",
+        "*/0 * * * *",
+        "a * * * *",
+        "",
+    ],
+)
+def test_parse_schedule_rejects(expr):
+    with pytest.raises(ValueError):
+        parse_schedule(expr)
+
+
+@pytest.mark.parametrize(
+    "expr, after, expected",
+    [
+        # friday after the close, next weekday morning is monday
+        ("0 9 * * 1-5", datetime.datetime(2024, 1, 5, 16, 50), datetime.datetime(2024, 1, 8, 9, 0)),
+        # strictly later, a whole minute
+        ("30 16 * * *", datetime.datetime(2024, 1, 5, 16, 30), datetime.datetime(2024, 1, 6, 16, 30)),
+        ("30 16 * * *", datetime.datetime(2024, 1, 5, 16, 29, 59), datetime.datetime(2024, 1, 5, 16, 30)),
+        ("*/15 * * * *", datetime.datetime(2024, 1, 5, 23, 50), datetime.datetime(2024, 1, 6, 0, 0)),
+        # restricted day and weekday, either one runs
+        ("0 0 13 * 5", datetime.datetime(2024, 9, 1), datetime.datetime(2024, 9, 6, 0, 0)),
+        ("0 0 13 * 5", datetime.datetime(2024, 9, 10), datetime.datetime(2024, 9, 13, 0, 0)),
+        # sunday is 0
+        ("0 12 * * 0", datetime.datetime(2024, 1, 1), datetime.datetime(2024, 1, 7, 12, 0)),
+        # into the next year, and a leap day
+        ("0 0 1 3 *", datetime.datetime(2024, 3, 5), datetime.datetime(2025, 3, 1, 0, 0)),
+        ("0 0 29 2 *", datetime.datetime(2024, 3, 1), datetime.datetime(2028, 2, 29, 0, 0)),
+    ],
+)
+def test_next_run(expr, after, expected):
+    assert next_run(schedule=parse_schedule(expr), after=after) == expected
+
+
+def test_next_run_never():
+    with pytest.raises(ValueError):
+        next_run(schedule=parse_schedule("0 0 31 2 *"), after=datetime.datetime(2024, 1, 1))
@@ -0,0 +1,73 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from pkg.data_srv.screener import ScreenRule, compile_screen_rules
+
+
+@pytest.fixture
+def bars():
+    """Three bars of four tickers, the last one has no latest volume"""
+    return {
+        "clv": np.array([[10, 20, 60], [10, 20, 40], [90, 90, 90], [0, 0, 80]], dtype=float),
+        "volume": np.array([[100, 200, 300], [300, 200, 100], [1, 1, 1], [5, 5, np.nan]], dtype=float),
+    }
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("clv > 50", [True, False, True, True]),
+        ("clv > 50 and volume > 100", [True, False, False, False]),
+        ("not clv > 50", [False, True, False, False]),
+        ("clv > 50 or volume > 200", [True, False, True, False]),
+        ("volume > ago(volume, 2)", [True, False, False, False]),
+        ("mean(volume, 3) >= 200", [True, True, False, False]),
+        ("max(clv, 2) - min(clv, 2) > 30", [True, False, False, True]),
+        ("0 < clv / volume < 1", [True, True, False, False]),
+    ],
+)
+def test_evaluate(bars, text, expected):
+    rule = ScreenRule(name="rule", text=text)
+    assert rule.evaluate(bars).tolist() == expected
+
+
+def test_missing_value_never_matches(bars):
+    # not of a comparison with nan must not turn it true
+    assert ScreenRule(name="rule", text="not volume > 1000").evaluate(bars).tolist() == [True, True, True, False]
+
+
+def test_depth_and_column():
+    rule = ScreenRule(name="rule", text="ago(CLV, 4) > 0 and mean(volume, 10) > 0")
+    assert rule.column == {"clv", "volume"}
+    assert rule.depth == 10
+
+
+@pytest.mark.parametrize("text", ["clv >", "clv", "clv + 1", "clv > 1 and volume", "foo(clv, 2) > 1", "ago(clv, 0) > 1"])
+def test_rejects(text):
+    with pytest.raises(ValueError):
+        ScreenRule(name="rule", text=text)
+
+
+def test_compile_skips_bad_rules(ctx):
+    ctx["screen_rule"] = {"typo": "clv >", "empty": "", "ok": "clv > 50"}
+    assert [rule.name for rule in compile_screen_rules(ctx=ctx)] == ["ok"]
+
+
+def test_bad_rules_do_not_fail_fetch(ctx, local_dir, capsys):
+    from pkg.data_srv.client import fetch_stonk_data
+
+    ctx["data_service"].update(data_lookback="36500", data_provider="local", local_dir=local_dir)
+    ctx["screen_rule"] = {"typo": "volume >", "unknown": "nope > 1", "ok": "volume > 0"}
+    fetch_stonk_data(ctx=ctx)
+
+    out = capsys.readouterr().out
+    # a rule that does not parse is reported before the download
+    assert out.index("typo\tskipped") < out.index("fetching AAA")
+    assert "unknown\tskipped" in out
+    with sqlite3.connect(f"{ctx['default']['work_dir']}data/stonk.db") as connection:
+        assert connection.execute("SELECT rule, ticker FROM _screen ORDER BY ticker").fetchall() == [
+            ("ok", "AAA"),
+            ("ok", "BBB"),
+        ]
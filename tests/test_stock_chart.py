@@ -0,0 +1,113 @@
+import os
+
+import numpy as np
+import pytest
+
+from pkg.chart_srv.render.stock_chart import DOWN, RSI, UP, VOLUME, ImageRenderer
+
+
+@pytest.fixture
+def renderer(ctx, local_dir):
+    """Renderer of the AAA and BBB local files, drawn in one worker"""
+    from pkg.data_srv.client import ingest_local_data
+
+    ctx["data_service"].update(data_provider="local", local_dir=local_dir, local_lookback="0", local_workers="1")
+    ingest_local_data(ctx=ctx)
+    ctx["interface"].update(command="chart", arguments=["aaa", "BBB", "ZZZ"], opt_trans=["Daily", "Weekly"])
+    ctx["chart_service"].update(chart_size="400x300", render_workers="1")
+    os.makedirs(f"{ctx['default']['work_dir']}chart")
+    return ImageRenderer(ctx=ctx)
+
+
+def test_renderer(renderer):
+    from PIL import Image
+
+    renderer.renderer()
+    found = sorted(os.listdir(renderer.chart_dir))
+    # no table for ZZZ, the other symbols are still drawn
+    assert found == ["BBB_d.png", "BBB_w.png", "aaa_d.png", "aaa_w.png"]
+    with Image.open(f"{renderer.chart_dir}/aaa_d.png") as image:
+        assert image.size == (400, 300)
+
+
+def test_draw_symbol_error(renderer):
+    assert "ZZZ" in renderer._draw_symbol("ZZZ")
+    assert renderer._draw_symbol("AAA") is None
+
+
+def _price_box(width: int, height: int) -> tuple:
+    """Price pane of _draw_chart"""
+    title, axis = height // 20, width // 14
+    return 4, title + (height - title) // 5 + 6, width - axis, height - height // 30
+
+
+def test_draw_chart(renderer):
+    # a rising series with one falling bar, so rsi is drawn and stays above 50
+    n = 40
+    close = np.arange(n, dtype=float) * 100 + 10000
+    open = close - 50
+    open[20] = close[20] + 50
+    bars = {"open": open, "high": close + 100, "low": open - 100, "close": close, "volume": np.full(n, 1000.0)}
+    date = np.datetime64("2024-01-01", "s").astype(np.int64) + np.arange(n) * 86400
+    image = renderer._draw_chart(symbol="AAA", period="Daily", date=date, bars=bars)
+
+    colors = {color for _, color in image.getcolors(400 * 300)}
+    assert {UP, DOWN, VOLUME, RSI} <= colors
+    box = _price_box(*image.size)
+    x = renderer._bar_x(count=n, box=box)
+    for i in (0, 20, n - 1):
+        column = {image.getpixel((int(round(x[i])), y)) for y in range(box[1], box[3])}
+        assert (DOWN if i == 20 else UP) in column
+        assert (UP if i == 20 else DOWN) not in column
+
+
+def test_draw_chart_trims_bars(renderer):
+    # more bars than chart_bars, only the last chart_bars are drawn
+    renderer.bars = 10
+    n = 50
+    close = np.where(np.arange(n) < n - 10, 10000.0 - np.arange(n), 10000.0 + np.arange(n))
+    bars = {"open": close + 50, "high": close + 100, "low": close - 100, "close": close, "volume": np.ones(n)}
+    bars["open"][-10:] = close[-10:] - 50
+    date = np.datetime64("2024-01-01", "s").astype(np.int64) + np.arange(n) * 86400
+    image = renderer._draw_chart(symbol="AAA", period="Daily", date=date, bars=bars)
+    colors = {color for _, color in image.getcolors(400 * 300)}
+    assert UP in colors and DOWN not in colors
+
+
+def test_bar_x_and_scale(renderer):
+    assert np.allclose(renderer._bar_x(count=4, box=(0, 0, 100, 50)), [12.5, 37.5, 62.5, 87.5])
+    box = (0, 10, 100, 110)
+    assert np.allclose(renderer._scale(np.array([0.0, 50.0, 100.0]), 0, 100, box), [110, 60, 10])
+    # a flat series does not divide by zero
+    assert renderer._scale(np.array([5.0]), 5, 5, box)[0] == 110
+
+
+@pytest.mark.parametrize("frequency, period, count", [("weekly", "W", 7), ("monthly", "M", 2)])
+def test_resample_ohlcv(frequency, period, count):
+    import pandas as pd
+
+    from pkg.data_srv.utils import resample_ohlcv
+
+    # weekdays from monday 2024-01-01 to wednesday 2024-02-14
+    index = pd.bdate_range("2024-01-01", "2024-02-14")
+    rng = np.random.default_rng(0)
+    close = rng.uniform(90, 110, len(index))
+    df = pd.DataFrame({"open": close + 1, "high": close + 2, "low": close - 2, "close": close, "volume": 1.0}, index)
+    date = index.to_numpy().astype("datetime64[s]").astype(np.int64)
+    p_date, p_bars = resample_ohlcv(date=date, bars={k: df[k].to_numpy() for k in df}, frequency=frequency)
+
+    # pandas weeks run monday to sunday
+    group = df.groupby(index.to_period(period))
+    expected = group.agg({"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"})
+    assert len(p_date) == count
+    first = index.to_series().groupby(index.to_period(period)).first()
+    assert np.array_equal(p_date, first.to_numpy().astype("datetime64[s]").astype(np.int64))
+    for name in expected:
+        assert np.array_equal(p_bars[name], expected[name].to_numpy()), name
+
+
+def test_resample_ohlcv_unknown():
+    from pkg.data_srv.utils import resample_ohlcv
+
+    with pytest.raises(ValueError):
+        resample_ohlcv(date=np.array([0]), bars={}, frequency="daily")
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pkg.data_srv.stream import DataLineStream
+
+SCALED = ["sc_cwap", "sc_mass", "sc_vol"]
+INDICATOR = ["ema_10", "rsi", "macd", "macd_signal", "atr"]
+
+
+@pytest.fixture
+def bars():
+    """400 bars of a random walk, an hour apart"""
+    rng = np.random.default_rng(0)
+    close = 100 + rng.normal(0, 1, 400).cumsum()
+    open = close + rng.normal(0, 0.5, 400)
+    bars = {
+        "open": open,
+        "high": np.maximum(open, close) + rng.uniform(0, 1, 400),
+        "low": np.minimum(open, close) - rng.uniform(0, 1, 400),
+        "close": close,
+        "volume": rng.integers(1000, 100000, 400).astype(float),
+    }
+    return np.arange(400, dtype=np.int64) * 3600, bars
+
+
+def _processor(ctx, scaler_mode: str):
+    from pkg.data_srv.agent import BaseProcessor
+
+    ctx["interface"]["data_line"] = ["CLOP", "CLV", "VOLUME", *SCALED, "OBV", *INDICATOR]
+    ctx["interface"]["window_size"] = "10"
+    ctx["data_service"].update(scaler_mode=scaler_mode, sweep_scaler="MinMaxScaler RobustScaler", sweep_window="5 20")
+    return BaseProcessor(ctx=ctx)
+
+
+def _stream(processor, date, bars, chunk: int, carry: int, overlap: bool) -> pd.DataFrame:
+    """Feed the bars in chunks, each repeating the last bar of the one before if overlap"""
+    stream = DataLineStream(processor=processor, ticker="AAA", carry=carry)
+    frames = list()
+    for start in range(0, len(date), chunk):
+        first = max(start - overlap, 0)
+        item = stream.update(
+            date=date[first : start + chunk], bars={k: v[first : start + chunk] for k, v in bars.items()}
+        )
+        if item is not None:
+            frames.append(item[1])
+    # as float, a chunk with warmup NULLs turns a column to float
+    df = pd.DataFrame(
+        {column: np.concatenate([item[column].to_numpy(dtype=float) for item in frames]) for column in frames[0]},
+        index=np.concatenate([item.index for item in frames]),
+    )
+    assert stream.rows == len(df)
+    return df
+
+
+def _equal(a: pd.Series, b: pd.Series) -> bool:
+    return np.array_equal(a.to_numpy(dtype=float), b.to_numpy(dtype=float), equal_nan=True)
+
+
+@pytest.mark.parametrize(
+    "scaler_mode, chunk, overlap",
+    [("online", 37, False), ("online", 50, True), ("online", 7, False), ("batch", 50, True)],
+)
+def test_chunks_match_whole_series(ctx, bars, scaler_mode, chunk, overlap):
+    date, bars = bars
+    processor = _processor(ctx=ctx, scaler_mode=scaler_mode)
+    _, whole = processor._data_line_frame(ticker="AAA", date=date, bars=bars)
+    df = _stream(processor=processor, date=date, bars=bars, chunk=chunk, carry=300, overlap=overlap)
+
+    assert np.array_equal(df.index, date)
+    assert list(df.columns) == list(whole.columns)
+    # the first bars of the window are padded with the average of the first chunk, not the whole series
+    padded = 20 - 1
+    for column in whole.columns:
+        if column.startswith(tuple(SCALED)):
+            assert _equal(df[column].iloc[padded:], whole[column].iloc[padded:]), column
+        else:
+            # running totals and recursive indicators carry their state across chunks
+            assert _equal(df[column], whole[column]), column
+
+
+def test_short_carry(ctx, bars):
+    # a carry shorter than the indicators warmup still keeps scaled lines and running totals exact
+    date, bars = bars
+    processor = _processor(ctx=ctx, scaler_mode="online")
+    _, whole = processor._data_line_frame(ticker="AAA", date=date, bars=bars)
+    df = _stream(processor=processor, date=date, bars=bars, chunk=25, carry=0, overlap=False)
+
+    for column in ["clop", "clv", "volume", "obv"] + [c for c in whole.columns if c.startswith(tuple(SCALED))]:
+        assert _equal(df[column].iloc[19:], whole[column].iloc[19:]), column
+
+
+def test_waits_for_window(ctx, bars):
+    date, bars = bars
+    stream = DataLineStream(processor=_processor(ctx=ctx, scaler_mode="online"), ticker="AAA", carry=0)
+    assert stream.carry == 20
+    assert stream.update(date=date[:9], bars={k: v[:9] for k, v in bars.items()}) is None
+    # the same bars again are not new
+    assert stream.update(date=date[:9], bars={k: v[:9] for k, v in bars.items()}) is None
+    ticker, df = stream.update(date=date[9:12], bars={k: v[9:12] for k, v in bars.items()})
+    assert ticker == "AAA" and np.array_equal(df.index, date[:12])
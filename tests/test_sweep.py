@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+SCALED = ["SC_CWAP", "SC_MASS", "SC_VOL"]
+SCALED_LOWER = [item.lower() for item in SCALED]
+SWEEP_WINDOW = [3, 10]
+SWEEP_SCALER = ["MinMaxScaler", "RobustScaler"]
+
+
+@pytest.fixture
+def fetch(ctx, local_dir):
+    """Returns a function fetching the local files, then reading AAA and BBB"""
+    from pkg.data_srv.client import fetch_stonk_data
+    from pkg.data_srv.utils import read_stonk_columns
+
+    ctx["interface"]["data_line"] = ["CLV", "VOLUME", *SCALED]
+    ctx["data_service"].update(data_lookback="36500", data_provider="local", local_dir=local_dir, scaler_mode="batch")
+    ctx["screen_rule"] = {}
+
+    def fetch(fetch_mode: str, window_size: int = 5, scaler: str = "RobustScaler", sweep: bool = False) -> dict:
+        ctx["interface"]["window_size"] = f"{window_size}"
+        ctx["data_service"].update(
+            fetch_mode=fetch_mode,
+            sklearn_scaler=scaler,
+            sweep_scaler=" ".join(SWEEP_SCALER) if sweep else "",
+            sweep_window=" ".join(f"{w}" for w in SWEEP_WINDOW) if sweep else "",
+        )
+        fetch_stonk_data(ctx=ctx)
+        return {ticker: read_stonk_columns(ctx=ctx, table=ticker)[1] for ticker in ("AAA", "BBB")}
+
+    return fetch
+
+
+@pytest.mark.parametrize("fetch_mode", ["ticker", "panel"])
+def test_sweep_matches_separate_runs(fetch, fetch_mode):
+    sweep = fetch(fetch_mode=fetch_mode, sweep=True)
+    # the sweep is added to the configured data lines
+    assert list(sweep["AAA"]) == [
+        "clv",
+        "volume",
+        *SCALED_LOWER,
+        *[f"{item}_w{w}_{s[:-6].lower()}" for item in SCALED_LOWER for w in SWEEP_WINDOW for s in SWEEP_SCALER],
+    ]
+    for w in SWEEP_WINDOW:
+        for s in SWEEP_SCALER:
+            # each sweep column is the scaled data line of a run with that window size and scaler
+            single = fetch(fetch_mode=fetch_mode, window_size=w, scaler=s)
+            for ticker in single:
+                for item in SCALED_LOWER:
+                    column = f"{item}_w{w}_{s[:-6].lower()}"
+                    assert np.array_equal(sweep[ticker][column], single[ticker][item], equal_nan=True), column
+
+
+def test_no_sweep(fetch):
+    assert list(fetch(fetch_mode="ticker")["AAA"]) == ["clv", "volume", *SCALED_LOWER]
+
+
+def test_sweep_columns_only_for_scaled_lines(ctx):
+    from pkg.data_srv.agent import BaseProcessor
+
+    ctx["interface"]["data_line"] = ["CLV", "SC_VOL"]
+    ctx["data_service"].update(sweep_scaler="MinMaxScaler", sweep_window="3")
+    processor = BaseProcessor(ctx=ctx)
+    volume = np.arange(10.0)
+    line = processor._sweep_data_lines(scaled={"sc_cwap": volume, "sc_mass": volume, "sc_vol": volume})
+    assert list(line) == ["sc_vol_w3_minmax"]
+    # a rising series is at the top of each window
+    assert np.array_equal(line["sc_vol_w3_minmax"][2:], np.full(8, 1100.0))
@@ -0,0 +1,174 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from PIL import Image
+
+from pkg.gui.thumbnail import INDEX_FILE, ThumbnailCache, _make_thumbnail
+
+
+def _png(path: str, color: tuple, size: tuple = (640, 400)):
+    Image.new("RGB", size, color).save(path, "PNG")
+
+
+def _stat(path: str) -> dict:
+    stat = os.stat(path)
+    return {"path": path, "mtime_ns": stat.st_mtime_ns, "file_size": stat.st_size}
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+    os.makedirs(f"{tmp_path}/chart")
+    _png(f"{tmp_path}/chart/AAA_d.png", (200, 0, 0))
+    _png(f"{tmp_path}/chart/BBB_d.png", (0, 200, 0))
+    with open(f"{tmp_path}/chart/CCC_d.png", "wb") as f:
+        f.write(b"not a png")
+    return f"{tmp_path}/chart"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """Returns a function opening the thumbnail cache, every one opened is closed after the test"""
+    opened = list()
+
+    def open_cache() -> ThumbnailCache:
+        opened.append(ThumbnailCache(thumbnail_dir=f"{tmp_path}/thumbnail", size=(160, 100), workers=1))
+        return opened[-1]
+
+    yield open_cache
+    for item in opened:
+        item.close()
+
+
+def _request(cache: ThumbnailCache, path: str) -> tuple:
+    """Request the thumbnail of path, returns (called, thumbnail) once done or after a timeout"""
+    done = threading.Event()
+    found = list()
+    cache.request(**_stat(path), done=lambda p, thumbnail: (found.append(thumbnail), done.set()))
+    return done.wait(timeout=30), found[0] if found else None
+
+
+def test_make_thumbnail(tmp_path, image_dir):
+    digest, error = _make_thumbnail(f"{image_dir}/AAA_d.png", f"{tmp_path}", (160, 100))
+    assert error is None and len(digest) == 40
+    with Image.open(f"{tmp_path}/{digest}_160x100.png") as image:
+        # the aspect ratio is kept
+        assert image.size == (160, 100)
+    digest, error = _make_thumbnail(f"{image_dir}/CCC_d.png", f"{tmp_path}", (160, 100))
+    assert digest is None and error
+
+
+def test_request_and_lookup(cache, image_dir):
+    thumbnails = cache()
+    path = f"{image_dir}/AAA_d.png"
+    assert thumbnails.lookup(**_stat(path)) is None
+    called, thumbnail = _request(thumbnails, path)
+    assert called and os.path.isfile(thumbnail)
+    assert thumbnails.lookup(**_stat(path)) == thumbnail
+
+    # the index is saved once idle, a new cache finds the thumbnail without a worker
+    with open(os.path.join(thumbnails.thumbnail_dir, INDEX_FILE)) as f:
+        assert list(json.load(f)) == [path]
+    assert cache().lookup(**_stat(path)) == thumbnail
+
+
+def test_changed_file(cache, image_dir):
+    thumbnails = cache()
+    path = f"{image_dir}/AAA_d.png"
+    _, old = _request(thumbnails, path)
+
+    # a new image is a new thumbnail, the old entry no longer matches
+    time.sleep(0.01)
+    _png(path, (0, 0, 200))
+    assert thumbnails.lookup(**_stat(path)) is None
+    _, new = _request(thumbnails, path)
+    assert new != old and thumbnails.lookup(**_stat(path)) == new
+
+    # the same content written again reuses its thumbnail
+    time.sleep(0.01)
+    _png(path, (0, 0, 200))
+    mtime = os.path.getmtime(new)
+    _, again = _request(thumbnails, path)
+    assert again == new and os.path.getmtime(new) == mtime
+
+
+def test_broken_image(cache, image_dir):
+    thumbnails = cache()
+    path = f"{image_dir}/CCC_d.png"
+    called, thumbnail = _request(thumbnails, path)
+    assert called and thumbnail is None
+    assert thumbnails.failed(**_stat(path))
+
+    # tried again once the file changes
+    time.sleep(0.01)
+    _png(path, (1, 2, 3))
+    assert not thumbnails.failed(**_stat(path))
+    called, thumbnail = _request(thumbnails, path)
+    assert called and os.path.isfile(thumbnail)
+
+
+def test_broken_image_not_requested(cache, image_dir):
+    thumbnails = cache()
+    path = f"{image_dir}/CCC_d.png"
+    _request(thumbnails, path)
+    # not tried again until the file changes
+    done = list()
+    thumbnails.request(**_stat(path), done=lambda *args: done.append(args))
+    assert not thumbnails.pending and not done
+
+
+def test_deleted_image_dropped(cache, image_dir):
+    thumbnails = cache()
+    for name in ("AAA_d.png", "BBB_d.png"):
+        _request(thumbnails, f"{image_dir}/{name}")
+    os.remove(f"{image_dir}/AAA_d.png")
+    thumbnails.save()
+    assert list(cache().index) == [f"{image_dir}/BBB_d.png"]
+
+
+def test_bad_index(cache, tmp_path):
+    os.makedirs(f"{tmp_path}/thumbnail")
+    with open(f"{tmp_path}/thumbnail/{INDEX_FILE}", "w") as f:
+        f.write("{")
+    assert cache().index == {}
+
+
+def test_gallery_model(qapp, cache, image_dir):
+    from PyQt5 import QtCore
+
+    from pkg.gui.gallery import GalleryModel
+
+    model = GalleryModel(folders=[image_dir, f"{image_dir}/missing"], thumbnails=cache(), icon_bytes=2**20)
+    model.refresh()
+    assert [model.data(model.index(row)) for row in range(model.rowCount())] == ["AAA_d", "BBB_d", "CCC_d"]
+
+    ready = list()
+    model.dataChanged.connect(lambda first, last, roles: ready.append(first.row()))
+    # a placeholder until the worker is done, then the thumbnail
+    assert model.data(model.index(0), QtCore.Qt.DecorationRole) is model.placeholder
+    assert model.data(model.index(2), QtCore.Qt.DecorationRole) is model.placeholder
+    deadline = time.monotonic() + 30
+    while len(ready) < 2 and time.monotonic() < deadline:
+        qapp.processEvents()
+        time.sleep(0.01)
+    assert sorted(ready) == [0, 2]
+    icon = model.data(model.index(0), QtCore.Qt.DecorationRole)
+    assert (icon.width(), icon.height()) == (160, 100)
+    assert model.data(model.index(2), QtCore.Qt.DecorationRole) is model.broken
+
+
+def test_pixmap_cache(qapp, image_dir):
+    from pkg.gui.gallery import PixmapCache
+
+    # room for one 640x400 image
+    pixmap = PixmapCache(max_bytes=640 * 400 * 4 + 1)
+    first = pixmap.get(path=f"{image_dir}/AAA_d.png", mtime_ns=1)
+    assert pixmap.get(path=f"{image_dir}/AAA_d.png", mtime_ns=1) is first
+    pixmap.get(path=f"{image_dir}/BBB_d.png", mtime_ns=1)
+    assert list(pixmap.pixmap) == [(f"{image_dir}/BBB_d.png", 1)]
+    # a changed file is read again
+    assert pixmap.get(path=f"{image_dir}/BBB_d.png", mtime_ns=2) is not None
+    assert list(pixmap.pixmap) == [(f"{image_dir}/BBB_d.png", 2)]
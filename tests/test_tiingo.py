@@ -0,0 +1,94 @@
+import calendar
+import datetime
+import time
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def tiingo(ctx):
+    """Returns a function making a TiingoDataProcessor for data_frequency"""
+    from pkg.data_srv.agent import TiingoDataProcessor
+
+    def make(data_frequency: str = "daily") -> TiingoDataProcessor:
+        ctx["data_service"].update(data_provider="tiingo", data_frequency=data_frequency)
+        return TiingoDataProcessor(ctx=ctx)
+
+    return make
+
+
+def _rows(date: list, adjust: float = 1.0) -> list:
+    """Tiingo json rows, the adjusted fields are the raw fields times adjust"""
+    rows = list()
+    for i, d in enumerate(date):
+        raw = {"open": 10.0 + i, "high": 12.0 + i, "low": 9.0 + i, "close": 11.0 + i, "volume": 1000 + i}
+        rows.append({"date": d, **raw, **{f"adj{k.title()}": v * adjust for k, v in raw.items()}, "divCash": 0.0})
+    return rows
+
+
+def _reference(rows: list, fields: tuple) -> tuple:
+    """Row by row parse, UTC seconds of the ISO date"""
+    date = np.array(
+        [calendar.timegm(datetime.datetime.strptime(r["date"][:19], "%Y-%m-%dT%H:%M:%S").timetuple()) for r in rows]
+    )
+    bars = {
+        key: np.array([r[field] for r in rows], dtype=float)
+        for key, field in zip(("open", "high", "low", "close", "volume"), fields)
+    }
+    return date, bars
+
+
+def test_parse_daily(tiingo):
+    rows = _rows([f"2024-01-{day:02d}T00:00:00.000Z" for day in (2, 3, 4, 5, 8)], adjust=0.5)
+    ticker, date, bars = tiingo()._parse_tiingo_data(data_gen=iter([("AAA", rows)]))
+    expected_date, expected = _reference(rows, ("adjOpen", "adjHigh", "adjLow", "adjClose", "adjVolume"))
+
+    # daily bars are split adjusted and stamped at UTC midnight
+    assert ticker == "AAA"
+    assert date.dtype == np.int64 and np.array_equal(date, expected_date)
+    assert date[0] == 1704153600
+    for key in expected:
+        assert bars[key].dtype == float and np.array_equal(bars[key], expected[key]), key
+
+
+def test_parse_intraday(tiingo):
+    rows = _rows(["2024-01-02T14:30:00.000Z", "2024-01-02T15:30:00.000Z", "2024-01-03T14:30:00.000Z"], adjust=0.5)
+    _, date, bars = tiingo(data_frequency="1h")._parse_tiingo_data(data_gen=iter([("AAA", rows)]))
+    expected_date, expected = _reference(rows, ("open", "high", "low", "close", "volume"))
+
+    # iex bars keep their time of day and are not adjusted
+    assert np.array_equal(date, expected_date)
+    assert np.array_equal(np.diff(date), [3600, 82800])
+    for key in expected:
+        assert np.array_equal(bars[key], expected[key]), key
+
+
+def test_parse_empty(tiingo):
+    _, date, bars = tiingo()._parse_tiingo_data(data_gen=iter([("AAA", [])]))
+    assert date.shape == (0,) and date.dtype == np.int64
+    assert all(value.shape == (0,) for value in bars.values())
+
+
+def test_parse_ignores_local_timezone(tiingo, monkeypatch):
+    rows = _rows(["2024-03-10T00:00:00.000Z", "2024-03-11T00:00:00.000Z"])
+    processor = tiingo()
+    _, utc, _ = processor._parse_tiingo_data(data_gen=iter([("AAA", rows)]))
+    # across a daylight saving change in New York
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    try:
+        _, local, _ = processor._parse_tiingo_data(data_gen=iter([("AAA", rows)]))
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+    assert np.array_equal(local, utc) and np.array_equal(np.diff(local), [86400])
+
+
+def test_process_tiingo_data(tiingo):
+    rows = _rows([f"2024-01-{day:02d}T00:00:00.000Z" for day in range(2, 12)])
+    ticker, df = tiingo()._process_tiingo_data(data_gen=iter([("AAA", rows)]))
+    assert ticker == "AAA"
+    assert np.array_equal(df.index, _reference(rows, ("adjOpen",) * 5)[0])
+    # close minus open in cents
+    assert np.array_equal(df["clop"], np.full(10, 100))